@@ -4,17 +4,42 @@ import sys
 import os
 import json
 import base64
+import binascii
+import codecs
+import difflib
+import hashlib
+import html
+import io
+import struct
+import zlib
 import shutil
 import logging
 import tempfile
-
-from PIL import Image, ImageQt, PngImagePlugin
+import unicodedata
+import re
+import fnmatch
+import functools
+import time
+import traceback
+import heapq
+import itertools
+import threading
+import multiprocessing
+from array import array
+from collections import Counter, namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+
+# Pillow is imported lazily where it is used, so the window can paint before it loads
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QFileDialog, QLabel, QPushButton, QListWidget, QVBoxLayout,
-    QMessageBox, QScrollArea, QListWidgetItem, QSplitter, QLineEdit, QHBoxLayout, QStatusBar, QMenu, QFrame, QSizePolicy, QTextBrowser
+    QMessageBox, QScrollArea, QListWidgetItem, QSplitter, QLineEdit, QHBoxLayout, QStatusBar, QMenu, QFrame, QSizePolicy, QTextBrowser,
+    QTabWidget, QComboBox, QDialog, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView,
+    QInputDialog, QCheckBox
 )
-from PySide6.QtCore import Qt, QEvent, QSettings, Signal, QObject, QThread, QSize
-from PySide6.QtGui import QPixmap, QPalette, QColor, QDesktopServices, QAction, QCursor, QTextOption
+from PySide6.QtCore import Qt, QEvent, QSettings, Signal, QObject, QThread, QTimer, QPoint
+from PySide6.QtGui import QPixmap, QImage, QPalette, QColor, QDesktopServices, QAction, QActionGroup, QCursor, QTextOption
 
 __version__ = "2.0"
 
@@ -259,15 +284,28 @@ def apply_messagebox_dark(msgbox):
 # Metadata helpers
 # -------------------------
 
-def read_card_metadata(filepath):
+def read_card_file(path):
+    """
+    (stat_result, bytes) of a card, read in one bulk read.
+    Pillow's own many small reads are slow on network mounts.
+    """
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        return st, f.read()
+
+def read_card_metadata(filepath, data=None):
     """
     Unified function to read character card metadata from a PNG.
     Supports 'chara' and 'ccv3' keys. If a nested 'data' dict exists,
     merge it without clobbering top-level keys.
+    data: the file's bytes if already read, e.g. by the scanner's read-ahead.
     Returns: (metadata_dict or None, error_str or None)
     """
+    from PIL import PngImagePlugin
     try:
-        with PngImagePlugin.PngImageFile(filepath) as im:
+        if data is None:
+            _, data = read_card_file(filepath)
+        with PngImagePlugin.PngImageFile(io.BytesIO(data), filepath) as im:
             text_chunks = im.text
             b64 = text_chunks.get('chara') or text_chunks.get('ccv3')
             if not b64:
@@ -276,32 +314,346 @@ def read_card_metadata(filepath):
                 data = json.loads(base64.b64decode(b64).decode('utf-8'))
             except Exception as e:
                 return None, f"Decode error: {e}"
-            if "data" in data and isinstance(data["data"], dict):
-                # Non-destructive merge: nested data fills in missing top-level keys only
-                merged = dict(data)
-                for k, v in data["data"].items():
-                    if k not in merged:
-                        merged[k] = v
-                data = merged
-            return data, None
+            return _merge_card_data(data), None
     except Exception as e:
         LOG.exception("Error reading metadata for %s", filepath)
         return None, str(e)
 
-def get_basic_index_info(filepath):
+def _merge_card_data(card):
+    if "data" in card and isinstance(card["data"], dict):
+        # Non-destructive merge: nested data fills in missing top-level keys only
+        merged = dict(card)
+        for k, v in card["data"].items():
+            if k not in merged:
+                merged[k] = v
+        card = merged
+    return card
+
+# Card fields whose prompt-token estimates are indexed for sorting
+TOKEN_FIELDS = ("description", "personality", "first_mes", "mes_example")
+# Entries missing any of these were written by an older version and get re-parsed
+INDEX_SCAN_FIELDS = ("name", "creator", "tags", "tokens", "lore")
+
+_TOKEN_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text):
     """
-    Get lightweight info needed for index: creator, tags.
-    Uses read_card_metadata() but avoids heavy processing elsewhere.
+    Rough prompt-token estimate for a card field: about one token per 4 characters,
+    but at least one per word or punctuation mark.
     """
-    meta, _ = read_card_metadata(filepath)
+    if not isinstance(text, str) or not text:
+        return 0
+    return max(sum(1 for _ in _TOKEN_PIECE_RE.finditer(text)), (len(text) + 3) // 4)
+
+def lorebook_entries(meta):
+    """Entries of the card's embedded lorebook (character_book), or []."""
+    book = meta.get("character_book") if meta else None
+    entries = book.get("entries") if isinstance(book, dict) else None
+    if isinstance(entries, dict):
+        entries = list(entries.values())  # some exporters key entries by uid
+    if not isinstance(entries, list):
+        return []
+    return [e for e in entries if isinstance(e, dict)]
+
+def lorebook_keys(meta):
+    """Distinct lorebook trigger keys (primary and secondary), lowercased."""
+    keys = {}
+    for entry in lorebook_entries(meta):
+        for field in ("keys", "secondary_keys"):
+            values = entry.get(field)
+            if isinstance(values, str):
+                values = [values]
+            if not isinstance(values, list):
+                continue
+            for k in values:
+                if isinstance(k, str) and k.strip():
+                    keys.setdefault(k.strip().lower(), None)
+    return list(keys)
+
+def index_fields(meta):
+    """Index fields (name, creator, tags, tokens, lore) from parsed card metadata, or defaults for None."""
+    name = ""
     creator = "Unknown"
     tags = []
+    tokens = dict.fromkeys(TOKEN_FIELDS, 0)
+    lore = []
     if meta:
-        creator = meta.get("creator") or "Unknown"
+        name = str(meta.get("name") or "").strip()
+        creator = str(meta.get("creator") or "Unknown")
         t = meta.get("tags", [])
         if isinstance(t, list):
             tags = t
-    return creator, tags
+        for field in TOKEN_FIELDS:
+            tokens[field] = estimate_tokens(meta.get(field))
+        lore = lorebook_keys(meta)
+    return {"name": name, "creator": creator, "tags": tags, "tokens": tokens, "lore": lore}
+
+# What index_fields() reads, as paths into the card JSON for read_card_fields():
+# True takes the whole value, a dict descends into an object, and "*" applies to
+# every element of an array (or every value of an object).
+INDEX_FIELD_PATHS = {
+    "name": True,
+    "creator": True,
+    "tags": True,
+    "character_book": True,
+    **dict.fromkeys(TOKEN_FIELDS, True),
+}
+
+_B64_CHUNK = 1 << 16  # base64 characters decoded at a time by _CardJsonReader
+_JSON_WS_RE = re.compile(r"[ \t\n\r]*")
+_JSON_DECODER = json.JSONDecoder()
+_JSON_VALUE_END = frozenset(" \t\n\r,:]}")
+
+def card_payload(data):
+    """
+    Base64 card JSON (bytes) from a card PNG's 'chara' text chunk, else its 'ccv3'
+    one, or None. Only the chunk headers are walked; the image is never inflated.
+    """
+    view = memoryview(data)
+    found = {}
+    pos = len(PNG_SIGNATURE)
+    while pos + 12 <= len(data):
+        length, ctype = struct.unpack_from(">I4s", data, pos)
+        end = pos + 12 + length
+        if ctype in PNG_TEXT_CHUNKS:
+            keyword = bytes(view[pos + 8:pos + 8 + 80]).partition(b"\0")[0]
+            if keyword in CARD_TEXT_KEYWORDS:
+                found[keyword] = (ctype, view[pos + 8:end - 4])
+        pos = end
+        if ctype == b"IEND":
+            break
+    ctype, body = found.get(b"chara") or found.get(b"ccv3") or (None, None)
+    if ctype is None:
+        return None
+    if ctype == b"tEXt":
+        return bytes(body).partition(b"\0")[2]
+    return decode_png_text_chunk(ctype, bytes(body))[1].encode("latin-1", "ignore")
+
+class _CardJsonReader:
+    """
+    Pulls selected values out of base64-encoded JSON.
+
+    The base64 is decoded in chunks as the scan needs more text, and text
+    already scanned past is dropped, so the decoded card is never held whole.
+    Objects on the wanted paths are walked key by key; every other value is
+    run through the C JSON decoder on its own and dropped straight away, so
+    nothing outside the paths is kept. Raises ValueError on malformed input.
+    """
+
+    def __init__(self, b64):
+        self._b64 = b64.translate(None, b" \t\r\n")  # chunks must stay 4-character aligned
+        self._next = 0
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+
+    def _more(self):
+        """Decode the next chunk onto the text; False once the payload is used up."""
+        if self._next >= len(self._b64):
+            return False
+        # Grow with what's still held, so a long value is re-tried a bounded number of times
+        size = max(_B64_CHUNK, 2 * (len(self.text) - self.pos)) // 4 * 4
+        chunk = binascii.a2b_base64(self._b64[self._next:self._next + size])
+        self._next += size
+        self.text = self.text[self.pos:] + self._utf8.decode(chunk, final=self._next >= len(self._b64))
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            self.pos = _JSON_WS_RE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._more():
+                raise ValueError("card JSON ends early")
+
+    def _load_value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = _JSON_DECODER.raw_decode(self.text, self.pos)
+            except ValueError:
+                if self._more():
+                    continue  # the value goes on in the next chunk
+                raise
+            # Complete only if something that may follow a value comes next: a number
+            # cut off by the chunk boundary ('12' of '12.5') decodes fine too
+            if end < len(self.text) and self.text[end] in _JSON_VALUE_END or not self._more():
+                self.pos = end
+                return value
+
+    def _expect(self, c):
+        if self._peek() != c:
+            raise ValueError(f"expected {c!r} in card JSON")
+        self.pos += 1
+
+    def _value(self, paths):
+        if paths is not True:
+            c = self._peek()
+            if c == "{":
+                return self._object(paths)
+            if c == "[" and "*" in paths:
+                return self._array(paths["*"])
+        return self._load_value()  # wanted whole, or not the shape the paths expect
+
+    def _object(self, paths):
+        result = {}
+        self.pos += 1
+        if self._peek() == "}":
+            self.pos += 1
+            return result
+        wildcard = paths.get("*")
+        while True:
+            key = self._load_value()
+            if not isinstance(key, str):
+                raise ValueError("object key is not a string")
+            self._expect(":")
+            sub = paths.get(key, wildcard)
+            if sub is None:
+                self._load_value()  # not wanted: parsed and dropped
+            else:
+                result[key] = self._value(sub)
+            if self._peek() == "}":
+                self.pos += 1
+                return result
+            self._expect(",")
+
+    def _array(self, paths):
+        result = []
+        self.pos += 1
+        if self._peek() == "]":
+            self.pos += 1
+            return result
+        while True:
+            result.append(self._value(paths))
+            if self._peek() == "]":
+                self.pos += 1
+                return result
+            self._expect(",")
+
+    def read(self, paths):
+        value = self._value(paths)
+        if _JSON_WS_RE.match(self.text, self.pos).end() < len(self.text) or self._more():
+            raise ValueError("extra data after card JSON")
+        return value
+
+def read_card_fields(filepath, paths, data=None):
+    """
+    Like read_card_metadata(), but only the parts named by paths (e.g.
+    INDEX_FIELD_PATHS), at the top level and under "data". The text chunk is
+    found without Pillow, which would decode the whole image to get at it, and
+    larger payloads are streamed through _CardJsonReader, so embedded assets,
+    greetings and the other fields not asked for are never kept. Cards the
+    fast path can't read get the full parse.
+    Returns: (metadata_dict or None, error_str or None)
+    """
+    try:
+        if data is None:
+            _, data = read_card_file(filepath)
+        if data.startswith(PNG_SIGNATURE):
+            b64 = card_payload(data)
+            if b64 is None:
+                return None, "No character card metadata found"
+            if len(b64) <= _B64_CHUNK:
+                card = json.loads(binascii.a2b_base64(b64))  # small card: one C-level parse is cheaper
+            else:
+                card = _CardJsonReader(b64).read({**paths, "data": paths})
+            if isinstance(card, dict):
+                return _merge_card_data(card), None
+    except (OSError, ValueError):
+        pass  # read_card_metadata() reports it
+    return read_card_metadata(filepath, data)
+
+def benchmark_card_parsing(n=20, payload_mb=4, seed=0):
+    """
+    Time full parsing (read_card_metadata) against the index fast path
+    (read_card_fields) on n in-memory cards of about payload_mb MB each: a long
+    description, a large lorebook and an embedded asset, in both a 'chara' and
+    a 'ccv3' chunk like current exporters write them. Checks that both give the
+    same index fields. Returns {"full": (seconds, peak bytes for one card),
+    "fast": (...), "bytes": total card bytes}.
+    """
+    import random
+    import tracemalloc
+    rnd = random.Random(seed)
+    words = ["".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rnd.randint(3, 9)))
+             for _ in range(5000)]
+    width, height = 512, 768  # noise, so the image is a realistic size
+    ihdr = _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+    idat = _png_chunk(b"IDAT", zlib.compress(b"".join(b"\0" + rnd.randbytes(width * 3) for _ in range(height))))
+    iend = _png_chunk(b"IEND", b"")
+    budget = payload_mb * 1024 * 1024 // 2  # per chunk, before base64
+    cards = []
+    for i in range(n):
+        entries = [{"keys": rnd.sample(words, 3), "secondary_keys": rnd.sample(words, 1),
+                    "content": " ".join(rnd.choices(words, k=150)), "enabled": True, "insertion_order": j}
+                   for j in range(budget // 4 // 1100)]
+        data = {
+            "name": f"Card {i}", "creator": f"creator{i % 7}", "tags": rnd.sample(words, 8),
+            "description": " ".join(rnd.choices(words, k=budget // 4 // 7)),
+            "personality": " ".join(rnd.choices(words, k=300)),
+            "first_mes": " ".join(rnd.choices(words, k=400)),
+            "mes_example": " ".join(rnd.choices(words, k=400)),
+            "character_book": {"name": "lore", "entries": entries},
+            "extensions": {"depth_prompt": {"prompt": "", "depth": 4}},
+        }
+        asset = base64.b64encode(rnd.randbytes(budget // 3)).decode("ascii")
+        v2 = {"spec": "chara_card_v2", "spec_version": "2.0", "data": data}
+        v3 = {"spec": "chara_card_v3", "spec_version": "3.0",
+              "data": dict(data, assets=[{"type": "icon", "name": "main", "ext": "png",
+                                          "uri": "data:image/png;base64," + asset}])}
+        chunks = [_png_chunk(b"tEXt", key + b"\0" + base64.b64encode(json.dumps(card).encode("utf-8")))
+                  for key, card in ((b"chara", v2), (b"ccv3", v3))]
+        cards.append(PNG_SIGNATURE + ihdr + idat + b"".join(chunks) + iend)
+    results = {"bytes": sum(map(len, cards))}
+    fields = []
+    for name, read in (("full", lambda data: read_card_metadata("bench.png", data)),
+                       ("fast", lambda data: read_card_fields("bench.png", INDEX_FIELD_PATHS, data))):
+        start = time.perf_counter()
+        metas = [read(data)[0] for data in cards]
+        seconds = time.perf_counter() - start
+        fields.append([index_fields(meta) for meta in metas])
+        del metas
+        tracemalloc.start()
+        read(cards[0])
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = (seconds, peak)
+    if fields[0] != fields[1]:
+        raise AssertionError("fast path and full parse disagree")
+    return results
+
+def build_index_entry(folder, fname, prefetched=None, history=None, shared=None):
+    """
+    Stat and parse one card into a cards.json index entry.
+    prefetched: (stat_result, bytes) from read_card_file, if already read.
+    history: HistoryStore to record this version of the card in, if any.
+    shared: SharedCardCache to take the fields from (and add them to), if any.
+    """
+    fpath = os.path.join(folder, fname)
+    st, data = prefetched or read_card_file(fpath)
+    content = card_content_hash(data) if shared is not None else None
+    fields = None
+    if history is not None:
+        meta, _ = read_card_metadata(fpath, data)  # history keeps the whole card
+        history.record(fname, st, data, meta)
+        fields = index_fields(meta)
+    elif shared is not None:
+        fields = shared.fields(content)
+    if fields is None:
+        meta, _ = read_card_fields(fpath, INDEX_FIELD_PATHS, data)
+        fields = index_fields(meta)
+    if shared is not None:
+        shared.store(folder, fname, st, content, fields)
+    entry = {"filename": fname, "mtime": int(st.st_mtime), "size": st.st_size}
+    entry.update(fields)
+    return entry
+
+def make_index_entry(fname, st, meta):
+    """cards.json index entry of a card from its stat_result and parsed metadata."""
+    entry = {"filename": fname, "mtime": int(st.st_mtime), "size": st.st_size}
+    entry.update(index_fields(meta))
+    return entry
 
 def atomic_write_json(path, data):
     """Write JSON atomically to avoid corruption."""
@@ -319,9 +671,266 @@ def atomic_write_json(path, data):
             pass
         raise
 
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_TEXT_CHUNKS = (b"tEXt", b"zTXt", b"iTXt")
+
+def decode_png_text_chunk(ctype, body):
+    """(keyword, text) of a tEXt / zTXt / iTXt chunk body. Raises ValueError if malformed."""
+    key, sep, rest = body.partition(b"\0")
+    if not sep:
+        raise ValueError("no keyword separator")
+    keyword = key.decode("latin-1")
+    try:
+        if ctype == b"tEXt":
+            return keyword, rest.decode("latin-1")
+        if ctype == b"zTXt":
+            return keyword, zlib.decompress(rest[1:]).decode("latin-1")
+        # iTXt: compression flag, method, language tag \0, translated keyword \0, UTF-8 text
+        compressed = rest[:1] == b"\1"
+        _, _, rest = rest[2:].partition(b"\0")
+        _, _, text = rest.partition(b"\0")
+        if compressed:
+            text = zlib.decompress(text)
+        return keyword, text.decode("utf-8")
+    except (zlib.error, UnicodeDecodeError) as e:
+        raise ValueError(str(e)) from None
+
+def _check_index_entry(e):
+    if not all(k in e for k in INDEX_SCAN_FIELDS):
+        e['mtime'] = 0  # shows as changed, so the background scan fills in the new fields
+    return e
+
+def load_index_cache(path):
+    """Read a cards.json index. Returns [] if it is missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except FileNotFoundError:
+        return []
+    except Exception:
+        LOG.exception("Failed to read cards.json")
+        return []
+    if not isinstance(cached, list):
+        return []
+    return [_check_index_entry(e) for e in cached if isinstance(e, dict) and 'filename' in e and 'mtime' in e]
+
+INDEX_JOURNAL_FILE = "cards.journal"
+JOURNAL_COMPACT_MIN_BYTES = 256 * 1024  # journals smaller than this are never compacted
+JOURNAL_COMPACT_RATIO = 0.5             # ... otherwise compact once past this fraction of cards.json
+
+def replay_index_journal(records, path):
+    """
+    Apply a cards.journal to the records of the cards.json it sits next to.
+    Records hold whole entries, so replaying one twice is harmless; a torn
+    line from a crash mid-append is skipped.
+    """
+    try:
+        f = open(path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return records
+    except OSError:
+        LOG.exception("Failed to read %s", path)
+        return records
+    by_name = {e['filename']: e for e in records}
+    with f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            put = rec.get("put") if isinstance(rec, dict) else None
+            if isinstance(put, dict) and 'filename' in put and 'mtime' in put:
+                by_name[put['filename']] = _check_index_entry(put)
+            elif isinstance(rec, dict) and "del" in rec:
+                by_name.pop(rec["del"], None)
+    return list(by_name.values())
+
+class IndexJournal:
+    """
+    Append-only log of index changes next to the cards.json snapshot.
+
+    A save appends one JSON line per changed card instead of rewriting the
+    whole index; compact() folds the log into a fresh snapshot once it has
+    grown. Apart from construction, only used on the cache writer thread.
+    """
+
+    def __init__(self, cache_dir):
+        self.snapshot_path = os.path.join(cache_dir, "cards.json")
+        self.path = os.path.join(cache_dir, INDEX_JOURNAL_FILE)
+        self.compaction_pending = False
+        self._repair_tail()
+        self.journal_bytes = self._size(self.path)
+        self.snapshot_bytes = self._size(self.snapshot_path)
+
+    @staticmethod
+    def _size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def _repair_tail(self):
+        # Cut a torn last line so the next append doesn't run into it
+        try:
+            with open(self.path, "r+b") as f:
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            LOG.exception("Failed to repair %s", self.path)
+
+    def needs_compaction(self):
+        return (not self.compaction_pending and self.journal_bytes >= JOURNAL_COMPACT_MIN_BYTES
+                and self.journal_bytes >= self.snapshot_bytes * JOURNAL_COMPACT_RATIO)
+
+    def append(self, records):
+        """Append take_changes() records; durable once this returns."""
+        if not records:
+            return
+        data = "".join(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n"
+                       for rec in records).encode("utf-8")
+        try:
+            with open(self.path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_bytes += len(data)
+        except OSError:
+            LOG.exception("Failed to append to %s", self.path)
+
+    def compact(self, index):
+        """
+        Write index (a snapshot holding every journaled change) as the new
+        cards.json, then start an empty journal. A crash in between leaves an
+        old journal that replays harmlessly onto the new snapshot.
+        """
+        try:
+            atomic_write_json(self.snapshot_path, index.to_records())
+            with open(self.path, "wb"):
+                pass
+            self.journal_bytes = 0
+            self.snapshot_bytes = self._size(self.snapshot_path)
+        except Exception:
+            LOG.exception("Failed to compact %s", self.path)
+        finally:
+            self.compaction_pending = False
+
+# Where cards.json and the other per-folder caches are kept
+CACHE_LOCATIONS = {
+    "folder": "Inside Card Folder",      # falls back to the local directory if the folder is read-only
+    "local": "Local Cache Directory",    # per-user, keyed by the folder's path; for network shares
+}
+
+def local_cache_root():
+    """Per-user cache directory of the app."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser(r"~\AppData\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "CardViewer")
+
+def local_cache_dir(folder):
+    """Local cache directory for one card folder, keyed by its resolved path."""
+    real = os.path.normcase(os.path.realpath(folder))
+    key = hashlib.sha1(real.encode("utf-8", "surrogatepass")).hexdigest()[:16]
+    return os.path.join(local_cache_root(), "folders", key)
+
+_writable_dirs = {}
+
+def dir_is_writable(path):
+    """Whether files can be created in path; tried once per path and remembered."""
+    if path not in _writable_dirs:
+        try:
+            fd, probe = tempfile.mkstemp(prefix=".cards_probe_", dir=path)
+            os.close(fd)
+            os.remove(probe)
+            _writable_dirs[path] = True
+        except OSError:
+            _writable_dirs[path] = False
+    return _writable_dirs[path]
+
+def resolve_cache_dir(folder, location="folder"):
+    """
+    Directory to keep folder's caches in: the folder itself, or its local cache
+    directory when location is "local" or the folder is read-only.
+    """
+    if location != "local" and dir_is_writable(folder):
+        return folder
+    cache_dir = local_cache_dir(folder)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        label = os.path.join(cache_dir, "folder.txt")
+        if not os.path.exists(label):
+            with open(label, "w", encoding="utf-8") as f:
+                f.write(os.path.realpath(folder) + "\n")  # which library this directory belongs to
+    except OSError:
+        LOG.exception("Failed to create cache directory %s", cache_dir)
+    return cache_dir
+
 def get_png_files(folder):
     return sorted([f for f in os.listdir(folder) if f.lower().endswith('.png')])
 
+STAT_BATCH_SIZE = 256   # directory entries stat'ed together by a parallel sweep
+STAT_WORKERS = 16       # concurrent stat calls; on a network mount each is a round trip
+
+def _stat_entry(de):
+    try:
+        if de.is_file():
+            st = de.stat()
+            return de.name, int(st.st_mtime), st.st_size
+    except OSError:
+        pass
+    return None
+
+def iter_png_stats(folder, parallel=False):
+    """
+    Yield (filename, mtime, size) for the PNGs in folder.
+    Uses scandir so the stat info comes with the directory listing where the OS allows it.
+    parallel: stat in batches across threads, which hides per-file latency on network mounts.
+    """
+    # Windows returns the stat info with the listing; there is nothing to overlap
+    if not parallel or os.name == "nt":
+        with os.scandir(folder) as it:
+            for de in it:
+                if de.name.lower().endswith('.png'):
+                    stat = _stat_entry(de)
+                    if stat is not None:
+                        yield stat
+        return
+    with os.scandir(folder) as it, ThreadPoolExecutor(max_workers=STAT_WORKERS,
+                                                      thread_name_prefix="card-stat") as pool:
+        batch = []
+        for de in it:
+            if de.name.lower().endswith('.png'):
+                batch.append(de)
+                if len(batch) >= STAT_BATCH_SIZE:
+                    yield from filter(None, pool.map(_stat_entry, batch))
+                    batch = []
+        if batch:
+            yield from filter(None, pool.map(_stat_entry, batch))
+
+def file_digest(path):
+    """blake2b digest of a file's contents, read in 1 MB chunks."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def unique_card_name(folder, fname, taken=()):
+    """fname, or "name (2).png", "name (3).png", ... if that is already in folder or in taken."""
+    base, ext = os.path.splitext(fname)
+    candidate = fname
+    i = 2
+    while candidate in taken or os.path.exists(os.path.join(folder, candidate)):
+        candidate = f"{base} ({i}){ext}"
+        i += 1
+    return candidate
+
 def format_filesize(nbytes):
     for unit in ["B","KB","MB","GB"]:
         if nbytes < 1024.0:
@@ -330,168 +939,3864 @@ def format_filesize(nbytes):
     return f"{nbytes:.1f} TB"
 
 # -------------------------
-# Background worker
+# Library validation
 # -------------------------
 
-class ScanWorker(QObject):
-    progress = Signal(int, int)  # processed, total
-    updated_entries = Signal(list)  # list of new/updated index entries
-    finished = Signal()
-
-    def __init__(self, folder, tasks):
-        super().__init__()
-        self.folder = folder
-        self.tasks = tasks  # list of file names to (re)scan
+VALIDATION_CACHE_FILE = "cards_validation.json"
+_B64_WHITESPACE_RE = re.compile(r"[ \t\n\r\f\v]+")  # line-wrapped base64, as base64.encodebytes writes it
+
+# Fields a card must carry, by spec ("" = V1 cards, fields at the top level)
+_V1_FIELDS = ("name", "description", "personality", "scenario", "first_mes", "mes_example")
+_V2_FIELDS = _V1_FIELDS + ("creator_notes", "system_prompt", "post_history_instructions",
+                           "alternate_greetings", "tags", "creator", "character_version", "extensions")
+SPEC_REQUIRED_FIELDS = {
+    "": _V1_FIELDS,
+    "chara_card_v2": _V2_FIELDS,
+    "chara_card_v3": _V2_FIELDS + ("group_only_greetings",),
+}
+# Fields compared when a card carries both a chara and a ccv3 payload
+_PAYLOAD_COMPARE_FIELDS = _V1_FIELDS + ("creator", "tags", "creator_notes", "system_prompt",
+                                        "post_history_instructions", "alternate_greetings")
 
-    def run(self):
-        new_entries = []
-        total = len(self.tasks)
-        for i, fname in enumerate(self.tasks, 1):
+def validate_card_file(path):
+    """
+    Integrity check of one card PNG.
+    Returns a list of [severity, problem, details] ("error" or "warning"); empty if the card is fine.
+    """
+    issues = []
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError as e:
+        return [["error", "Unreadable", str(e)]]
+    if not raw.startswith(PNG_SIGNATURE):
+        return [["error", "Not a PNG", "missing PNG signature"]]
+
+    data = memoryview(raw)
+    pos = len(PNG_SIGNATURE)
+    payloads = {}
+    bad_crc = []
+    truncated = False
+    seen_iend = False
+    while pos < len(raw):
+        if pos + 8 > len(raw):
+            truncated = True
+            issues.append(["error", "Truncated PNG", f"chunk header cut off at offset {pos}"])
+            break
+        length, ctype = struct.unpack(">I4s", data[pos:pos + 8])
+        end = pos + 12 + length
+        if end > len(raw):
+            truncated = True
+            issues.append(["error", "Truncated PNG",
+                           f"{ctype.decode('latin-1')} chunk at offset {pos} runs past the end of the file"])
+            break
+        body = data[pos + 8:end - 4]
+        (crc,) = struct.unpack(">I", data[end - 4:end])
+        if zlib.crc32(body, zlib.crc32(ctype)) & 0xffffffff != crc:
+            bad_crc.append(f"{ctype.decode('latin-1')}@{pos}")
+        if ctype in PNG_TEXT_CHUNKS:
             try:
-                fpath = os.path.join(self.folder, fname)
-                mtime = int(os.path.getmtime(fpath))
-                creator, tags = get_basic_index_info(fpath)
-                new_entries.append({
-                    "filename": fname,
-                    "mtime": mtime,
-                    "creator": creator,
-                    "tags": tags
-                })
-            except Exception:
-                LOG.exception("Failed scanning %s", fname)
-            self.progress.emit(i, total)
-        self.updated_entries.emit(new_entries)
-        self.finished.emit()
+                key, text = decode_png_text_chunk(ctype, bytes(body))
+            except ValueError as e:
+                issues.append(["error", "Bad text chunk", f"{ctype.decode('latin-1')} at offset {pos}: {e}"])
+            else:
+                if key in ("chara", "ccv3") and key not in payloads:
+                    payloads[key] = text
+        pos = end
+        if ctype == b"IEND":
+            seen_iend = True
+            break
+    if not truncated and not seen_iend:
+        issues.append(["error", "Truncated PNG", "no IEND chunk"])
+    if bad_crc:
+        issues.append(["error", "Bad chunk CRC", ", ".join(bad_crc)])
+
+    if not payloads:
+        issues.append(["warning", "No card data", "no chara or ccv3 text chunk"])
+        return issues
+
+    decoded = {}
+    for key, text in payloads.items():
+        try:
+            blob = base64.b64decode(_B64_WHITESPACE_RE.sub("", text), validate=True)
+        except (binascii.Error, ValueError) as e:
+            issues.append(["error", "Undecodable base64", f"{key}: {e}"])
+            continue
+        try:
+            card = json.loads(blob.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError) as e:
+            issues.append(["error", "Invalid JSON", f"{key}: {e}"])
+            continue
+        if not isinstance(card, dict):
+            issues.append(["error", "Invalid JSON", f"{key}: top level is {type(card).__name__}, not an object"])
+            continue
+        decoded[key] = card
+
+        spec = card.get("spec") if isinstance(card.get("spec"), str) else ""
+        required = SPEC_REQUIRED_FIELDS.get(spec)
+        if required is None:
+            issues.append(["warning", "Unknown spec", f"{key}: spec '{spec}'"])
+            continue
+        fields = card if not spec else card.get("data")
+        if not isinstance(fields, dict):
+            issues.append(["error", "Missing spec fields", f"{key}: {spec} card without a data object"])
+            continue
+        missing = [f for f in required if f not in fields]
+        if missing:
+            issues.append(["warning", "Missing spec fields", f"{key}: " + ", ".join(missing)])
+
+    if "chara" in decoded and "ccv3" in decoded:
+        a = _merge_card_data(decoded["chara"])
+        b = _merge_card_data(decoded["ccv3"])
+        differ = [f for f in _PAYLOAD_COMPARE_FIELDS if f in a and f in b and a[f] != b[f]]
+        if differ:
+            issues.append(["warning", "chara/ccv3 disagree", ", ".join(differ)])
+    return issues
+
+def validate_library(folder, progress=None, use_cache=True, cancelled=None, cache_dir=None):
+    """
+    Validate every card in folder, in parallel across processes.
+    Results are cached by (mtime_ns, size) in cards_validation.json (in cache_dir,
+    default the folder), so a re-run only re-checks files that changed.
+    progress(done, total) is called as the re-checks complete; cancelled() may
+    return True to stop early.
+    Returns (results {filename: issues}, number of files re-checked).
+    """
+    cache_path = os.path.join(cache_dir or folder, VALIDATION_CACHE_FILE)
+    cached = {}
+    if use_cache:
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            LOG.exception("Failed to read %s", VALIDATION_CACHE_FILE)
+
+    results = {}
+    fingerprints = {}
+    todo = []
+    with os.scandir(folder) as it:
+        for de in it:
+            if not de.name.lower().endswith(".png"):
+                continue
+            try:
+                st = de.stat()
+            except OSError:
+                continue
+            fp = [st.st_mtime_ns, st.st_size]
+            fingerprints[de.name] = fp
+            hit = cached.get(de.name) if isinstance(cached, dict) else None
+            if isinstance(hit, dict) and hit.get("fp") == fp and isinstance(hit.get("issues", []), list):
+                results[de.name] = hit.get("issues", [])
+            else:
+                todo.append(de.name)
+
+    todo.sort()
+    total = len(todo)
+    if total:
+        paths = [os.path.join(folder, f) for f in todo]
+        if total < 32:
+            checked = map(validate_card_file, paths)  # not worth starting processes
+            executor = None
+        else:
+            # spawn, not fork: the GUI process has Qt and other threads running
+            executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 2,
+                                           mp_context=multiprocessing.get_context("spawn"))
+            checked = executor.map(validate_card_file, paths, chunksize=16)
+        try:
+            for done, (fname, issues) in enumerate(zip(todo, checked), 1):
+                results[fname] = issues
+                if progress:
+                    progress(done, total)
+                if cancelled and cancelled():
+                    break
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    try:
+        atomic_write_json(cache_path, {f: {"fp": fingerprints[f], "issues": results[f]}
+                                       for f in results if f in fingerprints})
+    except Exception:
+        LOG.exception("Failed to save %s", VALIDATION_CACHE_FILE)
+    return results, total
+
+def write_validation_report(path, results):
+    """Export validation results as CSV (by extension) or JSON."""
+    rows = [(fname, sev, problem, details)
+            for fname in sorted(results) for sev, problem, details in results[fname]]
+    if path.lower().endswith(".csv"):
+        import csv
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["file", "severity", "problem", "details"])
+            writer.writerows(rows)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([dict(zip(("file", "severity", "problem", "details"), r)) for r in rows],
+                      f, ensure_ascii=False, indent=2)
+
+def summarize_validation(results, rechecked):
+    errors = sum(1 for issues in results.values() for i in issues if i[0] == "error")
+    warnings = sum(1 for issues in results.values() for i in issues if i[0] == "warning")
+    bad = sum(1 for issues in results.values() if issues)
+    return (f"{len(results)} card(s) checked ({rechecked} re-checked): "
+            f"{errors} error(s), {warnings} warning(s) in {bad} file(s)")
 
 # -------------------------
-# UI Widgets
+# Lossless PNG optimization
 # -------------------------
 
-class CardDetails(QWidget):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        layout = QVBoxLayout()
-        layout.setAlignment(Qt.AlignmentFlag.AlignTop)
-
-        self.image_label = QLabel()
-        self.image_label.setFixedSize(180, 220)
-        self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        layout.addWidget(self.image_label)
+OPTIMIZE_CACHE_FILE = "cards_optimized.json"
+OPTIMIZE_LEVEL = 9
+OPTIMIZE_MIN_SAVING = 64          # bytes; smaller wins aren't worth rewriting a file for
+OPTIMIZE_IDAT_CHUNK = 1 << 20     # image data is written in IDAT chunks of this size
+# Ancillary chunks that change how the image looks; the others are dropped, card chunks aside
+_OPTIMIZE_KEEP = frozenset((b"tRNS", b"gAMA", b"cHRM", b"sRGB", b"iCCP", b"sBIT", b"pHYs"))
+_APNG_CHUNKS = frozenset((b"acTL", b"fcTL", b"fdAT"))
+_OPTIMIZE_STRATEGIES = (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)
 
-        self.meta_area = QScrollArea()
-        self.meta_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.meta_area.setWidgetResizable(True)
-        self.meta_widget = QWidget()
-        self.meta_layout = QVBoxLayout()
-        self.meta_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
-        self.meta_widget.setLayout(self.meta_layout)
-        self.meta_area.setWidget(self.meta_widget)
-        layout.addWidget(self.meta_area)
+def optimize_card_png(data, level=OPTIMIZE_LEVEL):
+    """
+    A losslessly smaller copy of a card PNG, or None if it can't be made
+    meaningfully smaller. The image data is deflated again as it is (same
+    filtered scanlines, better compression), and ancillary chunks that don't
+    change how the image looks (tIME, eXIf, other text chunks, ...) are dropped.
+    The chara/ccv3 card chunks and anything after IEND are kept byte for byte.
+    Animated PNGs are left alone. Raises ValueError for malformed files.
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("not a PNG file")
+    chunks = []  # (type, whole chunk bytes), None for where the image data goes
+    idat = []
+    pos = len(PNG_SIGNATURE)
+    ended = False
+    while pos + 12 <= len(data):
+        length, ctype = struct.unpack_from(">I4s", data, pos)
+        end = pos + 12 + length
+        if end > len(data):
+            raise ValueError("truncated chunk")
+        if ctype in _APNG_CHUNKS:
+            return None
+        if ctype == b"IDAT":
+            if not idat:
+                chunks.append((ctype, None))
+            idat.append(data[pos + 8:end - 4])
+        else:
+            chunks.append((ctype, data[pos:end]))
+        pos = end
+        if ctype == b"IEND":
+            ended = True
+            break
+    if not ended or not idat:
+        raise ValueError("no image data" if ended else "no IEND chunk")
+    try:
+        raw = zlib.decompress(b"".join(idat))
+    except zlib.error as e:
+        raise ValueError(f"image data: {e}") from None
+    best = None
+    for strategy in _OPTIMIZE_STRATEGIES:
+        comp = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, 9, strategy)
+        packed = comp.compress(raw) + comp.flush()
+        if best is None or len(packed) < len(best):
+            best = packed
+    parts = [PNG_SIGNATURE]
+    for ctype, chunk in chunks:
+        if chunk is None:
+            parts.extend(_png_chunk(b"IDAT", best[i:i + OPTIMIZE_IDAT_CHUNK])
+                         for i in range(0, len(best), OPTIMIZE_IDAT_CHUNK))
+        elif (not ctype[0] & 0x20 or ctype in _OPTIMIZE_KEEP  # critical chunks have an upper-case first letter
+              or (ctype in PNG_TEXT_CHUNKS and chunk[8:8 + 80].partition(b"\0")[0] in CARD_TEXT_KEYWORDS)):
+            parts.append(chunk)
+    parts.append(data[pos:])
+    out = b"".join(parts)
+    return out if len(out) + OPTIMIZE_MIN_SAVING <= len(data) else None
+
+def optimize_card_file(path):
+    """
+    Optimize one card in place (see optimize_card_png): the smaller copy is
+    written next to it and renamed over it, with the original's modification
+    time, so it reads as the same card. A file that changes meanwhile is left alone.
+    Returns (mtime_ns, size before, size after or None if left as is, error or None).
+    """
+    try:
+        st, data = read_card_file(path)
+        out = optimize_card_png(data)
+        if out is None:
+            return st.st_mtime_ns, st.st_size, None, None
+        # Not a .png, so the stat sweep never sees a half-written card
+        fd, tmp = tempfile.mkstemp(prefix=".cards_opt_", suffix=".part", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(out)
+                f.flush()
+                os.fsync(f.fileno())
+            shutil.copymode(path, tmp)
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+            now = os.stat(path)
+            if (now.st_mtime_ns, now.st_size) != (st.st_mtime_ns, st.st_size):
+                raise OSError("the file changed while it was being optimized")
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return st.st_mtime_ns, st.st_size, len(out), None
+    except (OSError, ValueError) as e:
+        return None, None, None, str(e)
 
-        self.delete_btn = QPushButton("Delete Card")
-        self.delete_btn.setObjectName("DeleteCardBtn")
-        self.delete_btn.setEnabled(False)
-        layout.addWidget(self.delete_btn, alignment=Qt.AlignmentFlag.AlignLeft)
+def optimize_library(folder, progress=None, use_cache=True, cancelled=None, cache_dir=None):
+    """
+    Optimize every card in folder in place, in parallel across processes.
+    Files already optimized (or found not worth it) are remembered by
+    (mtime_ns, size) in cards_optimized.json (in cache_dir, default the
+    folder) and skipped next time. progress(done, total) is called as files
+    complete; cancelled() may return True to stop early.
+    Returns (replaced {filename: (size before, size after)}, files checked, [(filename, error)]).
+    """
+    cache_path = os.path.join(cache_dir or folder, OPTIMIZE_CACHE_FILE)
+    cached = {}
+    if use_cache:
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            LOG.exception("Failed to read %s", OPTIMIZE_CACHE_FILE)
+    if not isinstance(cached, dict):
+        cached = {}
+
+    done_fps = {}
+    todo = []
+    with os.scandir(folder) as it:
+        for de in it:
+            if not de.name.lower().endswith(".png"):
+                continue
+            try:
+                st = de.stat()
+            except OSError:
+                continue
+            fp = [st.st_mtime_ns, st.st_size]
+            if cached.get(de.name) == fp:
+                done_fps[de.name] = fp
+            else:
+                todo.append(de.name)
+
+    todo.sort()
+    total = len(todo)
+    replaced = {}
+    errors = []
+    if total:
+        paths = [os.path.join(folder, f) for f in todo]
+        if total < 4:
+            results = map(optimize_card_file, paths)  # not worth starting processes
+            executor = None
+        else:
+            # spawn, not fork: the GUI process has Qt and other threads running
+            executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 2,
+                                           mp_context=multiprocessing.get_context("spawn"))
+            results = executor.map(optimize_card_file, paths)
+        try:
+            for done, (fname, (mtime_ns, before, after, error)) in enumerate(zip(todo, results), 1):
+                if error is not None:
+                    errors.append((fname, error))
+                else:
+                    done_fps[fname] = [mtime_ns, after if after is not None else before]
+                    if after is not None:
+                        replaced[fname] = (before, after)
+                if progress:
+                    progress(done, total)
+                if cancelled and cancelled():
+                    break
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
 
+    try:
+        atomic_write_json(cache_path, done_fps)
+    except Exception:
+        LOG.exception("Failed to save %s", OPTIMIZE_CACHE_FILE)
+    return replaced, total, errors
 
-        self.setLayout(layout)
-       
+def summarize_optimization(replaced, checked, errors):
+    before = sum(b for b, _ in replaced.values())
+    saved = before - sum(a for _, a in replaced.values())
+    text = (f"{checked} card(s) checked, {len(replaced)} made smaller: saved {format_filesize(saved)}"
+            + (f" ({saved * 100 / before:.1f}% of those files)" if before else ""))
+    return text + (f", {len(errors)} could not be optimized" if errors else "")
 
+# -------------------------
+# Card history
+# -------------------------
 
-    def show_info_message(self, text, error=False):
-        # Clear out all previous widgets
-        color = "red" if error else "#888"
-        label = QLabel(f"<span style='color:{color}'><i>{text}</i></span>")
-        label.setWordWrap(True)
-        self.meta_layout.addWidget(label)
-        self.delete_btn.setEnabled(False)
+HISTORY_FILE = "cards_history.sqlite"
+HISTORY_DEFAULT_BUDGET_MB = 256
+CARD_TEXT_KEYWORDS = (b"chara", b"ccv3")
 
-    def show_image(self, pixmap: QPixmap | None):
-        if pixmap is None:
-            self.image_label.clear()
+def card_image_bytes(data):
+    """
+    A card PNG's bytes without its card-data text chunks, so the image can be
+    hashed and stored apart from the metadata. Malformed files come back whole.
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        return data
+    parts = [PNG_SIGNATURE]
+    pos = len(PNG_SIGNATURE)
+    while pos + 12 <= len(data):
+        length, ctype = struct.unpack(">I4s", data[pos:pos + 8])
+        end = pos + 12 + length
+        if end > len(data):
+            return data
+        if not (ctype in PNG_TEXT_CHUNKS
+                and data[pos + 8:end - 4].partition(b"\0")[0] in CARD_TEXT_KEYWORDS):
+            parts.append(data[pos:end])
+        pos = end
+        if ctype == b"IEND":
+            break
+    return b"".join(parts)
+
+def json_delta(new, old):
+    """
+    Delta that turns dict new back into dict old: {key: ["=", value]} to set,
+    {key: ["-"]} to drop, {key: ["~", delta]} for a nested dict that changed.
+    """
+    delta = {}
+    for k, v in old.items():
+        if k not in new:
+            delta[k] = ["=", v]
+        elif new[k] != v:
+            if isinstance(v, dict) and isinstance(new[k], dict):
+                delta[k] = ["~", json_delta(new[k], v)]
+            else:
+                delta[k] = ["=", v]
+    for k in new:
+        if k not in old:
+            delta[k] = ["-"]
+    return delta
+
+def apply_json_delta(new, delta):
+    """The older dict a json_delta(new, old) was taken from."""
+    old = dict(new)
+    for k, op in delta.items():
+        if op[0] == "=":
+            old[k] = op[1]
+        elif op[0] == "-":
+            old.pop(k, None)
         else:
-            self.image_label.setPixmap(pixmap)
+            old[k] = apply_json_delta(old.get(k) or {}, op[1])
+    return old
 
-    @staticmethod
-    def _linkify(text: str) -> str:
-        # very basic linkify for http(s) and mailto
-        import re
-        def repl(match):
-            url = match.group(0)
-            return f'<a href="{url}">{url}</a>'
-        # http/https
-        text = re.sub(r'(https?://[^\s<]+)', repl, text)
-        # mailto
-        text = re.sub(r'(mailto:[^\s<]+)', repl, text)
-        return text
-    
-    def _add_collapsible_section(self, title: str):
-        """Returns the inner VBoxLayout you can add widgets to."""
-        # make them children of the scroll area's content widget
-        btn = QPushButton(f"{title} ▸", parent=self.meta_widget)
-        btn.setCheckable(True)
-        btn.setChecked(False)
-        btn.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+def _pack_json(obj):
+    return zlib.compress(json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9)
 
-        container = QWidget(parent=self.meta_widget)
-        container.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
+def _unpack_json(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
 
-        inner = QVBoxLayout()
-        inner.setContentsMargins(16, 4, 0, 6)  # small indent
-        inner.setSpacing(4)
-        container.setLayout(inner)
-        container.setVisible(False)
+class HistoryStore:
+    """
+    Earlier versions of a folder's cards, recorded as the scanner parses them.
+
+    Per card the newest version is stored whole and each older one as a
+    zlib-compressed json_delta against the version after it, so a metadata
+    edit costs about the size of the edit. Images are stored once per content
+    hash, and only while the store is under its budget. flush() commits and
+    prunes back under budget: superseded versions go first, oldest first,
+    then the images of the oldest current versions. The current versions'
+    metadata is always kept. Safe to use from several threads.
+    """
 
-        def on_toggle(checked: bool):
-            container.setVisible(checked)
-            btn.setText(f"{title} {'▾' if checked else '▸'}")
-        btn.toggled.connect(on_toggle)
+    def __init__(self, cache_dir, budget_mb=HISTORY_DEFAULT_BUDGET_MB):
+        import sqlite3
+        self.path = os.path.join(cache_dir, HISTORY_FILE)
+        self.budget = budget_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")  # only takes on a new file
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS versions (
+                id INTEGER PRIMARY KEY,
+                filename TEXT NOT NULL,
+                recorded REAL NOT NULL,
+                mtime INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                image TEXT,
+                head INTEGER NOT NULL,
+                payload BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS versions_by_file ON versions (filename, id);
+            CREATE TABLE IF NOT EXISTS images (hash TEXT PRIMARY KEY, data BLOB NOT NULL);
+        """)
+        self._conn.commit()
+        self._stored = self._stored_bytes()
+        # The viewer's reads go through their own connection: with WAL they see the last
+        # flush() without waiting for a scanner that is recording or pruning
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(self.path, check_same_thread=False)
+        self._reader.execute("PRAGMA query_only = ON")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+        with self._read_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+    def _stored_bytes(self):
+        versions = self._conn.execute("SELECT COALESCE(SUM(LENGTH(payload)), 0) FROM versions").fetchone()[0]
+        images = self._conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM images").fetchone()[0]
+        return versions + images
+
+    def is_empty(self):
+        with self._read_lock:
+            return self._reader is None or self._reader.execute("SELECT 1 FROM versions LIMIT 1").fetchone() is None
+
+    def record(self, fname, st, data, meta):
+        """
+        Note the card fname as just parsed: st and data from read_card_file,
+        meta from read_card_metadata. Nothing is written if it matches the
+        newest recorded version.
+        """
+        meta = meta or {}
+        nested = meta.get("data")
+        if isinstance(nested, dict):
+            # Undo read_card_metadata's merge, so versions are stored the way the card holds them
+            meta = {k: v for k, v in meta.items() if k == "data" or k not in nested or nested[k] != v}
+        image = card_image_bytes(data)
+        image_hash = hashlib.blake2b(image, digest_size=20).hexdigest()
+        try:
+            with self._lock:
+                conn = self._conn
+                if conn is None:
+                    return
+                head = conn.execute("SELECT id, image, payload FROM versions WHERE filename = ? AND head = 1",
+                                    (fname,)).fetchone()
+                if head is not None:
+                    previous = _unpack_json(head[2])
+                    if previous == meta and head[1] == image_hash:
+                        return
+                    delta = _pack_json(json_delta(meta, previous))
+                    conn.execute("UPDATE versions SET head = 0, payload = ? WHERE id = ?", (delta, head[0]))
+                    self._stored += len(delta) - len(head[2])
+                payload = _pack_json(meta)
+                conn.execute("INSERT INTO versions (filename, recorded, mtime, size, image, head, payload) "
+                             "VALUES (?, ?, ?, ?, ?, 1, ?)",
+                             (fname, time.time(), int(st.st_mtime), st.st_size, image_hash, payload))
+                self._stored += len(payload)
+                if self._stored + len(image) <= self.budget:
+                    if conn.execute("INSERT OR IGNORE INTO images (hash, data) VALUES (?, ?)",
+                                    (image_hash, image)).rowcount:
+                        self._stored += len(image)
+        except Exception:
+            LOG.exception("Failed to record history of %s", fname)
 
-        self.meta_layout.addWidget(btn)
-        self.meta_layout.addWidget(container)
-        return inner
+    def flush(self):
+        """Commit recorded versions and prune back under the budget."""
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                if self._stored > self.budget:
+                    self._prune()
+                self._conn.commit()
+            except Exception:
+                LOG.exception("Failed to update %s", self.path)
+
+    def _prune(self):
+        conn = self._conn
+        over = self._stored - self.budget
+        doomed = []
+        for vid, nbytes in conn.execute("SELECT id, LENGTH(payload) FROM versions WHERE head = 0 ORDER BY id"):
+            if over <= 0:
+                break
+            doomed.append((vid,))
+            over -= nbytes
+        conn.executemany("DELETE FROM versions WHERE id = ?", doomed)
+        conn.execute("DELETE FROM images WHERE hash NOT IN (SELECT image FROM versions WHERE image IS NOT NULL)")
+        self._stored = self._stored_bytes()
+        over = self._stored - self.budget
+        if over > 0:
+            doomed = []
+            for image_hash, nbytes in conn.execute(
+                    "SELECT i.hash, LENGTH(i.data) FROM images i JOIN versions v ON v.image = i.hash "
+                    "GROUP BY i.hash ORDER BY MAX(v.id)"):
+                if over <= 0:
+                    break
+                doomed.append((image_hash,))
+                over -= nbytes
+            conn.executemany("DELETE FROM images WHERE hash = ?", doomed)
+            self._stored = self._stored_bytes()
+        conn.commit()
+        conn.execute("PRAGMA incremental_vacuum")
+
+    def rename(self, pairs):
+        """
+        Carry the history of renamed cards over to their new names: pairs of
+        (old, new). History a new name already had, from a card deleted
+        earlier, is dropped rather than interleaved with the renamed card's.
+        """
+        pairs = [(old, new) for old, new in pairs if old != new]
+        if not pairs:
+            return
+        with self._lock:
+            if self._conn is None:
+                return
+            conn = self._conn
+            try:
+                # Park the old names first, so chains and swaps (a -> b, b -> c) don't merge histories
+                parked = ["\0rename\0%d" % i for i in range(len(pairs))]
+                conn.executemany("UPDATE versions SET filename = ? WHERE filename = ?",
+                                 [(park, old) for park, (old, _new) in zip(parked, pairs)])
+                conn.executemany("DELETE FROM versions WHERE filename = ?", [(new,) for _old, new in pairs])
+                conn.executemany("UPDATE versions SET filename = ? WHERE filename = ?",
+                                 [(new, park) for park, (_old, new) in zip(parked, pairs)])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                LOG.exception("Failed to rename history in %s", self.path)
+                return
+            self._stored = self._stored_bytes()
 
-    def _clear_metadata(self):
-        while self.meta_layout.count():
-            item = self.meta_layout.takeAt(0)
-            widget = item.widget()
-            if widget is not None:
-                widget.deleteLater()
+    def forget(self, fnames):
+        """Drop the history of cards that left the folder, so a later card of the same name starts afresh."""
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.executemany("DELETE FROM versions WHERE filename = ?", [(f,) for f in fnames])
+            self._conn.commit()
+            self._stored = self._stored_bytes()
+
+    def count(self, fname):
+        """Number of versions of fname as of the last flush()."""
+        with self._read_lock:
+            if self._reader is None:
+                return 0
+            return self._reader.execute("SELECT COUNT(*) FROM versions WHERE filename = ?", (fname,)).fetchone()[0]
+
+    def versions(self, fname):
+        """
+        Recorded versions of fname as of the last flush(), newest first, as
+        dicts with recorded, mtime, size, image (content hash) and meta.
+        """
+        with self._read_lock:
+            if self._reader is None:
+                return []
+            rows = self._reader.execute("SELECT recorded, mtime, size, image, head, payload FROM versions "
+                                      "WHERE filename = ? ORDER BY id DESC", (fname,)).fetchall()
+        result = []
+        meta = None
+        for recorded, mtime, size, image, head, payload in rows:
+            meta = _unpack_json(payload) if head or meta is None else apply_json_delta(meta, _unpack_json(payload))
+            result.append({"recorded": recorded, "mtime": mtime, "size": size, "image": image, "meta": meta})
+        return result
+
+    def image(self, image_hash):
+        """Stored image bytes for a content hash, or None if they were not kept."""
+        with self._read_lock:
+            if self._reader is None:
+                return None
+            row = self._reader.execute("SELECT data FROM images WHERE hash = ?", (image_hash,)).fetchone()
+        return row[0] if row else None
 
+# -------------------------
+# Shared card cache
+# -------------------------
 
-    def show_metadata(self, meta, clickable_links=True):
-        for i in reversed(range(self.meta_layout.count())):
-            widget = self.meta_layout.itemAt(i).widget()
-            if widget:
-                widget.setParent(None)
+SHARED_CACHE_FILE = "shared_cards.sqlite"  # in local_cache_root()
+SHARED_CACHE_GC_INTERVAL = 7 * 24 * 3600   # seconds between automatic clean-ups
+THUMB_SIZE = (180, 220)
+THUMB_JPEG_QUALITY = 85
 
-        def add_field(label, value):
-            if value is None or value == "" or value == "none":
-                return
-            l = QLabel(f"<b>{label}:</b>")
-            l.setWordWrap(True)
-            self.meta_layout.addWidget(l)
-            v = QLabel()
-            v.setWordWrap(True)
-            if isinstance(value, list):
-                value = ", ".join(map(str, value))
-            value_str = str(value)
-            if clickable_links:
-                v.setTextFormat(Qt.TextFormat.RichText)
-                v.setOpenExternalLinks(True)
-                v.setText(self._linkify(value_str))
-            else:
-                v.setText(value_str)
-            self.meta_layout.addWidget(v)
+def card_content_hash(data):
+    """
+    Hex digest of a card's image and text chunks. Copies of a card hash the same
+    whatever their file times or other ancillary chunks; unparsable files hash whole.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if not data.startswith(PNG_SIGNATURE):
+        h.update(data)
+        return h.hexdigest()
+    view = memoryview(data)
+    pos = len(PNG_SIGNATURE)
+    while pos + 12 <= len(data):
+        length, ctype = struct.unpack_from(">I4s", data, pos)
+        end = pos + 12 + length
+        # Critical chunks (IHDR, PLTE, IDAT, IEND) have an upper-case first letter
+        if not ctype[0] & 0x20 or ctype in PNG_TEXT_CHUNKS:
+            h.update(view[pos + 4:end - 4])
+        pos = end
+        if ctype == b"IEND":
+            break
+    if pos < len(data):
+        h.update(view[pos:])  # truncated chunk or trailing data: keep it in the key
+    return h.hexdigest()
+
+def card_thumbnail_jpeg(data, size=THUMB_SIZE):
+    """JPEG thumbnail bytes of a card PNG, as kept in the shared cache and library packs."""
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as im:
+        thumb = im.convert("RGB").resize(size, Image.LANCZOS)
+    out = io.BytesIO()
+    thumb.save(out, "JPEG", quality=THUMB_JPEG_QUALITY)
+    return out.getvalue()
+
+def _folder_key(folder):
+    return os.path.normcase(os.path.realpath(folder))
+
+class SharedCardCache:
+    """
+    Index fields and thumbnails computed once per distinct card and shared by
+    every folder, in the per-user cache directory.
+
+    cards holds a row per card content (card_content_hash); refs notes which
+    folder file currently has which content, with the mtime and size it had.
+    A card copied into another folder is indexed from its row instead of being
+    parsed again, and its thumbnail is found through refs without reading the
+    file. Scans keep refs current; gc() drops refs of folders that are gone and
+    then every card no ref points at. Safe to use from several threads.
+    """
 
-        if not meta:
-            l = QLabel("<span style='color:red'>Could not load card metadata.</span>")
+    def __init__(self, root=None):
+        import sqlite3
+        root = root or local_cache_root()
+        os.makedirs(root, exist_ok=True)
+        self.path = os.path.join(root, SHARED_CACHE_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")  # only takes on a new file
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cards (
+                hash TEXT PRIMARY KEY,
+                fields TEXT,
+                thumb BLOB
+            );
+            CREATE TABLE IF NOT EXISTS refs (
+                folder TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                mtime INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (folder, filename)
+            );
+            CREATE INDEX IF NOT EXISTS refs_by_hash ON refs (hash);
+            CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value);
+        """)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+
+    def flush(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+
+    def fields(self, content):
+        """Index fields (as from index_fields) of a card content hash, or None if not cached."""
+        with self._lock:
+            if self._conn is None:
+                return None
+            row = self._conn.execute("SELECT fields FROM cards WHERE hash = ?", (content,)).fetchone()
+        if not row or row[0] is None:
+            return None
+        fields = json.loads(row[0])
+        # Rows written by an older version lack newer fields and are recomputed
+        return fields if all(f in fields for f in INDEX_SCAN_FIELDS) else None
+
+    def _ref(self, conn, folder, fname, st, content):
+        conn.execute("INSERT OR REPLACE INTO refs (folder, filename, mtime, size, hash) VALUES (?, ?, ?, ?, ?)",
+                     (_folder_key(folder), fname, int(st.st_mtime), st.st_size, content))
+
+    def store(self, folder, fname, st, content, fields):
+        """Note that folder/fname (stat_result st) has this content, and cache its index fields."""
+        with self._lock:
+            conn = self._conn
+            if conn is None:
+                return
+            conn.execute("INSERT INTO cards (hash, fields) VALUES (?, ?) "
+                         "ON CONFLICT (hash) DO UPDATE SET fields = excluded.fields",
+                         (content, json.dumps(fields, ensure_ascii=False)))
+            self._ref(conn, folder, fname, st, content)
+
+    def store_thumbnail(self, folder, fname, st, content, jpeg):
+        with self._lock:
+            conn = self._conn
+            if conn is None:
+                return
+            conn.execute("INSERT INTO cards (hash, thumb) VALUES (?, ?) "
+                         "ON CONFLICT (hash) DO UPDATE SET thumb = excluded.thumb", (content, jpeg))
+            self._ref(conn, folder, fname, st, content)
+            conn.commit()
+
+    def thumbnail(self, folder, fname, mtime, size):
+        """
+        Cached JPEG thumbnail of folder/fname, or None. Only found while the
+        file still has the mtime and size it had when its content was hashed.
+        """
+        with self._lock:
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT c.thumb FROM refs r JOIN cards c ON c.hash = r.hash "
+                "WHERE r.folder = ? AND r.filename = ? AND r.mtime = ? AND r.size = ?",
+                (_folder_key(folder), fname, int(mtime), size)).fetchone()
+        return row[0] if row else None
+
+    def unlink(self, folder, fnames):
+        """Forget folder's refs to files that were deleted; gc() reclaims what no one uses."""
+        with self._lock:
+            if self._conn is None:
+                return
+            key = _folder_key(folder)
+            self._conn.executemany("DELETE FROM refs WHERE folder = ? AND filename = ?",
+                                   [(key, f) for f in fnames])
+            self._conn.commit()
+
+    def move(self, moves):
+        """Point refs at the new place of moved files: moves of (old folder, old name, new folder, new name)."""
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.executemany(
+                "UPDATE OR REPLACE refs SET folder = ?, filename = ? WHERE folder = ? AND filename = ?",
+                [(_folder_key(nf), nn, _folder_key(of), on) for of, on, nf, nn in moves])
+            self._conn.commit()
+
+    def due_for_gc(self):
+        with self._lock:
+            if self._conn is None:
+                return False
+            row = self._conn.execute("SELECT value FROM info WHERE key = 'last_gc'").fetchone()
+        return row is None or time.time() - row[0] >= SHARED_CACHE_GC_INTERVAL
+
+    def gc(self):
+        """
+        Drop refs of folders that no longer exist, then the cards nothing refers
+        to. Returns (refs dropped, cards dropped).
+        """
+        with self._lock:
+            if self._conn is None:
+                return 0, 0
+            folders = [f for (f,) in self._conn.execute("SELECT DISTINCT folder FROM refs")]
+        gone = [(f,) for f in folders if not os.path.isdir(f)]  # stat outside the lock: may be a slow share
+        with self._lock:
+            conn = self._conn
+            if conn is None:
+                return 0, 0
+            refs = conn.executemany("DELETE FROM refs WHERE folder = ?", gone).rowcount if gone else 0
+            cards = conn.execute("DELETE FROM cards WHERE hash NOT IN (SELECT hash FROM refs)").rowcount
+            conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('last_gc', ?)", (time.time(),))
+            conn.commit()
+            conn.execute("PRAGMA incremental_vacuum")
+        return refs, cards
+
+    def stats(self):
+        """(cards, refs, bytes on disk)."""
+        with self._lock:
+            if self._conn is None:
+                return 0, 0, 0
+            cards = self._conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+            refs = self._conn.execute("SELECT COUNT(*) FROM refs").fetchone()[0]
+        size = 0
+        for path in (self.path, self.path + "-wal"):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return cards, refs, size
+
+# -------------------------
+# Chat usage (SillyTavern)
+# -------------------------
+
+CHAT_USAGE_DIR = "chats"            # in local_cache_root(), one file per linked data directory
+CHAT_READ_CHUNK = 1 << 20           # chat logs are streamed in pieces this size
+CHAT_HEADER_MAX = 1 << 20           # longest first line still parsed as a chat header
+CHAT_USAGE_REFRESH_INTERVAL = 120   # seconds between checks for new and changed chat logs
+_CHAT_USAGE_VERSION = 2  # 2: blank lines are no longer counted as messages
+
+ChatUsage = namedtuple("ChatUsage", "messages last_used chat_bytes chats")
+NO_CHAT_USAGE = ChatUsage(0, 0, 0, 0)
+
+def chat_dirs(root):
+    """
+    Directories of per-character chat folders under a SillyTavern directory:
+    the install root, a data/<user> directory or a chats directory itself.
+    """
+    if os.path.basename(os.path.normpath(root)).lower() == "chats":
+        return [root]
+    candidates = [os.path.join(root, "chats"), os.path.join(root, "public", "chats")]
+    try:
+        users = sorted(e.path for e in os.scandir(os.path.join(root, "data")) if e.is_dir())
+    except OSError:
+        users = []
+    candidates += [os.path.join(user, "chats") for user in users]
+    return [d for d in candidates if os.path.isdir(d)]
+
+def scan_chat_log(path):
+    """
+    (messages, character name or "") of a SillyTavern .jsonl chat log, read a
+    chunk at a time rather than loaded. The first line is the chat's header
+    unless it is a message itself ("mes"); one too long to parse is taken as
+    a header without a name. Blank lines are not messages.
+    """
+    messages = 0
+    name = ""
+    with open(path, "rb") as f:
+        first = f.readline(CHAT_HEADER_MAX)
+        rest = b""
+        if first.endswith(b"\n") or len(first) < CHAT_HEADER_MAX:  # the whole line
+            try:
+                header = json.loads(first)
+            except ValueError:
+                header = None
+            if isinstance(header, dict) and "mes" not in header:
+                name = str(header.get("character_name") or "")
+            elif first.strip():
+                messages += 1
+        else:
+            while True:  # skip to the end of the oversized first line
+                chunk = f.read(CHAT_READ_CHUNK)
+                newline = chunk.find(b"\n")
+                if newline >= 0:
+                    rest = chunk[newline + 1:]
+                    break
+                if not chunk:
+                    break
+        pending = False  # the line carried over from the previous chunk has text
+        chunk = rest
+        while True:
+            lines = chunk.split(b"\n")
+            for line in lines[:-1]:
+                if pending or line.strip():
+                    messages += 1
+                pending = False
+            pending = pending or bool(lines[-1].strip())
+            chunk = f.read(CHAT_READ_CHUNK)
+            if not chunk:
+                break
+        if pending:
+            messages += 1  # the last line has no newline
+    return messages, name
+
+def format_chat_time(usage):
+    """When a card was last chatted with, for display."""
+    if not usage.chats:
+        return "never"
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(usage.last_used))
+
+def chat_usage_key(name):
+    """Key chat usage is looked up by: a card's file name stem or character name, case-folded."""
+    return name.casefold()
+
+class ChatUsageIndex:
+    """
+    Message counts of the chat logs under a SillyTavern directory, cached by
+    file fingerprint in the local cache directory, so refresh() only re-reads
+    logs added or changed since the last call.
+
+    Usage is summed per character chat folder, which SillyTavern names after
+    the character's card file; cards are matched by file name stem, then by
+    the character name in the chat headers. A chat's last use is the log's
+    modification time, since SillyTavern rewrites the log on every message.
+    """
+
+    def __init__(self, root, cache_root=None):
+        self.root = root
+        key = hashlib.sha1(_folder_key(root).encode("utf-8", "surrogatepass")).hexdigest()[:16]
+        self.path = os.path.join(cache_root or local_cache_root(), CHAT_USAGE_DIR, key + ".json")
+        self._logs = self._load()  # path relative to root -> [mtime_ns, size, messages, name]
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            LOG.exception("Failed to read %s", self.path)
+            return {}
+        if not isinstance(data, dict) or data.get("version") != _CHAT_USAGE_VERSION:
+            return {}
+        logs = data.get("logs")
+        return logs if isinstance(logs, dict) else {}
+
+    def refresh(self, cancel=None):
+        """
+        Bring the counts up to date and return {chat_usage_key: ChatUsage}.
+        cancel: threading.Event checked between logs; the cache is only saved
+        after a full pass.
+        """
+        logs = {}
+        read = 0
+        for chats in chat_dirs(self.root):
+            try:
+                char_dirs = [e for e in os.scandir(chats) if e.is_dir()]
+            except OSError:
+                continue
+            for char_dir in char_dirs:
+                try:
+                    entries = [e for e in os.scandir(char_dir.path)
+                               if e.name.lower().endswith(".jsonl") and e.is_file()]
+                except OSError:
+                    continue
+                for entry in entries:
+                    if cancel is not None and cancel.is_set():
+                        return None
+                    rel = os.path.relpath(entry.path, self.root)
+                    try:
+                        st = entry.stat()
+                        old = self._logs.get(rel)
+                        if old is not None and old[:2] == [st.st_mtime_ns, st.st_size]:
+                            logs[rel] = old
+                            continue
+                        messages, name = scan_chat_log(entry.path)
+                    except OSError:
+                        continue
+                    logs[rel] = [st.st_mtime_ns, st.st_size, messages, name]
+                    read += 1
+        if read or logs.keys() != self._logs.keys():
+            self._logs = logs
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                atomic_write_json(self.path, {"version": _CHAT_USAGE_VERSION, "root": self.root, "logs": logs})
+            except OSError:
+                LOG.exception("Failed to save %s", self.path)
+        return self.usage()
+
+    def usage(self):
+        """{chat_usage_key: ChatUsage} from the cached counts, by chat folder and by character name."""
+        by_dir = {}
+        by_name = {}
+        for rel, (mtime_ns, size, messages, name) in self._logs.items():
+            keys = [(by_dir, chat_usage_key(os.path.basename(os.path.dirname(rel))))]
+            if name:
+                keys.append((by_name, chat_usage_key(name)))
+            for totals, key in keys:
+                m, last, nbytes, chats = totals.get(key, NO_CHAT_USAGE)
+                totals[key] = ChatUsage(m + messages, max(last, mtime_ns // 1_000_000_000),
+                                        nbytes + size, chats + 1)
+        by_name.update(by_dir)  # a folder named after the card wins over a header's name
+        return by_name
+
+# -------------------------
+# Card index
+# -------------------------
+
+# Row bitmaps are plain Python ints: bit N set <=> index row N is in the set
+_BYTE_BITS = tuple(tuple(b for b in range(8) if v >> b & 1) for v in range(256))
+
+def rows_to_bitmap(rows):
+    rows = list(rows)
+    if not rows:
+        return 0
+    buf = bytearray((max(rows) >> 3) + 1)
+    for r in rows:
+        buf[r >> 3] |= 1 << (r & 7)
+    return int.from_bytes(buf, "little")
+
+def bitmap_to_rows(bits):
+    rows = []
+    if bits <= 0:
+        return rows
+    data = bits.to_bytes((bits.bit_length() + 7) >> 3, "little")
+    for i, byte in enumerate(data):
+        if byte:
+            base = i << 3
+            rows.extend(base + b for b in _BYTE_BITS[byte])
+    return rows
+
+_DIGITS_RE = re.compile(r"(\d+)")
+
+def natural_key(s):
+    """Case-folded natural sort key: 'Card 2' sorts before 'card 10'."""
+    parts = _DIGITS_RE.split(s.casefold())
+    parts[1::2] = map(int, parts[1::2])
+    return tuple(parts)
+
+# Tags are indexed by canonical form: case-folded, with runs of spaces, '_' and '-'
+# collapsed to one space and stray punctuation trimmed, then mapped through the
+# user's alias table. The tags as written stay in the index, so re-mapping never
+# has to read a card again.
+_TAG_SEP_RE = re.compile(r"[\s_\-]+")
+_TAG_TRIM = " #.,;:!?'\"`()[]{}<>"
+
+DEFAULT_TAG_ALIASES = {
+    "not safe for work": "nsfw",
+    "safe for work": "sfw",
+    "scifi": "sci fi",
+    "science fiction": "sci fi",
+}
+
+def normalize_tag(tag):
+    """'  Sci_Fi ', '#sci-fi' and 'SCI FI' all -> 'sci fi'. May return ''."""
+    tag = unicodedata.normalize("NFKC", tag).casefold()
+    return _TAG_SEP_RE.sub(" ", tag).strip(_TAG_TRIM)
+
+def canonical_tag(tag, aliases):
+    """Normalized tag after the alias table (normalized alias -> canonical tag)."""
+    tag = normalize_tag(tag)
+    return aliases.get(tag, tag)
+
+def clean_tag_aliases(mapping):
+    """
+    Alias table with both sides normalized and chains (a -> b -> c) resolved,
+    so a lookup is always one step. Blank and self-mapping entries are dropped.
+    """
+    aliases = {}
+    for alias, target in mapping.items():
+        if not isinstance(alias, str) or not isinstance(target, str):
+            continue
+        alias, target = normalize_tag(alias), normalize_tag(target)
+        if alias and target and alias != target:
+            aliases[alias] = target
+    for alias, target in aliases.items():
+        seen = {alias}
+        while target in aliases and aliases[target] not in seen:
+            seen.add(target)
+            target = aliases[target]
+        aliases[alias] = target
+    return aliases
+
+def load_tag_aliases(settings):
+    """The alias table saved in QSettings; the built-in defaults if none was ever saved."""
+    saved = settings.value("tag_aliases")
+    if saved is None:
+        return clean_tag_aliases(DEFAULT_TAG_ALIASES)
+    try:
+        return clean_tag_aliases(json.loads(saved))
+    except (ValueError, TypeError, AttributeError):
+        LOG.warning("Ignoring unreadable tag alias table")
+        return {}
+
+def save_tag_aliases(settings, aliases):
+    settings.setValue("tag_aliases", json.dumps(aliases, ensure_ascii=False, sort_keys=True))
+
+# Sort modes: key -> label. Metric modes sort descending (biggest / newest first).
+SORT_MODES = {
+    "name": "Sort by Name",
+    "creator": "Group by Creator",
+    "modified": "Recently Modified",
+    "size": "File Size",
+    "tag_count": "Tag Count",
+    "tokens_total": "Total Tokens",
+    "tokens_description": "Description Tokens",
+    "tokens_personality": "Personality Tokens",
+    "tokens_first_mes": "First Message Tokens",
+    "tokens_mes_example": "Example Dialogue Tokens",
+    "chat_messages": "Most Chatted",
+    "chat_recent": "Recently Chatted",
+    "chat_bytes": "Chat Log Size",
+}
+CHAT_SORT_FIELDS = {"chat_messages": "messages", "chat_recent": "last_used", "chat_bytes": "chat_bytes"}
+
+def popcount(bits):
+    try:
+        return bits.bit_count()
+    except AttributeError:  # Python < 3.10
+        return bin(bits).count("1")
+
+
+class StringTable:
+    """Interns strings to dense integer IDs. IDs are never reused, so they stay valid."""
+    __slots__ = ("strings", "ids")
+
+    def __init__(self):
+        self.strings = []  # id -> str
+        self.ids = {}      # str -> id
+
+    def intern(self, s):
+        i = self.ids.get(s)
+        if i is None:
+            i = len(self.strings)
+            s = sys.intern(s)
+            self.strings.append(s)
+            self.ids[s] = i
+        return i
+
+    def get(self, s):
+        return self.ids.get(s)
+
+    def __getitem__(self, i):
+        return self.strings[i]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class CardIndex:
+    """
+    Columnar in-memory index of a card folder, one row per PNG.
+
+    Rows have stable integer IDs for as long as the card stays in the index;
+    a removed row's slot is reused by the next insert. Creators and tags are
+    interned into ID tables, and whole tag lists are interned as tag-set IDs,
+    so the thousands of cards sharing a creator or tag combination share one
+    object. Lorebook keys are interned too, with a row bitmap per key as the
+    keyword index. Use the accessors (filename(), creator(), tags(), ...) or
+    entry() rather than reaching into the columns.
+
+    Tags are kept as the card authors wrote them (tags(), entry()) and also
+    mapped to canonical tag IDs (see canonical_tag()); tag_ids(), tagsets(),
+    the tag bitmaps and everything searching or filtering by tag use the
+    canonical IDs. set_tag_aliases() re-maps them from the stored tags.
+
+    Chat usage from a linked SillyTavern directory is not part of the cards'
+    entries; set_chat_usage() attaches it and chat_usage() looks it up.
+    """
+
+    def __init__(self, tag_aliases=None):
+        self._filenames = []          # row -> filename, None for a free slot
+        self._mtimes = array('q')
+        self._sizes = array('q')      # file size in bytes, 0 if not known yet
+        self._creators = array('l')   # row -> creator id
+        self._tagsets = array('l')    # row -> tag-set id
+        self._tokens = {f: array('l') for f in TOKEN_FIELDS}  # row -> estimated prompt tokens
+        self._lore = []               # row -> tuple of lorebook key ids
+        self._card_names = []         # row -> character name ("" if the card has none)
+        self._name_keys = []          # row -> natural_key(filename), computed once per insert
+        self._creator_keys = []       # creator id -> natural_key(creator)
+        self._order_cache = {}        # sort mode -> (version, ordered rows)
+        self._rows_version = 0        # bumped when rows are added or removed
+        self._rows = {}               # filename -> row
+        self._free = []               # free row slots
+        self.creators = StringTable()
+        self.tags_table = StringTable()      # tags as written
+        self.canonical_tags = StringTable()  # canonical tags, what tag ids in queries refer to
+        self._tag_aliases = dict(tag_aliases or {})
+        self._canonical_of = array('l')      # written tag id -> canonical tag id, -1 if blank
+        self._tagset_table = [()]     # tag-set id -> tuple of written tag ids
+        self._tagset_canonical = [()]  # tag-set id -> tuple of canonical tag ids
+        self._tagset_ids = {(): 0}
+        self.lore_table = StringTable()
+        self._chat_usage = {}         # chat_usage_key -> ChatUsage, see set_chat_usage()
+        self.generation = 0           # bumped on every change
+        self._changed = set()         # filenames changed since take_changes(), for the journal
+        # Row bitmaps per creator / tag; built on first use, then kept up to date
+        self._creator_bits = None
+        self._tag_bits = None
+        self._lore_bits = None
+        self._alive_bits = 0
+
+    # --- construction / serialization ---
+    @classmethod
+    def from_records(cls, records, tag_aliases=None):
+        index = cls(tag_aliases)
+        for rec in records:
+            index.upsert(rec)
+        index._changed.clear()  # already on disk
+        return index
+
+    def to_records(self):
+        """List of cards.json entries: filename, mtime, size, creator, tags."""
+        return [self.entry(row) for row in self.rows()]
+
+    def take_changes(self):
+        """
+        Journal records for the cards changed since the last call:
+        {"put": entry} for cards in the index, {"del": filename} for removed ones.
+        """
+        changed, self._changed = self._changed, set()
+        records = []
+        for fname in changed:
+            row = self._rows.get(fname)
+            records.append({"put": self.entry(row)} if row is not None else {"del": fname})
+        return records
+
+    def snapshot(self):
+        """
+        Cheap copy for handing to another thread (e.g. the cache writer).
+        The intern tables are append-only, so they are shared rather than copied.
+        """
+        snap = CardIndex.__new__(CardIndex)
+        snap._filenames = list(self._filenames)
+        snap._mtimes = array('q', self._mtimes)
+        snap._sizes = array('q', self._sizes)
+        snap._creators = array('l', self._creators)
+        snap._tagsets = array('l', self._tagsets)
+        snap._tokens = {f: array('l', col) for f, col in self._tokens.items()}
+        snap._lore = list(self._lore)
+        snap._card_names = list(self._card_names)
+        snap._name_keys = list(self._name_keys)
+        snap._creator_keys = list(self._creator_keys)  # readers on other threads must never grow it
+        snap._order_cache = {}
+        snap._rows_version = self._rows_version
+        snap._rows = dict(self._rows)
+        snap._free = list(self._free)
+        snap.creators = self.creators
+        snap.tags_table = self.tags_table
+        snap.canonical_tags = self.canonical_tags
+        snap._tag_aliases = self._tag_aliases
+        snap._canonical_of = self._canonical_of
+        snap._tagset_table = self._tagset_table
+        snap._tagset_canonical = self._tagset_canonical
+        snap._tagset_ids = self._tagset_ids
+        snap.lore_table = self.lore_table
+        snap._chat_usage = self._chat_usage  # replaced, never edited, by set_chat_usage()
+        snap.generation = self.generation
+        snap._changed = set()
+        snap._creator_bits = None
+        snap._tag_bits = None
+        snap._lore_bits = None
+        snap._alive_bits = 0
+        return snap
+
+    # --- row access ---
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, filename):
+        return filename in self._rows
+
+    def rows(self):
+        """Live row IDs."""
+        return self._rows.values()
+
+    def row_of(self, filename):
+        return self._rows.get(filename)
+
+    def filename(self, row):
+        return self._filenames[row]
+
+    def mtime(self, row):
+        return self._mtimes[row]
+
+    def size(self, row):
+        return self._sizes[row]
+
+    def card_name(self, row):
+        """The character's name from the card ("" if it has none); filename() is the file's."""
+        return self._card_names[row]
+
+    def creator_id(self, row):
+        return self._creators[row]
+
+    def creator(self, row):
+        return self.creators[self._creators[row]]
+
+    def tagset_id(self, row):
+        return self._tagsets[row]
+
+    def tag_ids(self, row):
+        """Canonical tag ids of a row."""
+        return self._tagset_canonical[self._tagsets[row]]
+
+    def tags(self, row):
+        """Tags as the card wrote them."""
+        names = self.tags_table.strings
+        return [names[t] for t in self._tagset_table[self._tagsets[row]]]
+
+    def canonical_tag_names(self, row):
+        names = self.canonical_tags.strings
+        return [names[t] for t in self._tagset_canonical[self._tagsets[row]]]
+
+    def tagsets(self):
+        """(tag-set id, tuple of canonical tag ids) for every interned tag set."""
+        return enumerate(self._tagset_canonical)
+
+    def canonical_tag(self, tag):
+        """tag in the form this index stores it under (may be '')."""
+        return canonical_tag(tag, self._tag_aliases)
+
+    def tokens(self, row, field):
+        return self._tokens[field][row]
+
+    def lore_keys(self, row):
+        return [self.lore_table[i] for i in self._lore[row]]
+
+    def total_tokens(self, row):
+        return sum(col[row] for col in self._tokens.values())
+
+    def entry(self, row):
+        return {
+            "filename": self._filenames[row],
+            "mtime": self._mtimes[row],
+            "size": self._sizes[row],
+            "name": self._card_names[row],
+            "creator": self.creator(row),
+            "tags": self.tags(row),
+            "tokens": {f: col[row] for f, col in self._tokens.items()},
+            "lore": self.lore_keys(row),
+        }
+
+    def files_by_size(self):
+        """size -> [filename], for spotting content duplicates. Cards not stat'ed yet are left out."""
+        sizes = self._sizes
+        by_size = {}
+        for fname, row in self._rows.items():
+            if sizes[row]:
+                by_size.setdefault(sizes[row], []).append(fname)
+        return by_size
+
+    def known_stats(self):
+        """filename -> (mtime, size), for the stat sweep."""
+        mtimes = self._mtimes
+        sizes = self._sizes
+        return {fname: (mtimes[row], sizes[row]) for fname, row in self._rows.items()}
+
+    # --- mutation ---
+    def _canonical_id(self, tag):
+        canon = canonical_tag(tag, self._tag_aliases)
+        return self.canonical_tags.intern(canon) if canon else -1
+
+    def _canonical_tagset(self, ids):
+        canonical_of = self._canonical_of
+        canon = []
+        for tid in ids:
+            cid = canonical_of[tid]
+            if cid >= 0 and cid not in canon:
+                canon.append(cid)
+        return tuple(canon)
+
+    def _intern_tagset(self, tags):
+        ids = []
+        for t in tags:
+            if isinstance(t, str):
+                tid = self.tags_table.intern(t)
+                if tid == len(self._canonical_of):  # first time this spelling is seen
+                    self._canonical_of.append(self._canonical_id(t))
+                if tid not in ids:
+                    ids.append(tid)
+        key = tuple(ids)
+        tsid = self._tagset_ids.get(key)
+        if tsid is None:
+            tsid = len(self._tagset_table)
+            self._tagset_table.append(key)
+            self._tagset_canonical.append(self._canonical_tagset(key))
+            self._tagset_ids[key] = tsid
+        return tsid
+
+    def set_tag_aliases(self, aliases):
+        """
+        Re-map every tag through a new alias table (from clean_tag_aliases()).
+        Works from the stored tags alone, one step per distinct spelling and tag
+        set. Canonical tag ids change, so anything holding them must be dropped.
+        Returns False if the table is unchanged.
+        """
+        aliases = dict(aliases)
+        if aliases == self._tag_aliases:
+            return False
+        # New objects rather than edits in place: snapshots share the old ones
+        self._tag_aliases = aliases
+        self.canonical_tags = StringTable()
+        self._canonical_of = array('l', map(self._canonical_id, self.tags_table.strings))
+        self._tagset_canonical = [self._canonical_tagset(ids) for ids in self._tagset_table]
+        if self._creator_bits is not None:
+            self._creator_bits = None  # rebuilt with the new tag bitmaps on next use
+        self._order_cache.pop("tag_count", None)
+        self.generation += 1
+        return True
+
+    def set_chat_usage(self, usage):
+        """
+        Attach chat usage ({chat_usage_key: ChatUsage}, from ChatUsageIndex) for
+        the chat sort modes and query terms. Returns False if it is unchanged.
+        """
+        usage = usage or {}
+        if usage == self._chat_usage:
+            return False
+        self._chat_usage = usage
+        for mode in CHAT_SORT_FIELDS:
+            self._order_cache.pop(mode, None)
+        self.generation += 1
+        return True
+
+    def chat_usage(self, row):
+        """
+        ChatUsage of a row's card, matched by file name stem, then by character
+        name; NO_CHAT_USAGE if it has no chats.
+        """
+        if not self._chat_usage:
+            return NO_CHAT_USAGE
+        stem = os.path.splitext(self._filenames[row])[0]
+        usage = self._chat_usage.get(chat_usage_key(stem))
+        if usage is None and self._card_names[row]:
+            usage = self._chat_usage.get(chat_usage_key(self._card_names[row]))
+        return usage or NO_CHAT_USAGE
+
+    def upsert(self, entry):
+        """Insert or replace the row for entry['filename']. Returns the row ID."""
+        fname = entry['filename']
+        creator = self.creators.intern(str(entry.get('creator') or "Unknown"))
+        keys = self._creator_keys
+        while len(keys) < len(self.creators):  # the table may be shared with a snapshot that interned too
+            keys.append(natural_key(self.creators[len(keys)]))
+        tags = entry.get('tags')
+        tagset = self._intern_tagset(tags if isinstance(tags, list) else [])
+        mtime = int(entry.get('mtime') or 0)
+        size = int(entry.get('size') or 0)
+        tokens = entry.get('tokens')
+        if not isinstance(tokens, dict):
+            tokens = {}
+        lore = entry.get('lore')
+        lore = tuple(self.lore_table.intern(str(k)) for k in lore) if isinstance(lore, list) else ()
+        card_name = str(entry.get('name') or "")
+        row = self._rows.get(fname)
+        if row is not None and self._creator_bits is not None:
+            self._set_row_bits(row, False)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+                self._filenames[row] = fname
+                self._mtimes[row] = mtime
+                self._sizes[row] = size
+                self._creators[row] = creator
+                self._tagsets[row] = tagset
+                self._lore[row] = lore
+                self._card_names[row] = card_name
+                self._name_keys[row] = natural_key(fname)
+            else:
+                row = len(self._filenames)
+                self._filenames.append(fname)
+                self._mtimes.append(mtime)
+                self._sizes.append(size)
+                self._creators.append(creator)
+                self._tagsets.append(tagset)
+                self._lore.append(lore)
+                self._card_names.append(card_name)
+                self._name_keys.append(natural_key(fname))
+                for col in self._tokens.values():
+                    col.append(0)
+            self._rows[fname] = row
+            self._rows_version += 1
+        else:
+            self._mtimes[row] = mtime
+            self._sizes[row] = size
+            self._creators[row] = creator
+            self._tagsets[row] = tagset
+            self._lore[row] = lore
+            self._card_names[row] = card_name
+        for field, col in self._tokens.items():
+            col[row] = int(tokens.get(field) or 0)
+        if self._creator_bits is not None:
+            self._set_row_bits(row, True)
+        self._changed.add(fname)
+        self.generation += 1
+        return row
+
+    def set_size(self, row, size):
+        """Record a size from the stat sweep without touching the parsed fields."""
+        self._sizes[row] = size
+        self._changed.add(self._filenames[row])
+        self.generation += 1
+
+    def remove(self, filename):
+        """Drop a card. Returns its former row ID, or None if it wasn't indexed."""
+        row = self._rows.pop(filename, None)
+        if row is None:
+            return None
+        if self._creator_bits is not None:
+            self._set_row_bits(row, False)
+        self._filenames[row] = None
+        self._mtimes[row] = 0
+        self._sizes[row] = 0
+        self._creators[row] = 0
+        self._tagsets[row] = 0
+        self._lore[row] = ()
+        self._card_names[row] = ""
+        for col in self._tokens.values():
+            col[row] = 0
+        self._free.append(row)
+        self._rows_version += 1
+        self._changed.add(filename)
+        self.generation += 1
+        return row
+
+
+    # --- sorting ---
+    def creator_key(self, cid):
+        return self._creator_keys[cid]  # filled in by upsert(), so readers only ever read it
+
+    def sort_key(self, mode):
+        """Key function over row IDs for a sort mode, built from precomputed columns."""
+        name_keys = self._name_keys
+        if mode == "creator":
+            creators = self._creators
+            creator_key = self.creator_key
+            return lambda r: (creator_key(creators[r]), name_keys[r])
+        if mode == "modified":
+            col = self._mtimes
+        elif mode == "size":
+            col = self._sizes
+        elif mode == "tag_count":
+            tagsets, table = self._tagsets, self._tagset_canonical
+            return lambda r: (-len(table[tagsets[r]]), name_keys[r])
+        elif mode == "tokens_total":
+            cols = tuple(self._tokens.values())
+            return lambda r: (-sum(c[r] for c in cols), name_keys[r])
+        elif mode.startswith("tokens_") and mode[7:] in self._tokens:
+            col = self._tokens[mode[7:]]
+        elif mode in CHAT_SORT_FIELDS:
+            field = ChatUsage._fields.index(CHAT_SORT_FIELDS[mode])
+            usage = self.chat_usage
+            return lambda r: (-usage(r)[field], name_keys[r])
+        else:
+            return name_keys.__getitem__
+        return lambda r: (-col[r], name_keys[r])
+
+    def sorted_rows(self, mode, subset=None):
+        """
+        Rows in sort order. The full ordering per mode is cached; name order only
+        changes when cards are added or removed, the others on any change.
+        subset restricts the result to those rows.
+        """
+        if subset is not None and len(subset) * 8 < len(self._rows):
+            return sorted(subset, key=self.sort_key(mode))  # small result: sort it directly
+        version = self._rows_version if mode == "name" else self.generation
+        cached = self._order_cache.get(mode)
+        if cached is None or cached[0] != version:
+            cached = (version, sorted(self._rows.values(), key=self.sort_key(mode)))
+            self._order_cache[mode] = cached
+        if subset is None:
+            return list(cached[1])
+        keep = subset if isinstance(subset, (set, frozenset)) else set(subset)
+        return [r for r in cached[1] if r in keep]
+
+    # --- bitmaps ---
+    def _set_row_bits(self, row, on):
+        bit = 1 << row
+        cb = self._creator_bits
+        tb = self._tag_bits
+        lb = self._lore_bits
+        cid = self._creators[row]
+        if on:
+            cb[cid] = cb.get(cid, 0) | bit
+            for tid in self._tagset_canonical[self._tagsets[row]]:
+                tb[tid] = tb.get(tid, 0) | bit
+            for lid in self._lore[row]:
+                lb[lid] = lb.get(lid, 0) | bit
+            self._alive_bits |= bit
+        else:
+            cb[cid] = cb.get(cid, 0) & ~bit
+            for tid in self._tagset_canonical[self._tagsets[row]]:
+                tb[tid] = tb.get(tid, 0) & ~bit
+            for lid in self._lore[row]:
+                lb[lid] = lb.get(lid, 0) & ~bit
+            self._alive_bits &= ~bit
+
+    def _ensure_bitmaps(self):
+        # Built in bulk: setting bits one card at a time copies the whole int each time
+        if self._creator_bits is not None:
+            return
+        by_creator = {}
+        by_tagset = {}
+        for row in self._rows.values():
+            by_creator.setdefault(self._creators[row], []).append(row)
+            by_tagset.setdefault(self._tagsets[row], []).append(row)
+        by_tag = {}
+        for tsid, rows in by_tagset.items():
+            for tid in self._tagset_canonical[tsid]:
+                by_tag.setdefault(tid, []).extend(rows)
+        by_lore = {}
+        for row in self._rows.values():
+            for lid in self._lore[row]:
+                by_lore.setdefault(lid, []).append(row)
+        self._creator_bits = {cid: rows_to_bitmap(rows) for cid, rows in by_creator.items()}
+        self._tag_bits = {tid: rows_to_bitmap(rows) for tid, rows in by_tag.items()}
+        self._lore_bits = {lid: rows_to_bitmap(rows) for lid, rows in by_lore.items()}
+        self._alive_bits = rows_to_bitmap(self._rows.values())
+
+    def alive_bitmap(self):
+        self._ensure_bitmaps()
+        return self._alive_bits
+
+    def creator_bitmaps(self):
+        """creator id -> row bitmap (read-only view)."""
+        self._ensure_bitmaps()
+        return self._creator_bits
+
+    def tag_bitmaps(self):
+        """canonical tag id -> row bitmap (read-only view)."""
+        self._ensure_bitmaps()
+        return self._tag_bits
+
+    def lore_bitmaps(self):
+        """lorebook key id -> row bitmap (read-only view)."""
+        self._ensure_bitmaps()
+        return self._lore_bits
+
+
+def benchmark_index_memory(n=200_000, seed=0):
+    """
+    Compare the memory held by n cards loaded as plain dicts (the cards.json layout)
+    with the same cards in a CardIndex. Returns (dict_bytes, index_bytes).
+    """
+    import random
+    import tracemalloc
+    rnd = random.Random(seed)
+    creators = [f"creator_{i}" for i in range(max(1, n // 100))]
+    tags = [f"tag_{i}" for i in range(500)]
+    records = [{
+        "filename": f"card_{i:07d}.png",
+        "mtime": 1_700_000_000 + i,
+        "creator": rnd.choice(creators),
+        "tags": rnd.sample(tags, rnd.randint(0, 8)),
+    } for i in range(n)]
+    # Round-trip through JSON like a real load: every string becomes its own object
+    payload = json.dumps(records)
+    del records
+
+    tracemalloc.start()
+    loaded = json.loads(payload)
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    index = CardIndex.from_records(json.loads(payload))
+    index_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del loaded, index
+    return dict_bytes, index_bytes
+
+# -------------------------
+# Search queries
+# -------------------------
+
+QueryTerm = namedtuple("QueryTerm", "field value negate")
+
+QUERY_FIELDS = ("creator", "tag", "lore", "name", "size", "messages", "chatsize", "chatted")
+_QUERY_TOKEN_RE = re.compile(r'(-?)(?:([A-Za-z_]+):)?(?:"([^"]*)"?|(\S+))')
+_SIZE_RE = re.compile(r'^(>=|<=|>|<|=)?\s*([0-9]*\.?[0-9]+)\s*(b|kb|mb|gb)?$')
+_SIZE_UNITS = {"b": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3}
+_COUNT_RE = re.compile(r'^(>=|<=|>|<|=)?\s*([0-9]+)$')
+_AGE_RE = re.compile(r'^(>=|<=|>|<|=)?\s*([0-9]*\.?[0-9]+)\s*(h|d|w|mo|y)?$')
+_AGE_UNITS = {"h": 3600, "d": 86400, "w": 7 * 86400, "mo": 30 * 86400, "y": 365 * 86400}
+_SIZE_OPS = {
+    ">": lambda a, b: a > b, "<": lambda a, b: a < b,
+    ">=": lambda a, b: a >= b, "<=": lambda a, b: a <= b, "=": lambda a, b: a == b,
+}
+
+@functools.lru_cache(maxsize=256)
+def parse_query(text):
+    """
+    Parse search-bar text into a tuple of QueryTerms.
+
+        creator:foo tag:"fantasy" -tag:nsfw lore:castle name:elf* size:>2MB plain words
+        messages:>100 chatsize:>1MB chatted:<30d chatted:never
+
+    Values are case-insensitive; * and ? are wildcards. A leading '-' negates a
+    term. Words without a known field prefix match filename, creator, tags or
+    lorebook keys.
+    """
+    terms = []
+    for m in _QUERY_TOKEN_RE.finditer(text):
+        neg, field, quoted, bare = m.groups()
+        value = quoted if quoted is not None else bare
+        field = (field or "").lower()
+        if field and field not in QUERY_FIELDS:
+            # Not a field we know (e.g. a URL): treat the whole token as text
+            value = f"{field}:{value}"
+            field = ""
+        value = value.lower()
+        if not value:
+            continue
+        terms.append(QueryTerm(field or "any", value, bool(neg)))
+    return tuple(terms)
+
+def parse_size(value):
+    """'>2MB' -> ('>', 2097152); None if it isn't a size comparison."""
+    m = _SIZE_RE.match(value.strip().lower())
+    if not m:
+        return None
+    op, num, unit = m.groups()
+    return op or "=", int(float(num) * _SIZE_UNITS[unit or "b"])
+
+def parse_count(value):
+    """'>100' -> ('>', 100); None if it isn't a count comparison."""
+    m = _COUNT_RE.match(value.strip())
+    if not m:
+        return None
+    return m.group(1) or "=", int(m.group(2))
+
+def parse_age(value):
+    """'<30d' -> ('<', 2592000): a comparison of an age in seconds (h, d, w, mo, y; days by default)."""
+    m = _AGE_RE.match(value.strip().lower())
+    if not m:
+        return None
+    op, num, unit = m.groups()
+    return op or "<", int(float(num) * _AGE_UNITS[unit or "d"])
+
+def _has_wildcard(value):
+    return "*" in value or "?" in value
+
+def _value_matcher(value, substring, folded=False):
+    """
+    Case-folded string predicate: glob with wildcards, else substring or exact.
+    folded: the strings matched are already lower case (canonical tags).
+    """
+    if folded:
+        if _has_wildcard(value):
+            return lambda s: fnmatch.fnmatchcase(s, value)
+        if substring:
+            return lambda s: value in s
+        return value.__eq__
+    if _has_wildcard(value):
+        return lambda s: fnmatch.fnmatchcase(s.lower(), value)
+    if substring:
+        return lambda s: value in s.lower()
+    return lambda s: s.lower() == value
+
+def _tag_query_value(index, value):
+    """A query value as it would appear among the index's canonical tags; wildcards are kept."""
+    if _has_wildcard(value):
+        return _TAG_SEP_RE.sub(" ", value.casefold())
+    return index.canonical_tag(value)
+
+
+class QueryPlan:
+    """
+    A parsed query resolved against one CardIndex generation.
+
+    creator:, tag: and lore: terms are answered from the per-value row bitmaps
+    and applied most selective first; terms with no index (name:, size:, the
+    chat usage terms, plain words) are checked row by row, cheapest first, only
+    on the rows the bitmaps left. execute() records per-step timings for the readout.
+    """
+
+    # relative per-row cost of the scan predicates
+    _SCAN_COST = {"size": 0, "chat": 1, "name": 1, "any": 2}
+
+    def __init__(self, index, terms):
+        self.index = index
+        self.generation = index.generation
+        self.terms = terms
+        self.bitmap_steps = []  # (label, bitmap, negate)
+        self.scan_steps = []    # (label, predicate(row), negate, cost)
+        self.invalid = []       # labels of terms that could not be understood
+        self.timings = []       # (label, rows left, seconds) from the last execute()
+        self.total_time = 0.0
+        t0 = time.perf_counter()
+        for term in terms:
+            self._add_term(term)
+        self.plan_time = time.perf_counter() - t0
+        # Most selective first: an empty intersection ends the query early
+        self.bitmap_steps.sort(key=lambda s: (s[2], popcount(s[1]) if not s[2] else 0))
+        self.scan_steps.sort(key=lambda s: s[3])
+
+    @staticmethod
+    def _label(term):
+        value = f'"{term.value}"' if " " in term.value else term.value
+        field = "" if term.field == "any" else term.field + ":"
+        return f"{'-' if term.negate else ''}{field}{value}"
+
+    def _union_bits(self, strings, bitmaps, matcher):
+        bits = 0
+        for sid, s in enumerate(strings):
+            if matcher(s):
+                bits |= bitmaps.get(sid, 0)
+        return bits
+
+    def _add_term(self, term):
+        index = self.index
+        label = self._label(term)
+        if term.field == "creator":
+            bits = self._union_bits(index.creators.strings, index.creator_bitmaps(),
+                                    _value_matcher(term.value, substring=False))
+            self.bitmap_steps.append((label, bits, term.negate))
+        elif term.field == "tag":
+            value = _tag_query_value(index, term.value)
+            if _has_wildcard(value):
+                bits = self._union_bits(index.canonical_tags.strings, index.tag_bitmaps(),
+                                        _value_matcher(value, substring=False, folded=True))
+            else:
+                tid = index.canonical_tags.get(value)
+                bits = index.tag_bitmaps().get(tid, 0) if tid is not None else 0
+            self.bitmap_steps.append((label, bits, term.negate))
+        elif term.field == "lore":
+            bits = self._union_bits(index.lore_table.strings, index.lore_bitmaps(),
+                                    _value_matcher(term.value, substring=False))
+            self.bitmap_steps.append((label, bits, term.negate))
+        elif term.field == "name":
+            match = _value_matcher(term.value, substring=True)
+            self.scan_steps.append((label, lambda row: match(os.path.splitext(index.filename(row))[0]),
+                                    term.negate, self._SCAN_COST["name"]))
+        elif term.field == "size":
+            parsed = parse_size(term.value)
+            if parsed is None:
+                self.invalid.append(label)
+                return
+            op, limit = _SIZE_OPS[parsed[0]], parsed[1]
+            self.scan_steps.append((label, lambda row: op(index.size(row), limit),
+                                    term.negate, self._SCAN_COST["size"]))
+        elif term.field in ("messages", "chatsize", "chatted"):
+            pred = self._chat_predicate(term)
+            if pred is None:
+                self.invalid.append(label)
+                return
+            self.scan_steps.append((label, pred, term.negate, self._SCAN_COST["chat"]))
+        else:
+            # Creators, tags and lore keys are matched once per distinct value; only the filename is per card
+            value = term.value
+            match = _value_matcher(value, substring=True)
+            creator_hits = {cid for cid, c in enumerate(index.creators.strings) if match(c)}
+            tag_value = _tag_query_value(index, value)
+            tag_hits = set()
+            if tag_value:
+                tag_match = _value_matcher(tag_value, substring=True, folded=True)
+                tag_hits = {tid for tid, t in enumerate(index.canonical_tags.strings) if tag_match(t)}
+            tagset_hits = {tsid for tsid, ids in index.tagsets() if any(t in tag_hits for t in ids)}
+            lore_rows = set(bitmap_to_rows(self._union_bits(index.lore_table.strings,
+                                                            index.lore_bitmaps(), match)))
+            self.scan_steps.append((label, lambda row: (
+                index.creator_id(row) in creator_hits
+                or index.tagset_id(row) in tagset_hits
+                or row in lore_rows
+                or match(index.filename(row))), term.negate, self._SCAN_COST["any"]))
+
+    def _chat_predicate(self, term):
+        """Row predicate of a messages:, chatsize: or chatted: term, or None if it can't be parsed."""
+        usage = self.index.chat_usage
+        if term.field == "messages":
+            parsed = parse_count(term.value)
+            if parsed is None:
+                return None
+            op, limit = _SIZE_OPS[parsed[0]], parsed[1]
+            return lambda row: op(usage(row).messages, limit)
+        if term.field == "chatsize":
+            parsed = parse_size(term.value)
+            if parsed is None:
+                return None
+            op, limit = _SIZE_OPS[parsed[0]], parsed[1]
+            return lambda row: op(usage(row).chat_bytes, limit)
+        if term.value == "never":
+            return lambda row: not usage(row).chats
+        parsed = parse_age(term.value)
+        if parsed is None:
+            return None
+        # chatted:<30d = last chat less than 30 days ago; cards never chatted with don't match
+        op, limit, now = _SIZE_OPS[parsed[0]], parsed[1], time.time()
+        return lambda row: usage(row).chats > 0 and op(now - usage(row).last_used, limit)
+
+    def execute(self, base_bits=None):
+        """Matching rows (unordered), starting from base_bits (default: all rows)."""
+        t0 = time.perf_counter()
+        self.timings = []
+        bits = self.index.alive_bitmap() if base_bits is None else base_bits
+        for label, step_bits, negate in self.bitmap_steps:
+            t = time.perf_counter()
+            bits = bits & ~step_bits if negate else bits & step_bits
+            self.timings.append((label, popcount(bits), time.perf_counter() - t))
+            if not bits:
+                break
+        rows = bitmap_to_rows(bits)
+        for label, pred, negate, _ in self.scan_steps:
+            if not rows:
+                break
+            t = time.perf_counter()
+            rows = [r for r in rows if pred(r)] if not negate else [r for r in rows if not pred(r)]
+            self.timings.append((label + " (scan)", len(rows), time.perf_counter() - t))
+        self.total_time = time.perf_counter() - t0
+        return rows
+
+    def describe(self):
+        """One-line plan/timing readout of the last execute()."""
+        steps = [f"{label} \u2192 {n}" for label, n, _ in self.timings]
+        if self.invalid:
+            steps.append("ignored " + ", ".join(self.invalid))
+        return " | ".join(steps) + f" | {self.total_time * 1000:.1f} ms"
+
+    def describe_detail(self):
+        lines = [f"planned in {self.plan_time * 1000:.2f} ms"]
+        for label, n, secs in self.timings:
+            lines.append(f"{label}: {n} row(s) left, {secs * 1000:.2f} ms")
+        lines.append(f"total {self.total_time * 1000:.2f} ms")
+        return "\n".join(lines)
+
+# -------------------------
+# Similar cards
+# -------------------------
+
+SIMILARITY_FILE = "cards_similarity.bin"
+SIMILARITY_FIELDS = ("description", "personality", "scenario")
+SIMILARITY_FIELD_PATHS = dict.fromkeys(SIMILARITY_FIELDS, True)
+SIMILARITY_FEATURES = 1 << 20   # hashed term buckets; collisions are rare at this size
+SIMILARITY_MAX_DF = 0.5         # terms in more than this share of cards are treated as stop words
+SIMILAR_CARDS_SHOWN = 25
+_SIMILARITY_MAGIC = b"CVSIM1\n"
+_SIM_WORD_RE = re.compile(r"[^\W\d_]{3,}")
+_SIM_MACRO_RE = re.compile(r"\{\{[^}]*\}\}")  # {{char}}, {{user}}, ...
+
+def numpy_or_none():
+    """NumPy if it is installed; it is optional and only needed for "More like this"."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def similarity_terms(meta):
+    """
+    Hashed term counts of a card's description, personality and scenario, as
+    (little-endian uint32 term hashes, uint8 counts) in ascending hash order.
+    """
+    counts = {}
+    for field in SIMILARITY_FIELDS:
+        text = meta.get(field) if meta else None
+        if not isinstance(text, str):
+            continue
+        for word in _SIM_WORD_RE.findall(_SIM_MACRO_RE.sub(" ", text.lower())):
+            h = zlib.crc32(word.encode("utf-8")) & (SIMILARITY_FEATURES - 1)
+            counts[h] = counts.get(h, 0) + 1
+    terms = sorted(counts)
+    return struct.pack(f"<{len(terms)}I", *terms), bytes(min(counts[t], 255) for t in terms)
+
+def load_similarity_terms(path):
+    """{filename: (mtime, terms, counts)} saved by save_similarity_terms, or {}."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(_SIMILARITY_MAGIC):
+            return {}
+        data = zlib.decompress(data[len(_SIMILARITY_MAGIC):])
+    except FileNotFoundError:
+        return {}
+    except (OSError, zlib.error):
+        LOG.exception("Failed to read %s", path)
+        return {}
+    return parse_similarity_terms(data, path)
+
+def similarity_terms_record(fname, mtime, terms, counts):
+    """One card's terms in the layout parse_similarity_terms reads."""
+    name_b = fname.encode("utf-8", "surrogatepass")
+    return struct.pack("<HqI", len(name_b), mtime, len(counts)) + name_b + terms + counts
+
+def parse_similarity_terms(data, source="similarity terms"):
+    """
+    {filename: (mtime, terms, counts)} from concatenated similarity_terms_record()s.
+    data may be any bytes-like object, e.g. a memoryview of a mapped file; nothing returned refers into it.
+    """
+    docs = {}
+    pos = 0
+    try:
+        while pos < len(data):
+            name_len, mtime, n = struct.unpack_from("<HqI", data, pos)
+            pos += 14
+            name = bytes(data[pos:pos + name_len]).decode("utf-8", "surrogatepass")
+            pos += name_len
+            docs[name] = (mtime, bytes(data[pos:pos + 4 * n]), bytes(data[pos + 4 * n:pos + 5 * n]))
+            pos += 5 * n
+    except (struct.error, UnicodeDecodeError):
+        LOG.warning("Ignoring truncated %s", source)
+    return docs
+
+def save_similarity_terms(path, docs):
+    """Write {filename: (mtime, terms, counts)} atomically, zlib-compressed."""
+    dirpath = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=".cards_tmp_", dir=dirpath)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_SIMILARITY_MAGIC)
+            z = zlib.compressobj(6)
+            for name, (mtime, terms, counts) in docs.items():
+                f.write(z.compress(similarity_terms_record(name, mtime, terms, counts)))
+            f.write(z.flush())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except Exception:
+            pass
+        raise
+
+class SimilarityMatrix:
+    """
+    TF-IDF matrix over hashed terms, stored column-wise: for each term, the
+    cards containing it and their L2-normalized weights. A query gathers the
+    columns of the card's own terms and sums them per card with one bincount,
+    so its cost follows the postings touched rather than the library size.
+    Immutable once built; build() is safe to call off the GUI thread.
+    """
+
+    def __init__(self, np, names, doc_starts, doc_terms, doc_weights, indptr, post_docs, post_weights):
+        self.np = np
+        self.names = names
+        self.rows = {name: i for i, name in enumerate(names)}
+        self.doc_starts = doc_starts      # card row -> slice of doc_terms / doc_weights
+        self.doc_terms = doc_terms        # usable terms of each card, card after card
+        self.doc_weights = doc_weights
+        self.indptr = indptr              # term -> slice of post_docs / post_weights
+        self.post_docs = post_docs
+        self.post_weights = post_weights
+
+    @classmethod
+    def build(cls, np, docs):
+        """Matrix for {filename: (mtime, terms, counts)}."""
+        names = list(docs)
+        n = len(names)
+        terms = np.frombuffer(b"".join(d[1] for d in docs.values()), dtype="<u4").astype(np.uint32)
+        counts = np.frombuffer(b"".join(d[2] for d in docs.values()), dtype=np.uint8)
+        lengths = np.fromiter((len(d[2]) for d in docs.values()), dtype=np.int64, count=n)
+        doc_of = np.repeat(np.arange(n, dtype=np.int32), lengths)
+        df = np.bincount(terms, minlength=SIMILARITY_FEATURES)
+        # A term only in one card can't link it to another; one in most cards says nothing
+        usable = (df > 1) & (df <= max(2, n * SIMILARITY_MAX_DF))
+        keep = usable[terms]
+        terms, counts, doc_of = terms[keep], counts[keep], doc_of[keep]
+        idf = (np.log((n + 1) / (df + 1)) + 1.0).astype(np.float32)
+        weights = (1.0 + np.log(np.maximum(counts, 1), dtype=np.float32)) * idf[terms]
+        norms = np.sqrt(np.bincount(doc_of, weights=weights * weights, minlength=n)).astype(np.float32)
+        weights /= np.maximum(norms[doc_of], 1e-12)
+        doc_starts = np.searchsorted(doc_of, np.arange(n + 1))
+        order = np.argsort(terms, kind="stable")
+        indptr = np.searchsorted(terms[order], np.arange(SIMILARITY_FEATURES + 1))
+        return cls(np, names, doc_starts, terms, weights, indptr, doc_of[order], weights[order])
+
+    def __len__(self):
+        return len(self.names)
+
+    def similar(self, fname, k=20):
+        """Up to k (filename, cosine similarity) most like fname, best first; [] if fname is unknown."""
+        np = self.np
+        row = self.rows.get(fname)
+        if row is None:
+            return []
+        lo, hi = self.doc_starts[row], self.doc_starts[row + 1]
+        q_terms, q_weights = self.doc_terms[lo:hi], self.doc_weights[lo:hi]
+        starts = self.indptr[q_terms]
+        lengths = self.indptr[q_terms + 1] - starts
+        # Positions of every posting in the query's columns, without a Python loop
+        idx = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        scores = np.bincount(self.post_docs[idx], weights=self.post_weights[idx] * np.repeat(q_weights, lengths),
+                             minlength=len(self.names))
+        scores[row] = 0.0
+        k = min(k, int(np.count_nonzero(scores > 1e-9)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.names[i], float(scores[i])) for i in top]
+
+def benchmark_similarity(n=100_000, queries=50, seed=0):
+    """
+    Build a SimilarityMatrix over n synthetic cards (Zipf-distributed words) and time
+    "More Like This" queries. Returns (build_seconds, median_query_seconds, max_query_seconds).
+    """
+    import random
+    np = numpy_or_none()
+    rnd = random.Random(seed)
+    vocab = ["".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rnd.randint(3, 9)))
+             for _ in range(30_000)]
+    cum_weights = list(itertools.accumulate(1.0 / (i + 1) for i in range(len(vocab))))
+    docs = {}
+    for i in range(n):
+        text = " ".join(rnd.choices(vocab, cum_weights=cum_weights, k=rnd.randint(50, 300)))
+        docs[f"card_{i:07d}.png"] = (0, *similarity_terms({"description": text}))
+    start = time.perf_counter()
+    matrix = SimilarityMatrix.build(np, docs)
+    build = time.perf_counter() - start
+    times = []
+    for fname in rnd.sample(list(docs), min(queries, n)):
+        start = time.perf_counter()
+        matrix.similar(fname, SIMILAR_CARDS_SHOWN)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return build, times[len(times) // 2], times[-1]
+
+# -------------------------
+# Library packs
+# -------------------------
+
+PACK_EXTENSION = ".cvpack"
+PACK_VERSION = 1
+PACK_THUMB_SIZE = THUMB_SIZE
+PACK_WORKERS = 4  # cards read and thumbnailed in parallel while exporting
+_PACK_MAGIC = b"CVPACK1\0"
+_PACK_TRAILER = struct.Struct("<QI8s")  # directory offset, directory length, magic
+_PACK_ROW = struct.Struct("<QI")        # offset into a section, length
+
+def _pack_card(path):
+    """(stat_result, metadata, JPEG thumbnail bytes) of one card for a library pack."""
+    st, data = read_card_file(path)
+    meta, _ = read_card_metadata(path, data)
+    try:
+        thumb = card_thumbnail_jpeg(data, PACK_THUMB_SIZE)
+    except Exception:
+        LOG.exception("Failed to thumbnail %s", path)
+        thumb = b""
+    return st, meta, thumb
+
+def write_library_pack(path, folder, fnames=None, progress=None, cancelled=None):
+    """
+    Write the cards of folder (or just fnames) into one .cvpack file at path.
+    Returns the number of cards written, or None if cancelled() came true first.
+
+    Layout, integers little-endian, every section starting on an 8-byte boundary:
+        magic
+        sections
+        directory: JSON {"version", "folder", "created", "count", "sections": {name: [offset, length]}}
+        trailer: u64 directory offset, u32 directory length, magic
+    Sections: "index" (cards.json records as JSON), "thumbs" and "meta"
+    (JPEG thumbnails, zlib-compressed card JSON), "thumb_table" and
+    "meta_table" (u64 offset and u32 length into those, one per index
+    record) and "similarity" (similarity_terms_record()s, uncompressed).
+    Unreadable cards are left out.
+    """
+    if fnames is None:
+        fnames = get_png_files(folder)
+    dirpath = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".cards_tmp_", dir=dirpath)
+    sections = {}
+    records, thumb_rows, meta_rows = [], [], []
+    try:
+        with os.fdopen(fd, "w+b") as out, tempfile.TemporaryFile() as meta_out, \
+                tempfile.TemporaryFile() as sim_out, \
+                ThreadPoolExecutor(max_workers=PACK_WORKERS, thread_name_prefix="card-pack") as pool:
+
+            def begin_section():
+                out.write(b"\0" * (-out.tell() % 8))
+                return out.tell()
+
+            def end_section(name, start):
+                sections[name] = [start, out.tell() - start]
+
+            out.write(_PACK_MAGIC)
+            thumbs_start = begin_section()
+            futures = deque()
+            names = iter(fnames)
+            done = 0
+            while True:
+                # A bounded window keeps thumbnails of huge libraries out of memory
+                while len(futures) < PACK_WORKERS * 4:
+                    fname = next(names, None)
+                    if fname is None:
+                        break
+                    futures.append((fname, pool.submit(_pack_card, os.path.join(folder, fname))))
+                if not futures:
+                    break
+                if cancelled is not None and cancelled():
+                    for _, future in futures:
+                        future.cancel()
+                    raise InterruptedError
+                fname, future = futures.popleft()
+                done += 1
+                try:
+                    st, meta, thumb = future.result()
+                except Exception:
+                    LOG.exception("Failed to pack %s", fname)
+                    continue
+                entry = make_index_entry(fname, st, meta)
+                records.append(entry)
+                thumb_rows.append((out.tell() - thumbs_start, len(thumb)))
+                out.write(thumb)
+                blob = zlib.compress(json.dumps(meta, ensure_ascii=False).encode("utf-8")) if meta else b""
+                meta_rows.append((meta_out.tell(), len(blob)))
+                meta_out.write(blob)
+                sim_out.write(similarity_terms_record(fname, entry["mtime"], *similarity_terms(meta)))
+                if progress is not None and done % SCAN_BATCH_SIZE == 0:
+                    progress(done, len(fnames))
+            end_section("thumbs", thumbs_start)
+            for name, source in (("meta", meta_out), ("similarity", sim_out)):
+                start = begin_section()
+                source.seek(0)
+                shutil.copyfileobj(source, out)
+                end_section(name, start)
+            for name, rows in (("thumb_table", thumb_rows), ("meta_table", meta_rows)):
+                start = begin_section()
+                out.write(b"".join(_PACK_ROW.pack(*row) for row in rows))
+                end_section(name, start)
+            start = begin_section()
+            out.write(json.dumps(records, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            end_section("index", start)
+            directory = json.dumps({"version": PACK_VERSION, "folder": os.path.abspath(folder),
+                                    "created": time.time(), "count": len(records),
+                                    "sections": sections}).encode("utf-8")
+            start = begin_section()
+            out.write(directory)
+            out.write(_PACK_TRAILER.pack(start, len(directory), _PACK_MAGIC))
+        os.replace(tmp_path, path)
+    except BaseException as e:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        if isinstance(e, InterruptedError):
+            return None
+        raise
+    if progress is not None:
+        progress(len(fnames), len(fnames))
+    return len(records)
+
+class LibraryPack:
+    """
+    A .cvpack file opened read-only. The file is memory-mapped: opening it
+    reads only the directory and the index, and thumbnails and metadata are
+    sliced out of the mapping by row when asked for.
+    """
+
+    def __init__(self, path):
+        import mmap
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("Not a CardViewer library pack (empty file)") from None
+        view = memoryview(self._map)
+        try:
+            if len(view) < len(_PACK_MAGIC) + _PACK_TRAILER.size or view[:len(_PACK_MAGIC)] != _PACK_MAGIC:
+                raise ValueError("Not a CardViewer library pack")
+            dir_offset, dir_length, magic = _PACK_TRAILER.unpack_from(view, len(view) - _PACK_TRAILER.size)
+            if magic != _PACK_MAGIC:
+                raise ValueError("Library pack is truncated")
+            directory = json.loads(bytes(view[dir_offset:dir_offset + dir_length]))
+            if directory.get("version") != PACK_VERSION:
+                raise ValueError(f"Unsupported library pack version {directory.get('version')}")
+            self.source_folder = directory["folder"]
+            self.created = directory["created"]
+            self._sections = {name: view[off:off + length] for name, (off, length) in directory["sections"].items()}
+            self.records = json.loads(bytes(self._sections["index"]))
+        except BaseException:
+            self._sections = {}
+            view.release()
+            self._map.close()
+            raise
+        self._view = view
+        self.rows = {e["filename"]: i for i, e in enumerate(self.records)}
+
+    def __len__(self):
+        return len(self.records)
+
+    def _slice(self, section, table, fname):
+        row = self.rows.get(fname)
+        if row is None:
+            return None
+        offset, length = _PACK_ROW.unpack_from(self._sections[table], row * _PACK_ROW.size)
+        return self._sections[section][offset:offset + length] if length else None
+
+    def thumbnail(self, fname):
+        """JPEG bytes of fname's thumbnail as a memoryview into the pack, or None."""
+        return self._slice("thumbs", "thumb_table", fname)
+
+    def metadata(self, fname):
+        """fname's card metadata as read_card_metadata returned it when packed, or None."""
+        blob = self._slice("meta", "meta_table", fname)
+        return json.loads(zlib.decompress(blob).decode("utf-8")) if blob is not None else None
+
+    def similarity_terms(self):
+        return parse_similarity_terms(self._sections["similarity"], self.path)
+
+    def card_path(self, fname):
+        """The card's original PNG, if present in the packed folder or next to the pack; else None."""
+        for folder in (self.source_folder, os.path.dirname(os.path.abspath(self.path))):
+            path = os.path.join(folder, fname)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def close(self):
+        for section in self._sections.values():
+            section.release()
+        self._sections = {}
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # a thumbnail slice is still held somewhere; the mapping goes with it
+
+# -------------------------
+# Organize (batch rename)
+# -------------------------
+
+ORGANIZE_DEFAULT_TEMPLATE = "{creator} - {name}"
+ORGANIZE_FIELDS = ("name", "creator", "filename", "tag", "date")
+ORGANIZE_MAX_STEM = 150  # characters; leaves room for " (N).png" under common path limits
+_FILENAME_BAD_RE = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+_WINDOWS_RESERVED = frozenset(["con", "prn", "aux", "nul"] + [f"{p}{i}" for p in ("com", "lpt") for i in range(1, 10)])
+
+OrganizeMove = namedtuple("OrganizeMove", "old new collided")  # new: path relative to the folder, "/"-separated
+
+def safe_filename(text):
+    """text usable as a file or folder name anywhere: no separators or reserved names, "" if nothing is left."""
+    text = " ".join(_FILENAME_BAD_RE.sub("_", text).split()).strip(" .")
+    if len(text) > ORGANIZE_MAX_STEM:
+        text = text[:ORGANIZE_MAX_STEM].rstrip(" .")
+    if text.split(".")[0].lower() in _WINDOWS_RESERVED:
+        text += "_"
+    return text
+
+_safe_shared_value = functools.lru_cache(maxsize=4096)(safe_filename)  # creators and tags repeat
+
+class OrganizeFields(dict):
+    """
+    Values a rename template can use for one card, each safe inside a file
+    name. Filled in on first use, so only the fields a template names are worked out.
+    """
+
+    def __init__(self, index, row):
+        super().__init__()
+        self.index = index
+        self.row = row
+
+    def __missing__(self, field):
+        index, row = self.index, self.row
+        if field == "name":
+            value = safe_filename(index.card_name(row))
+        elif field == "creator":
+            value = _safe_shared_value(index.creator(row))
+        elif field == "filename":
+            value = os.path.splitext(index.filename(row))[0]
+        elif field == "tag":
+            tags = index.tags(row)
+            value = _safe_shared_value(str(tags[0])) if tags else ""
+        elif field == "date":
+            value = time.strftime("%Y-%m-%d", time.localtime(index.mtime(row)))
+        else:
+            raise KeyError(field)
+        self[field] = value
+        return value
+
+def check_organize_template(template):
+    """Raise ValueError with a readable message if template can't be rendered."""
+    if not template.strip():
+        raise ValueError("the template is empty")
+    try:
+        template.format_map(dict.fromkeys(ORGANIZE_FIELDS, ""))
+    except KeyError as e:
+        raise ValueError(f"unknown field {{{e.args[0]}}}; use "
+                         + ", ".join(f"{{{f}}}" for f in ORGANIZE_FIELDS)) from None
+    except (ValueError, IndexError) as e:
+        raise ValueError(f"bad template: {e}") from None
+
+def plan_organize(index, folder, template, by_creator=False):
+    """
+    Renames (and moves into per-creator subfolders) that would give every card
+    in index a name from template, worked out from the index alone:
+    [OrganizeMove] for the cards whose path changes, in name order.
+
+    A name already taken, by any card currently in the folder or a file in a
+    target subfolder, gets a " (2)", " (3)", ... suffix, so no move ever lands
+    on an existing file and the moves can run in any order. Names are compared
+    case-insensitively, as Windows and macOS do. Raises ValueError for a bad
+    template.
+    """
+    check_organize_template(template)
+    taken = {("", index.filename(row).casefold()) for row in index.rows()}
+    listed = set()
+    moves = []
+    for row in index.sorted_rows("name"):
+        old = index.filename(row)
+        fields = OrganizeFields(index, row)
+        stem = safe_filename(template.format_map(fields)) or fields["filename"]
+        subdir = (fields["creator"] or "Unknown") if by_creator else ""
+        if subdir and subdir not in listed:
+            listed.add(subdir)
+            try:
+                taken.update((subdir, f.casefold()) for f in os.listdir(os.path.join(folder, subdir)))
+            except OSError:
+                pass  # not there yet
+        name = stem + ".png"
+        own = old.casefold() if not subdir else None  # a card's own name is free for it
+        candidate = name
+        i = 2
+        while candidate.casefold() != own and (subdir, candidate.casefold()) in taken:
+            candidate = f"{stem} ({i}).png"
+            i += 1
+        if not subdir and candidate == old:
+            continue
+        taken.add((subdir, candidate.casefold()))
+        moves.append(OrganizeMove(old, f"{subdir}/{candidate}" if subdir else candidate, candidate != name))
+    return moves
+
+# -------------------------
+# Folder sync
+# -------------------------
+
+SYNC_WORKERS = 4  # concurrent copies; mirrors are often on another disk or a network share
+
+SyncPlan = namedtuple("SyncPlan", "copy rename delete unchanged")
+
+def _names_related(a, b):
+    # One file name's stem within the other's, e.g. "Ann.png" and "Ann (2).png" or "Bob - Ann.png"
+    a, b = (os.path.splitext(name)[0].casefold() for name in (a, b))
+    return bool(a and b) and (a in b or b in a)
+
+def plan_sync(src_stats, dst_stats, digest=None, compare_contents=False):
+    """
+    What it takes to make a destination folder hold the source's cards, from
+    {filename: (mtime, size)} of both sides:
+      copy       source files missing from the destination or different there
+      rename     [(destination name, source name)]: a destination file that is
+                 a source card under an old name, renamed instead of copied again
+      delete     destination files the source doesn't have (removed when mirroring)
+      unchanged  files already the same on both sides
+    Files match by fingerprint (copies keep their modification time). A
+    rename found by fingerprint alone is only trusted when it is the sole
+    candidate both ways and the names are related; otherwise it is confirmed
+    with digest(side, filename) -> content hash ("src" or "dst"), and without
+    a digest the card is copied. compare_contents (needs digest) compares
+    same-sized files by content instead, which also catches changes that
+    kept size and date.
+    """
+    if compare_contents and digest is None:
+        raise ValueError("compare_contents needs a digest")
+    key_of = (lambda fp: fp[1]) if compare_contents else (lambda fp: fp)
+    copy, rename, unchanged = [], [], []
+    missing = []
+    for fname in sorted(src_stats):
+        fp = src_stats[fname]
+        other = dst_stats.get(fname)
+        if other is None:
+            missing.append(fname)
+        elif (other[1] == fp[1] and digest("src", fname) == digest("dst", fname) if compare_contents
+              else other == fp):
+            unchanged.append(fname)
+        else:
+            copy.append(fname)
+    # Renames: destination files the source no longer has by that name, matched up by fingerprint or size
+    orphans = {}
+    for fname in sorted(dst_stats.keys() - src_stats.keys()):
+        orphans.setdefault(key_of(dst_stats[fname]), []).append(fname)
+    wanted = Counter(key_of(src_stats[fname]) for fname in missing)
+    for fname in missing:
+        key = key_of(src_stats[fname])
+        candidates = orphans.get(key, [])
+        match = None
+        if (not compare_contents and len(candidates) == 1 and wanted[key] == 1
+                and _names_related(candidates[0], fname)):
+            match = candidates.pop()
+        elif digest is not None:
+            for i, old in enumerate(candidates):
+                if digest("dst", old) == digest("src", fname):
+                    match = candidates.pop(i)
+                    break
+        if match is not None:
+            rename.append((match, fname))
+        else:
+            copy.append(fname)
+    delete = sorted(f for names in orphans.values() for f in names)
+    return SyncPlan(sorted(copy), rename, delete, unchanged)
+
+# -------------------------
+# Local HTTP API
+# -------------------------
+
+API_DEFAULT_PORT = 8765
+API_WORKERS = 8             # request-handling threads
+API_KEEPALIVE_TIMEOUT = 2   # seconds an idle keep-alive connection holds a worker
+API_MAX_PAGE = 500
+API_THUMB_SIZE = (180, 220)
+
+@functools.lru_cache(maxsize=512)
+def _api_thumbnail_png(path, mtime, size):
+    # mtime and size are part of the cache key so edited cards get a fresh thumbnail
+    from PIL import Image
+    with Image.open(io.BytesIO(read_card_file(path)[1])) as im:
+        im.thumbnail(API_THUMB_SIZE)
+        out = io.BytesIO()
+        im.save(out, "PNG")
+    return out.getvalue()
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    """
+    GET /api/status
+    GET /api/cards?q=<query>&sort=<mode>&offset=<n>&limit=<n>
+    GET /api/cards/<filename>
+    GET /api/cards/<filename>/thumbnail
+    """
+    protocol_version = "HTTP/1.1"  # keep-alive; every response carries Content-Length
+    timeout = API_KEEPALIVE_TIMEOUT
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    server_version = f"CardViewer/{__version__}"
+
+    def log_message(self, fmt, *args):
+        LOG.debug("api: " + fmt, *args)
+
+    def _not_modified(self, etag):
+        tags = [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]
+        return etag in tags or "*" in tags
+
+    def _send(self, status, body, content_type="application/json; charset=utf-8", etag=None):
+        if etag is not None and status == 200 and self._not_modified(etag):
+            status, body = 304, b""
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")  # revalidate, cheaply, with the ETag
+        if status != 304:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if self.server.saturated():
+            # Every worker is taken: don't let this connection sit idle on one while others queue
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_json(self, status, obj, etag=None):
+        self._send(status, json.dumps(obj, ensure_ascii=False).encode("utf-8"), etag=etag)
+
+    def _error(self, status, message):
+        self._send_json(status, {"error": message})
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        if not self.server.host_allowed(self.headers.get("Host", "")):
+            # A page that rebinds its own domain to 127.0.0.1 must not get to read the library
+            return self._error(403, "unexpected Host header")
+        url = urlsplit(self.path)
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        state = self.server.state()
+        if state is None:
+            return self._error(503, "no library loaded")
+        try:
+            if parts == ["api", "status"]:
+                return self._send_json(200, state.status())
+            if parts == ["api", "cards"]:
+                return self._search(state, parse_qs(url.query))
+            if len(parts) in (3, 4) and parts[:2] == ["api", "cards"]:
+                row = state.index.row_of(parts[2])
+                if row is None:
+                    return self._error(404, f"no card named {parts[2]!r}")
+                if len(parts) == 3:
+                    return self._card(state, row)
+                if parts[3] == "thumbnail":
+                    return self._thumbnail(state, row)
+            return self._error(404, "not found")
+        except (BrokenPipeError, ConnectionResetError):
+            raise
+        except Exception as e:
+            LOG.exception("api: %s failed", self.path)
+            return self._error(500, str(e))
+
+    def _search(self, state, params):
+        def param(name, default):
+            values = params.get(name)
+            return values[-1] if values else default
+        try:
+            offset = max(0, int(param("offset", 0)))
+            limit = min(API_MAX_PAGE, max(0, int(param("limit", 50))))
+        except ValueError:
+            return self._error(400, "offset and limit must be integers")
+        sort = param("sort", "name")
+        if sort not in SORT_MODES:
+            return self._error(400, f"unknown sort {sort!r}; one of {', '.join(SORT_MODES)}")
+        query = param("q", "")
+        etag = '"%d-%s"' % (state.version, hashlib.sha1(
+            f"{query}\0{sort}\0{offset}\0{limit}".encode("utf-8")).hexdigest()[:16])
+        if self._not_modified(etag):
+            return self._send(304, b"", etag=etag)  # skip the query entirely
+        total, items = state.search(query, sort, offset, limit)
+        self._send_json(200, {"total": total, "offset": offset, "limit": limit, "items": items}, etag=etag)
+
+    def _card(self, state, row):
+        entry = state.index.entry(row)
+        etag = '"%d-%d"' % (entry["mtime"], entry["size"])
+        if self._not_modified(etag):
+            return self._send(304, b"", etag=etag)
+        meta, error = read_card_metadata(os.path.join(state.folder, entry["filename"]))
+        self._send_json(200, {"card": entry, "metadata": meta, "error": error}, etag=etag)
+
+    def _thumbnail(self, state, row):
+        entry = state.index.entry(row)
+        etag = '"%d-%d-t"' % (entry["mtime"], entry["size"])
+        if self._not_modified(etag):
+            return self._send(304, b"", etag=etag)
+        try:
+            png = _api_thumbnail_png(os.path.join(state.folder, entry["filename"]), entry["mtime"], entry["size"])
+        except Exception as e:
+            return self._error(422, f"cannot render thumbnail: {e}")
+        self._send(200, png, content_type="image/png", etag=etag)
+
+class _ApiState:
+    """One published, read-only CardIndex snapshot and the folder it describes."""
+
+    def __init__(self, index, folder, version):
+        self.index = index
+        self.folder = folder
+        self.version = version
+        self._lock = threading.Lock()  # bitmaps and sort orders are built lazily on first use
+
+    def status(self):
+        return {"folder": self.folder, "cards": len(self.index), "version": self.version}
+
+    def search(self, query, sort, offset, limit):
+        with self._lock:
+            terms = parse_query(query.strip())
+            rows = QueryPlan(self.index, terms).execute() if terms else None
+            ordered = self.index.sorted_rows(sort, rows)
+            page = ordered[offset:offset + limit]
+            return len(ordered), [self.index.entry(r) for r in page]
+
+class CardApiServer(HTTPServer):
+    """
+    Read-only HTTP/JSON API over a card library, bound to localhost.
+
+    Requests are handled on a fixed thread pool and only ever see a snapshot
+    handed over with publish(), so serving never touches the live index or
+    the Qt event loop. port=0 picks a free port (see .url).
+    """
+
+    def __init__(self, port=API_DEFAULT_PORT, host="127.0.0.1"):
+        super().__init__((host, port), _ApiHandler)
+        self._pool = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="card-api")
+        self._connections = 0  # accepted and not yet closed, including those waiting for a worker
+        self._connections_lock = threading.Lock()
+        self._state = None
+        self._version = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def publish(self, index, folder):
+        """Serve index (a snapshot nobody else mutates) from now on."""
+        self._version += 1
+        self._state = _ApiState(index, folder, self._version)
+
+    def state(self):
+        return self._state
+
+    def host_allowed(self, host):
+        """Whether a request's Host header names this server by a loopback name and its port."""
+        port = self.server_address[1]
+        return host.strip().lower() in {f"127.0.0.1:{port}", f"localhost:{port}", f"[::1]:{port}"}
+
+    def saturated(self):
+        """True when no worker is free for another connection."""
+        return self._connections >= API_WORKERS
+
+    def process_request(self, request, client_address):
+        with self._connections_lock:
+            self._connections += 1
+        self._pool.submit(self._handle_connection, request, client_address)
+
+    def _handle_connection(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._connections_lock:
+                self._connections -= 1
+
+    def handle_error(self, request, client_address):
+        LOG.debug("api: connection from %s failed", client_address, exc_info=True)
+
+    def start(self):
+        """Serve on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, name="card-api", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+def load_folder_index(folder, cache_dir, tag_aliases=None):
+    """
+    CardIndex of folder for headless use: the cached index brought up to date
+    synchronously, with the changes appended to the journal for the next run.
+    """
+    journal = IndexJournal(cache_dir)
+    index = CardIndex.from_records(replay_index_journal(load_index_cache(journal.snapshot_path), journal.path),
+                                   tag_aliases)
+    known = index.known_stats()
+    seen = set()
+    for fname, mtime, size in iter_png_stats(folder):
+        seen.add(fname)
+        if known.get(fname) != (mtime, size):
+            try:
+                index.upsert(build_index_entry(folder, fname))
+            except Exception:
+                LOG.exception("Failed scanning %s", fname)
+    for fname in known.keys() - seen:
+        index.remove(fname)
+    journal.append(index.take_changes())
+    return index
+
+# -------------------------
+# Background worker
+# -------------------------
+
+# Scan priorities (lower runs first)
+SCAN_PRIORITY_SELECTED = 0
+SCAN_PRIORITY_VISIBLE = 1
+SCAN_PRIORITY_MATCH = 2
+SCAN_PRIORITY_BACKGROUND = 3
+
+SCAN_BATCH_SIZE = 200          # max entries per updated_entries emit
+SCAN_BATCH_INTERVAL = 0.25     # seconds between background batch emits
+SCAN_IDLE_AFTER = 0.75         # seconds without input before the user counts as idle
+SCAN_IDLE_THROTTLE = 0.02      # pause per background item while the user is active
+SCAN_MAX_MATCH_BOOST = 2000    # cap on search matches boosted at once
+SCAN_READ_AHEAD = 8            # cards read in parallel ahead of the parser while idle
+
+class ScanScheduler:
+    """
+    Thread-safe priority queue of file names waiting to be (re)scanned.
+    The GUI re-ranks pending files with reprioritize() as the user scrolls,
+    selects or searches; the worker pulls the most urgent file with pop().
+    Stale heap entries are skipped lazily instead of being removed.
+    """
+
+    def __init__(self, tasks=()):
+        self._lock = threading.Lock()
+        self._heap = []
+        self._prio = {}       # fname -> current priority
+        self._order = {}      # fname -> background order (alphabetical)
+        self._boosted = set()
+        self._seq = itertools.count()
+        self._closed = False
+        self._last_activity = 0.0
+        self.add(tasks)
+
+    def add(self, fnames):
+        """Queue files at background priority. Returns False once the queue has been drained."""
+        with self._lock:
+            if self._closed:
+                return False
+            for fname in fnames:
+                if fname in self._prio:
+                    continue
+                order = next(self._seq)
+                self._order[fname] = order
+                self._prio[fname] = SCAN_PRIORITY_BACKGROUND
+                heapq.heappush(self._heap, (SCAN_PRIORITY_BACKGROUND, order, fname))
+            return True
+
+    def reprioritize(self, urgent):
+        """
+        urgent: dict fname -> priority, in the order the rows appear on screen.
+        Files boosted by an earlier call and missing from urgent fall back to background.
+        """
+        with self._lock:
+            for fname in self._boosted - urgent.keys():
+                if self._prio.get(fname, SCAN_PRIORITY_BACKGROUND) != SCAN_PRIORITY_BACKGROUND:
+                    self._prio[fname] = SCAN_PRIORITY_BACKGROUND
+                    heapq.heappush(self._heap, (SCAN_PRIORITY_BACKGROUND, self._order[fname], fname))
+            self._boosted = set()
+            for rank, (fname, prio) in enumerate(urgent.items()):
+                if fname not in self._prio:
+                    continue
+                self._boosted.add(fname)
+                if self._prio[fname] != prio:
+                    self._prio[fname] = prio
+                    heapq.heappush(self._heap, (prio, rank, fname))
+            # Drop stale entries once they clearly outnumber live ones
+            if len(self._heap) > 2 * len(self._prio) + 1024:
+                self._heap = [(p, o, f) for p, o, f in self._heap if self._prio.get(f) == p]
+                heapq.heapify(self._heap)
+
+    def pop(self):
+        """Return (fname, priority) of the most urgent file, or None (and close) when empty."""
+        with self._lock:
+            while self._heap:
+                prio, _, fname = heapq.heappop(self._heap)
+                if self._prio.get(fname) == prio:
+                    del self._prio[fname]
+                    self._boosted.discard(fname)
+                    return fname, prio
+            self._closed = True
+            return None
+
+    def pending(self):
+        return len(self._prio)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._heap.clear()
+            self._prio.clear()
+
+    def note_activity(self):
+        self._last_activity = time.monotonic()
+
+    def is_idle(self):
+        return time.monotonic() - self._last_activity >= SCAN_IDLE_AFTER
+
+
+class ScanWorker(QObject):
+    progress = Signal(int, int)  # processed, total
+    updated_entries = Signal(str, list)  # folder, batch of new/updated index entries
+    finished = Signal()
+
+    def __init__(self, folder, scheduler, history=None, shared=None):
+        super().__init__()
+        self.folder = folder
+        self.scheduler = scheduler  # ScanScheduler of file names to (re)scan
+        self.history = history  # HistoryStore, when card history is kept
+        self.shared = shared    # SharedCardCache, when caching across folders
+
+    def run(self):
+        batch = []
+        done = 0
+        last_emit = time.monotonic()
+        # Files are read a few ahead of the parser so disk/network latency overlaps parsing
+        reader = ThreadPoolExecutor(max_workers=SCAN_READ_AHEAD, thread_name_prefix="card-read")
+        reading = deque()  # (fname, prio, future of read_card_file)
+        try:
+            while True:
+                window = SCAN_READ_AHEAD if self.scheduler.is_idle() else 1
+                while len(reading) < window:
+                    item = self.scheduler.pop()
+                    if item is None:
+                        break
+                    fname, prio = item
+                    reading.append((fname, prio, reader.submit(read_card_file, os.path.join(self.folder, fname))))
+                if not reading:
+                    break
+                fname, prio, pending_read = reading.popleft()
+                if prio >= SCAN_PRIORITY_BACKGROUND and not self.scheduler.is_idle():
+                    # Yield the disk and the GIL while the user is interacting
+                    time.sleep(SCAN_IDLE_THROTTLE)
+                try:
+                    batch.append(build_index_entry(self.folder, fname, pending_read.result(),
+                                                   self.history, self.shared))
+                except Exception:
+                    LOG.exception("Failed scanning %s", fname)
+                done += 1
+                now = time.monotonic()
+                # Urgent rows are pushed out right away so the visible list fills in first
+                if batch and (prio < SCAN_PRIORITY_BACKGROUND or len(batch) >= SCAN_BATCH_SIZE
+                              or now - last_emit >= SCAN_BATCH_INTERVAL):
+                    self.updated_entries.emit(self.folder, batch)
+                    self.progress.emit(done, done + len(reading) + self.scheduler.pending())
+                    batch = []
+                    last_emit = now
+                    for store in (self.history, self.shared):
+                        if store is not None:
+                            store.flush()
+        finally:
+            reader.shutdown(wait=True)
+        if batch:
+            self.updated_entries.emit(self.folder, batch)
+        for store in (self.history, self.shared):
+            if store is not None:
+                store.flush()
+        self.progress.emit(done, done)
+        self.finished.emit()
+
+class IndexSyncWorker(QObject):
+    """
+    Stat sweep of a card folder against a snapshot of the cached index.
+    Differences are streamed back in chunks so the GUI can apply them as they come in.
+    """
+    changed = Signal(str, list)  # folder, [(filename, mtime, size)] new or modified on disk
+    removed = Signal(str, list)  # folder, [filename] gone from disk
+    finished = Signal()
+
+    def __init__(self, folder, known, force_refresh=False, parallel_stat=False):
+        super().__init__()
+        self.folder = folder
+        self.known = known  # filename -> cached (mtime, size)
+        self.force_refresh = force_refresh
+        self.parallel_stat = parallel_stat
+
+    def run(self):
+        seen = set()
+        chunk = []
+        last_emit = time.monotonic()
+        try:
+            for fname, mtime, size in iter_png_stats(self.folder, self.parallel_stat):
+                seen.add(fname)
+                if self.force_refresh or self.known.get(fname) != (mtime, size):
+                    chunk.append((fname, mtime, size))
+                now = time.monotonic()
+                if chunk and (len(chunk) >= SCAN_BATCH_SIZE or now - last_emit >= SCAN_BATCH_INTERVAL):
+                    self.changed.emit(self.folder, chunk)
+                    chunk = []
+                    last_emit = now
+        except OSError:
+            LOG.exception("Failed to list %s", self.folder)
+            self.finished.emit()
+            return
+        if chunk:
+            self.changed.emit(self.folder, chunk)
+        gone = [f for f in self.known if f not in seen]
+        if gone:
+            self.removed.emit(self.folder, gone)
+        self.finished.emit()
+
+INGEST_WORKERS = 4  # concurrent copies when cards are dropped onto the window
+
+class IngestWorker(QObject):
+    """
+    Copies dropped cards into a folder and indexes just those files.
+    A dropped file whose content is already in the folder, or earlier in the
+    same drop, is skipped; content is only hashed when sizes collide.
+    Failures are collected into the summary instead of being reported one by one.
+    """
+    progress = Signal(int, int)  # files done, total
+    updated_entries = Signal(str, list)  # folder, index entries of the copied cards
+    finished = Signal(str, dict)  # folder, {"added": [...], "duplicates": [...], "errors": [(file, message)]}
+
+    def __init__(self, folder, sources, files_by_size, history=None, shared=None):
+        super().__init__()
+        self.folder = folder
+        self.sources = sources
+        self.files_by_size = files_by_size  # size -> [filename] already in the folder
+        self.history = history  # HistoryStore, when card history is kept
+        self.shared = shared    # SharedCardCache, when caching across folders
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """Stop after the copies in flight; files not started yet are left out."""
+        self._cancel.set()
+
+    def _copy_and_index(self, src, fname):
+        dst = os.path.join(self.folder, fname)
+        part = dst + ".part"  # not a .png, so the stat sweep never sees a half-copied card
+        try:
+            shutil.copy2(src, part)
+            os.replace(part, dst)
+        except BaseException:
+            try:
+                os.remove(part)
+            except OSError:
+                pass
+            raise
+        return build_index_entry(self.folder, fname, history=self.history, shared=self.shared)
+
+    def run(self):
+        summary = {"added": [], "duplicates": [], "errors": []}
+        folder_digests = {}  # filename in folder -> digest, filled in on size collisions
+        dropped = {}         # size -> [[src, digest or None]] accepted from this drop
+        taken = set()        # destination names handed out in this drop
+        jobs = []
+        total = len(self.sources)
+        done = 0
+
+        def digest_of(path, cache, key):
+            if cache.get(key) is None:
+                cache[key] = file_digest(path)
+            return cache[key]
+
+        for src in self.sources:
+            name = os.path.basename(src)
+            try:
+                if os.path.dirname(os.path.abspath(src)) == os.path.abspath(self.folder):
+                    summary["duplicates"].append(name)  # already in the library
+                    done += 1
+                    continue
+                size = os.path.getsize(src)
+                own = {}
+                duplicate = False
+                for fname in self.files_by_size.get(size, ()):
+                    try:
+                        if digest_of(os.path.join(self.folder, fname), folder_digests, fname) == \
+                                digest_of(src, own, "src"):
+                            duplicate = True
+                            break
+                    except OSError:
+                        folder_digests[fname] = ""  # unreadable; can't be a match
+                if not duplicate:
+                    for other in dropped.get(size, ()):
+                        if other[1] is None:
+                            other[1] = file_digest(other[0])
+                        if other[1] == digest_of(src, own, "src"):
+                            duplicate = True
+                            break
+                if duplicate:
+                    summary["duplicates"].append(name)
+                    done += 1
+                    continue
+                dropped.setdefault(size, []).append([src, own.get("src")])
+                fname = unique_card_name(self.folder, name, taken)
+                taken.add(fname)
+                jobs.append((src, fname))
+            except OSError as e:
+                summary["errors"].append((name, str(e)))
+                done += 1
+        self.progress.emit(done, total)
+
+        batch = []
+        last_emit = time.monotonic()
+        with ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="card-ingest") as pool:
+            futures = {pool.submit(self._copy_and_index, src, fname): (src, fname) for src, fname in jobs}
+            for future in as_completed(futures):
+                if self._cancel.is_set():
+                    for f in futures:
+                        f.cancel()
+                if future.cancelled():
+                    continue
+                src, fname = futures[future]
+                done += 1
+                try:
+                    batch.append(future.result())
+                    summary["added"].append(fname)
+                except Exception as e:
+                    LOG.exception("Failed to add %s", src)
+                    summary["errors"].append((os.path.basename(src), str(e)))
+                now = time.monotonic()
+                if batch and (len(batch) >= SCAN_BATCH_SIZE or now - last_emit >= SCAN_BATCH_INTERVAL):
+                    self.updated_entries.emit(self.folder, batch)
+                    self.progress.emit(done, total)
+                    batch = []
+                    last_emit = now
+        if batch:
+            self.updated_entries.emit(self.folder, batch)
+        for store in (self.history, self.shared):
+            if store is not None:
+                store.flush()
+        self.progress.emit(done, total)
+        self.finished.emit(self.folder, summary)
+
+WARM_IDLE_AFTER = 2.0               # seconds without input before warming starts or resumes
+WARM_THROTTLE = 0.02                # pause after every card warmed
+WARM_READ_RATE = 32 * 1024 * 1024   # bytes per second read from disk while warming
+WARM_MEMORY_BUDGET_MB = 256         # warmed thumbnails and metadata kept in memory
+WARM_DISK_BUDGET_MB = 1024          # shared cache size past which warming stops adding thumbnails
+WARM_DISK_CHECK_EVERY = 50          # cards between shared cache size checks
+
+class InputActivity:
+    """When the user last pressed a key or moved the mouse, for background workers to read."""
+
+    def __init__(self):
+        self._last = 0.0
+
+    def note(self):
+        self._last = time.monotonic()
+
+    def idle_for(self):
+        """Seconds since the last input."""
+        return time.monotonic() - self._last
+
+class WarmWorker(QObject):
+    """
+    Makes thumbnails and parses card metadata ahead of time, in list order,
+    so that selecting a card finds both ready. Only runs while the user is
+    idle: any input pauses it until WARM_IDLE_AFTER has passed again, and
+    reads are held to WARM_READ_RATE. Stops once it has handed over
+    memory_budget bytes, or the shared cache has grown past WARM_DISK_BUDGET_MB.
+
+    items: [(fname, mtime, size, need_thumb, need_meta)]. A file that no longer
+    matches its index entry is skipped; the next scan picks it up.
+    """
+    warmed = Signal(str, object)  # folder, (fname, mtime, size, QImage or None, meta, error, nbytes)
+    progress = Signal(int, int)   # done, total
+    finished = Signal(str)        # "done", "memory", "disk" or "cancelled"
+
+    def __init__(self, folder, items, activity, memory_budget, shared=None):
+        super().__init__()
+        self.folder = folder
+        self.items = items
+        self.activity = activity
+        self.memory_budget = memory_budget
+        self.shared = shared  # SharedCardCache, when caching across folders
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _wait_for_idle(self):
+        while not self._cancel.is_set():
+            wait = WARM_IDLE_AFTER - self.activity.idle_for()
+            if wait <= 0:
+                return True
+            self._cancel.wait(min(wait, 0.25))
+        return False
+
+    def _thumbnail(self, data):
+        from PIL import Image
+        im = Image.open(io.BytesIO(data)).convert("RGBA").resize(THUMB_SIZE, Image.LANCZOS)
+        image = QImage(im.tobytes("raw", "RGBA"), im.width, im.height, QImage.Format.Format_RGBA8888)
+        return image.copy()  # own the pixels; the bytes above go away
+
+    def _warm(self, fname, mtime, size, need_thumb, need_meta):
+        """Returns (image, meta, error, nbytes, bytes read), or None if the file changed."""
+        path = os.path.join(self.folder, fname)
+        image = meta = error = None
+        jpeg = None
+        if need_thumb and self.shared is not None:
+            jpeg = self.shared.thumbnail(self.folder, fname, mtime, size)
+        data = b""
+        if need_meta or (need_thumb and jpeg is None):
+            st, data = read_card_file(path)
+            if (int(st.st_mtime), st.st_size) != (mtime, size):
+                return None
+            if need_thumb and self.shared is not None and jpeg is None:
+                jpeg = card_thumbnail_jpeg(data)
+                self.shared.store_thumbnail(self.folder, fname, st, card_content_hash(data), jpeg)
+            if need_meta:
+                meta, error = read_card_metadata(path, data)
+        nbytes = 0
+        if need_thumb:
+            if jpeg is not None:
+                image = QImage.fromData(jpeg)
+            else:
+                image = self._thumbnail(data)
+            if image.isNull():
+                image = None
+            else:
+                nbytes += image.sizeInBytes()
+        if meta is not None:
+            nbytes += 2 * len(json.dumps(meta, ensure_ascii=False))  # rough size once parsed
+        return image, meta, error, nbytes, len(data)
+
+    def run(self):
+        total = len(self.items)
+        spent = 0
+        reason = "done"
+        for done, (fname, mtime, size, need_thumb, need_meta) in enumerate(self.items):
+            if not self._wait_for_idle():
+                reason = "cancelled"
+                break
+            if spent >= self.memory_budget:
+                reason = "memory"
+                break
+            if need_thumb and self.shared is not None and done % WARM_DISK_CHECK_EVERY == 0 \
+                    and self.shared.stats()[2] >= WARM_DISK_BUDGET_MB * 1024 * 1024:
+                reason = "disk"
+                break
+            started = time.monotonic()
+            try:
+                result = self._warm(fname, mtime, size, need_thumb, need_meta)
+            except Exception:
+                LOG.debug("Could not warm %s", fname, exc_info=True)
+                result = None
+            read = 0
+            if result is not None:
+                image, meta, error, nbytes, read = result
+                spent += nbytes
+                self.warmed.emit(self.folder, (fname, mtime, size, image, meta, error, nbytes))
+            self.progress.emit(done + 1, total)
+            self._cancel.wait(max(WARM_THROTTLE, read / WARM_READ_RATE - (time.monotonic() - started)))
+        if self.shared is not None:
+            self.shared.flush()
+        self.finished.emit(reason)
+
+class OrganizeWorker(QObject):
+    """
+    Carries out plan_organize() moves with os.rename, so cards never get copied.
+    A destination that has appeared since the plan was made gets the next free
+    " (N)" name rather than being overwritten.
+
+    Cards moved into subfolders leave this folder's index; their entries are
+    appended to each subfolder's index journal, so opening a subfolder finds
+    them indexed already. Renames within the folder are handed back for the
+    viewer to remap its index in place. The shared cache follows both; card
+    history follows renames, and is dropped for cards that left the folder
+    (history is kept per folder).
+    """
+    progress = Signal(int, int)             # done, total
+    finished = Signal(str, object, object)  # folder, [(old, new relative path)] done, [(old, error)]
+
+    def __init__(self, folder, moves, entries, cache_location, history=None, shared=None):
+        super().__init__()
+        self.folder = folder
+        self.moves = moves
+        self.entries = entries  # old filename -> index entry, for cards moved into subfolders
+        self.cache_location = cache_location
+        self.history = history  # HistoryStore, when card history is kept
+        self.shared = shared    # SharedCardCache, when caching across folders
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """Stop before the next move; the moves already made are reported."""
+        self._cancel.set()
+
+    def _move(self, move):
+        src = os.path.join(self.folder, move.old)
+        subdir, _, name = move.new.rpartition("/")
+        dst_dir = os.path.join(self.folder, subdir) if subdir else self.folder
+        if subdir:
+            os.makedirs(dst_dir, exist_ok=True)
+        case_only = not subdir and name.casefold() == move.old.casefold()
+        if not case_only and os.path.exists(os.path.join(dst_dir, name)):
+            name = unique_card_name(dst_dir, name)
+        os.rename(src, os.path.join(dst_dir, name))
+        return f"{subdir}/{name}" if subdir else name
+
+    def run(self):
+        done = []
+        errors = []
+        total = len(self.moves)
+        last_emit = time.monotonic()
+        for i, move in enumerate(self.moves):
+            if self._cancel.is_set():
+                break
+            try:
+                done.append((move.old, self._move(move)))
+            except OSError as e:
+                errors.append((move.old, str(e)))
+            now = time.monotonic()
+            if now - last_emit >= SCAN_BATCH_INTERVAL:
+                self.progress.emit(i + 1, total)
+                last_emit = now
+        by_subdir = {}
+        moved = []  # (old folder, old name, new folder, new name)
+        for old, new in done:
+            subdir, _, name = new.rpartition("/")
+            moved.append((self.folder, old, os.path.join(self.folder, subdir) if subdir else self.folder, name))
+            if subdir and old in self.entries:
+                by_subdir.setdefault(subdir, []).append({"put": {**self.entries[old], "filename": name}})
+        for subdir, records in by_subdir.items():
+            IndexJournal(resolve_cache_dir(os.path.join(self.folder, subdir), self.cache_location)).append(records)
+        if self.history is not None:
+            # Forget first: a card renamed onto a name another card just vacated keeps its own history
+            self.history.forget([old for old, new in done if "/" in new])
+            self.history.rename([(old, new) for old, new in done if "/" not in new])
+        if self.shared is not None:
+            self.shared.move(moved)
+        self.progress.emit(total, total)
+        self.finished.emit(self.folder, done, errors)
+
+class SyncWorker(QObject):
+    """
+    Makes dest hold the cards of folder. Plans with plan_sync() against a
+    fresh stat sweep of both sides, renames what was only renamed, copies the
+    rest several at a time (copy2 to a .part file, then renamed into place),
+    and, when mirroring, deletes what the source doesn't have. Last, dest's
+    cards.json is written from the source index (a snapshot), so the mirror
+    opens without a rescan.
+    """
+    progress = Signal(int, int)     # done, total
+    finished = Signal(str, object)  # dest, summary: copied, renamed, deleted, unchanged, bytes, errors
+
+    def __init__(self, folder, index, dest, cache_location, compare_contents=False, mirror=False):
+        super().__init__()
+        self.folder = folder
+        self.index = index
+        self.dest = dest
+        self.cache_location = cache_location
+        self.compare_contents = compare_contents
+        self.mirror = mirror
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """Stop after the copies in flight; the destination index is still written."""
+        self._cancel.set()
+
+    def _digest(self, side, fname, cache):
+        key = (side, fname)
+        if key not in cache:
+            try:
+                cache[key] = file_digest(os.path.join(self.folder if side == "src" else self.dest, fname))
+            except OSError:
+                cache[key] = f"unreadable {side}"  # never matches the other side
+        return cache[key]
+
+    def _copy(self, fname):
+        dst = os.path.join(self.dest, fname)
+        part = dst + ".part"  # not a .png, so a scan of the mirror never sees a half-copied card
+        try:
+            shutil.copy2(os.path.join(self.folder, fname), part)  # copy2 keeps the modification time
+            os.replace(part, dst)
+        except BaseException:
+            try:
+                os.remove(part)
+            except OSError:
+                pass
+            raise
+        return os.path.getsize(dst)
+
+    def run(self):
+        summary = {"copied": [], "renamed": [], "deleted": [], "unchanged": 0, "bytes": 0, "errors": []}
+        try:
+            self._sync(summary)
+        except Exception as e:
+            LOG.exception("Sync of %s to %s failed", self.folder, self.dest)
+            summary["errors"].append(("", str(e)))
+        self.finished.emit(self.dest, summary)
+
+    def _sync(self, summary):
+        os.makedirs(self.dest, exist_ok=True)
+        src_stats = {f: (m, s) for f, m, s in iter_png_stats(self.folder)}
+        dst_stats = {f: (m, s) for f, m, s in iter_png_stats(self.dest, parallel=True)}
+        digests = {}  # also used to confirm renames that the fingerprint alone leaves in doubt
+        plan = plan_sync(src_stats, dst_stats, lambda side, fname: self._digest(side, fname, digests),
+                         self.compare_contents)
+        summary["unchanged"] = len(plan.unchanged)
+        errors = summary["errors"]
+        synced = set(plan.unchanged)  # destination files now holding the source card of that name
+        total = len(plan.rename) + len(plan.copy) + (len(plan.delete) if self.mirror else 0)
+        done = 0
+        last_emit = time.monotonic()
+
+        def step():
+            nonlocal done, last_emit
+            done += 1
+            now = time.monotonic()
+            if now - last_emit >= SCAN_BATCH_INTERVAL:
+                self.progress.emit(done, total)
+                last_emit = now
+
+        for old, new in plan.rename:
+            if self._cancel.is_set():
+                break
+            try:
+                os.rename(os.path.join(self.dest, old), os.path.join(self.dest, new))
+                summary["renamed"].append((old, new))
+                synced.add(new)
+            except OSError as e:
+                errors.append((old, str(e)))
+            step()
+        with ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix="card-sync") as pool:
+            futures = {pool.submit(self._copy, fname): fname for fname in plan.copy}
+            for future in as_completed(futures):
+                if self._cancel.is_set():
+                    for f in futures:
+                        f.cancel()
+                if future.cancelled():
+                    continue
+                fname = futures[future]
+                try:
+                    summary["bytes"] += future.result()
+                    summary["copied"].append(fname)
+                    synced.add(fname)
+                except OSError as e:
+                    errors.append((fname, str(e)))
+                step()
+        if self.mirror and not self._cancel.is_set():
+            for fname in plan.delete:
+                try:
+                    os.remove(os.path.join(self.dest, fname))
+                    summary["deleted"].append(fname)
+                except OSError as e:
+                    errors.append((fname, str(e)))
+                step()
+        self.progress.emit(done, total)
+        self._write_index(src_stats, synced)
+
+    def _write_index(self, src_stats, synced):
+        """dest's cards.json: source entries for the synced cards, its own still-current entries for the rest."""
+        journal = IndexJournal(resolve_cache_dir(self.dest, self.cache_location))
+        own = {rec["filename"]: rec for rec in
+               replay_index_journal(load_index_cache(journal.snapshot_path), journal.path)}
+        src = self.index
+        index = CardIndex()
+        for fname, mtime, size in iter_png_stats(self.dest):
+            row = src.row_of(fname)
+            if fname in synced and row is not None and (src.mtime(row), src.size(row)) == src_stats.get(fname):
+                index.upsert({**src.entry(row), "mtime": mtime, "size": size})
+            elif fname in own and (own[fname].get("mtime"), own[fname].get("size")) == (mtime, size):
+                index.upsert(own[fname])
+            # anything else is indexed when the mirror is opened
+        journal.compact(index)
+
+class ChatUsageWorker(QObject):
+    """Brings a ChatUsageIndex up to date off the UI thread; only changed chat logs are read."""
+    finished = Signal(str, object)  # root, {chat_usage_key: ChatUsage} or None if cancelled or failed
+
+    def __init__(self, chat_index):
+        super().__init__()
+        self.chat_index = chat_index
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        usage = None
+        try:
+            usage = self.chat_index.refresh(self._cancel)
+        except Exception:
+            LOG.exception("Failed to read chat logs under %s", self.chat_index.root)
+        self.finished.emit(self.chat_index.root, usage)
+
+class SimilarityWorker(QObject):
+    """
+    Brings the saved similarity terms up to date with the index, re-reading only
+    new and changed cards, saves them and builds the matrix for queries.
+    """
+    progress = Signal(int, int)  # cards read, cards to read
+    finished = Signal(str, object, object)  # folder, {filename: terms}, SimilarityMatrix (None if cancelled)
+
+    def __init__(self, folder, cache_dir, known, docs=None, pack=None):
+        super().__init__()
+        self.folder = folder
+        self.path = os.path.join(cache_dir, SIMILARITY_FILE)
+        self.known = known  # filename -> (mtime, size) from the index
+        self.docs = docs    # terms from the previous run, or None to load them from disk
+        self.pack = pack    # LibraryPack the terms come from instead; it is never re-read or saved
+        self.key = None     # set by the GUI: what the index looked like when this run started
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        if self.pack is not None:
+            docs = self.docs if self.docs is not None else self.pack.similarity_terms()
+            self.finished.emit(self.folder, docs, SimilarityMatrix.build(numpy_or_none(), docs))
+            return
+        docs = dict(self.docs) if self.docs is not None else load_similarity_terms(self.path)
+        gone = [f for f in docs if f not in self.known]
+        for fname in gone:
+            del docs[fname]
+        stale = [f for f, (mtime, _) in self.known.items() if f not in docs or docs[f][0] != mtime]
+        for i, fname in enumerate(stale, 1):
+            if self._cancel.is_set():
+                break
+            fpath = os.path.join(self.folder, fname)
+            try:
+                st, data = read_card_file(fpath)
+            except OSError:
+                LOG.exception("Failed to read %s", fpath)
+                continue
+            meta, _ = read_card_fields(fpath, SIMILARITY_FIELD_PATHS, data)
+            docs[fname] = (int(st.st_mtime), *similarity_terms(meta))
+            if i % SCAN_BATCH_SIZE == 0:
+                self.progress.emit(i, len(stale))
+        if gone or stale:
+            try:
+                save_similarity_terms(self.path, docs)  # a cancelled run keeps what it read
+            except Exception:
+                LOG.exception("Failed to save %s", self.path)
+        matrix = None
+        if not self._cancel.is_set():
+            matrix = SimilarityMatrix.build(numpy_or_none(), docs)
+        self.finished.emit(self.folder, docs, matrix)
+
+class PackWorker(QObject):
+    progress = Signal(int, int)  # cards packed, total
+    finished = Signal(str, int, str)  # pack path, cards written (-1 if cancelled or failed), error message
+
+    def __init__(self, folder, path):
+        super().__init__()
+        self.folder = folder
+        self.path = path
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        try:
+            count = write_library_pack(self.path, self.folder, progress=self.progress.emit,
+                                       cancelled=self._cancel.is_set)
+        except Exception as e:
+            LOG.exception("Failed to write %s", self.path)
+            self.finished.emit(self.path, -1, str(e))
+            return
+        self.finished.emit(self.path, -1 if count is None else count, "")
+
+class ValidationWorker(QObject):
+    progress = Signal(int, int)  # re-checked, total to re-check
+    finished = Signal(dict, int)  # {filename: issues}, number of files re-checked
+
+    def __init__(self, folder, cache_dir):
+        super().__init__()
+        self.folder = folder
+        self.cache_dir = cache_dir
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        try:
+            results, rechecked = validate_library(self.folder, progress=self.progress.emit,
+                                                  cancelled=self._cancel.is_set,
+                                                  cache_dir=self.cache_dir)
+        except Exception:
+            LOG.exception("Validation of %s failed", self.folder)
+            results, rechecked = {}, 0
+        self.finished.emit(results, rechecked)
+
+class OptimizeWorker(QObject):
+    progress = Signal(int, int)                  # checked, total to check
+    finished = Signal(str, object, int, object)  # folder, {filename: (before, after)}, checked, [(filename, error)]
+
+    def __init__(self, folder, cache_dir):
+        super().__init__()
+        self.folder = folder
+        self.cache_dir = cache_dir
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        try:
+            replaced, checked, errors = optimize_library(self.folder, progress=self.progress.emit,
+                                                         cancelled=self._cancel.is_set,
+                                                         cache_dir=self.cache_dir)
+        except Exception:
+            LOG.exception("Optimizing %s failed", self.folder)
+            replaced, checked, errors = {}, 0, []
+        self.finished.emit(self.folder, replaced, checked, errors)
+
+# -------------------------
+# Event-loop watchdog
+# -------------------------
+
+STALL_THRESHOLD = 0.2  # seconds without the event loop running that get logged, with the stack
+STALL_TICK = 0.02      # heartbeat interval; event-loop latency is measured against it
+
+class StallWatchdog(QObject):
+    """
+    Measures event-loop latency with a heartbeat timer on the GUI thread. A
+    helper thread notices when the heartbeat stops and grabs the GUI thread's
+    Python stack right then; once the loop runs again the stall is logged
+    with that stack, so the code that froze the UI can be found.
+    """
+
+    def __init__(self, threshold=STALL_THRESHOLD, tick=STALL_TICK, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold
+        self.tick = tick
+        self.latencies = deque(maxlen=200_000)  # seconds each heartbeat came late
+        self.stalls = []  # (seconds, stack) of heartbeats later than threshold
+        self._gui_thread = threading.get_ident()
+        self._last = time.monotonic()
+        self._stack = None  # captured by the helper thread during the current stall
+        self._stop = threading.Event()
+        self._thread = None
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._timer.setInterval(max(1, int(tick * 1000)))
+        self._timer.timeout.connect(self._beat)
+
+    def start(self):
+        self._last = time.monotonic()
+        self._stop.clear()
+        self._timer.start()
+        self._thread = threading.Thread(target=self._watch, name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._timer.stop()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _beat(self):
+        now = time.monotonic()
+        late = max(0.0, now - self._last - self.tick)
+        self._last = now
+        self.latencies.append(late)
+        if late >= self.threshold:
+            stack = self._stack or "(stack not captured)\n"
+            self.stalls.append((late, stack))
+            LOG.warning("UI stalled for %d ms; the GUI thread was in:\n%s", late * 1000, stack.rstrip())
+        self._stack = None
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 4):
+            if self._stack is None and time.monotonic() - self._last - self.tick >= self.threshold:
+                frame = sys._current_frames().get(self._gui_thread)
+                self._stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+
+    def take_stats(self):
+        """Latency stats since the last call, in ms: ticks, p50, p99, max and stalls; then starts over."""
+        latencies = sorted(self.latencies)
+        stalls = len(self.stalls)
+        self.latencies.clear()
+        self.stalls = []
+        if not latencies:
+            return {"ticks": 0, "p50": 0.0, "p99": 0.0, "max": 0.0, "stalls": 0}
+        pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+        return {"ticks": len(latencies), "p50": pick(0.5), "p99": pick(0.99),
+                "max": latencies[-1] * 1000, "stalls": stalls}
+
+# -------------------------
+# UI Widgets
+# -------------------------
+
+class CardDetails(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout()
+        layout.setAlignment(Qt.AlignmentFlag.AlignTop)
+
+        self.image_label = QLabel()
+        self.image_label.setFixedSize(180, 220)
+        self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        layout.addWidget(self.image_label)
+
+        self.meta_area = QScrollArea()
+        self.meta_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.meta_area.setWidgetResizable(True)
+        self.meta_widget = QWidget()
+        self.meta_layout = QVBoxLayout()
+        self.meta_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
+        self.meta_widget.setLayout(self.meta_layout)
+        self.meta_area.setWidget(self.meta_widget)
+        layout.addWidget(self.meta_area)
+
+        self.delete_btn = QPushButton("Delete Card")
+        self.delete_btn.setObjectName("DeleteCardBtn")
+        self.delete_btn.setEnabled(False)
+        layout.addWidget(self.delete_btn, alignment=Qt.AlignmentFlag.AlignLeft)
+
+
+        self.setLayout(layout)
+       
+
+
+    def show_info_message(self, text, error=False):
+        # Clear out all previous widgets
+        color = "red" if error else "#888"
+        label = QLabel(f"<span style='color:{color}'><i>{text}</i></span>")
+        label.setWordWrap(True)
+        self.meta_layout.addWidget(label)
+        self.delete_btn.setEnabled(False)
+
+    def show_image(self, pixmap: QPixmap | None):
+        if pixmap is None:
+            self.image_label.clear()
+        else:
+            self.image_label.setPixmap(pixmap)
+
+    @staticmethod
+    def _linkify(text: str) -> str:
+        # very basic linkify for http(s) and mailto
+        import re
+        def repl(match):
+            url = match.group(0)
+            return f'<a href="{url}">{url}</a>'
+        # http/https
+        text = re.sub(r'(https?://[^\s<]+)', repl, text)
+        # mailto
+        text = re.sub(r'(mailto:[^\s<]+)', repl, text)
+        return text
+    
+    def _add_collapsible_section(self, title: str, populate=None):
+        """
+        Returns the inner VBoxLayout you can add widgets to.
+        populate(inner), if given, is called the first time the section is expanded,
+        so costly content is only built when someone asks for it.
+        """
+        # make them children of the scroll area's content widget
+        btn = QPushButton(f"{title} ▸", parent=self.meta_widget)
+        btn.setCheckable(True)
+        btn.setChecked(False)
+        btn.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+
+        container = QWidget(parent=self.meta_widget)
+        container.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
+
+        inner = QVBoxLayout()
+        inner.setContentsMargins(16, 4, 0, 6)  # small indent
+        inner.setSpacing(4)
+        container.setLayout(inner)
+        container.setVisible(False)
+
+        def on_toggle(checked: bool):
+            nonlocal populate
+            if checked and populate is not None:
+                populate(inner)
+                populate = None
+            container.setVisible(checked)
+            btn.setText(f"{title} {'▾' if checked else '▸'}")
+        btn.toggled.connect(on_toggle)
+
+        self.meta_layout.addWidget(btn)
+        self.meta_layout.addWidget(container)
+        return inner
+
+    @staticmethod
+    def _clear_layout(layout):
+        while layout.count():
+            item = layout.takeAt(0)
+            widget = item.widget()
+            if widget is not None:
+                widget.deleteLater()
+
+    def _clear_metadata(self):
+        self._clear_layout(self.meta_layout)
+
+    LORE_PAGE_SIZE = 20
+
+    def _fill_lorebook(self, inner, entries):
+        """One page of lorebook entries at a time, so huge books stay cheap to show."""
+        pages = (len(entries) + self.LORE_PAGE_SIZE - 1) // self.LORE_PAGE_SIZE
+        nav = QWidget()
+        nav_row = QHBoxLayout(nav)
+        nav_row.setContentsMargins(0, 0, 0, 0)
+        prev_btn = QPushButton("\u25c2 Prev")
+        next_btn = QPushButton("Next \u25b8")
+        page_label = QLabel()
+        nav_row.addWidget(prev_btn)
+        nav_row.addWidget(page_label, 1, Qt.AlignmentFlag.AlignCenter)
+        nav_row.addWidget(next_btn)
+        nav.setVisible(pages > 1)
+        inner.addWidget(nav)
+
+        page_box = QWidget()
+        page_layout = QVBoxLayout(page_box)
+        page_layout.setContentsMargins(0, 0, 0, 0)
+        inner.addWidget(page_box)
+        current = [0]
+
+        def show_page(page):
+            current[0] = page
+            self._clear_layout(page_layout)
+            start = page * self.LORE_PAGE_SIZE
+            for i, entry in enumerate(entries[start:start + self.LORE_PAGE_SIZE], start + 1):
+                keys = entry.get("keys")
+                keys = ", ".join(map(str, keys)) if isinstance(keys, list) else str(keys or "")
+                title = entry.get("comment") or entry.get("name") or ""
+                text = f"<b>#{i} {html.escape(keys) or '(no keys)'}</b>"
+                if title:
+                    text += f" \u2014 {html.escape(str(title))}"
+                if entry.get("enabled") is False:
+                    text += " <i>(disabled)</i>"
+                hdr = QLabel(text)
+                hdr.setWordWrap(True)
+                page_layout.addWidget(hdr)
+                body = QLabel(str(entry.get("content") or ""))
+                body.setTextFormat(Qt.TextFormat.PlainText)
+                body.setWordWrap(True)
+                page_layout.addWidget(body)
+            page_label.setText(f"Page {page + 1} / {pages}")
+            prev_btn.setEnabled(page > 0)
+            next_btn.setEnabled(page < pages - 1)
+
+        prev_btn.clicked.connect(lambda: show_page(current[0] - 1))
+        next_btn.clicked.connect(lambda: show_page(current[0] + 1))
+        show_page(0)
+
+
+    def show_metadata(self, meta, clickable_links=True):
+        # Deferred deletion only: dropping the old widgets synchronously corrupts the heap
+        # when this runs from inside a list selection callback
+        self._clear_metadata()
+
+        def add_field(label, value):
+            if value is None or value == "" or value == "none":
+                return
+            l = QLabel(f"<b>{label}:</b>")
+            l.setWordWrap(True)
+            self.meta_layout.addWidget(l)
+            v = QLabel()
+            v.setWordWrap(True)
+            if isinstance(value, list):
+                value = ", ".join(map(str, value))
+            value_str = str(value)
+            if clickable_links:
+                v.setTextFormat(Qt.TextFormat.RichText)
+                v.setOpenExternalLinks(True)
+                v.setText(self._linkify(value_str))
+            else:
+                v.setText(value_str)
+            self.meta_layout.addWidget(v)
+
+        if not meta:
+            l = QLabel("<span style='color:red'>Could not load card metadata.</span>")
             self.meta_layout.addWidget(l)
             self.delete_btn.setEnabled(False)
             return
-            
-        self._clear_metadata()
-        
+
         add_field("Name", meta.get("name"))
         add_field("Creator", meta.get("creator"))
         add_field("Description", meta.get("description"))
@@ -510,40 +4815,588 @@ class CardDetails(QWidget):
                 title.setWordWrap(True)
                 self.meta_layout.addWidget(title)
 
-                tb = QTextBrowser()                                # was QTextBrowser(parent=self.meta_widget)
-                tb.setReadOnly(True)
-                tb.setOpenExternalLinks(True)
-                tb.setFrameShape(QFrame.NoFrame)
-                tb.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-                tb.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
-                tb.setLineWrapMode(QTextBrowser.WidgetWidth)
-                tb.setWordWrapMode(QTextOption.WrapAnywhere)
-                tb.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Maximum)  # add this
-                tb.setMaximumHeight(220)
-                tb.setHtml(self._linkify(str(g)))
-                self.meta_layout.addWidget(tb)
+                tb = QTextBrowser()                                # was QTextBrowser(parent=self.meta_widget)
+                tb.setReadOnly(True)
+                tb.setOpenExternalLinks(True)
+                tb.setFrameShape(QFrame.NoFrame)
+                tb.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+                tb.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+                tb.setLineWrapMode(QTextBrowser.WidgetWidth)
+                tb.setWordWrapMode(QTextOption.WrapAnywhere)
+                tb.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Maximum)  # add this
+                tb.setMaximumHeight(220)
+                tb.setHtml(self._linkify(str(g)))
+                self.meta_layout.addWidget(tb)
+
+
+        # Post-history instructions (simple text field)
+        phi = meta.get("post_history_instructions")
+        if phi:
+            add_field("Post-History Instructions", phi)
+
+        add_field("Example Dialogue", meta.get("mes_example"))
+        # --- Lorebook: built page by page, and only once expanded ---
+        entries = lorebook_entries(meta)
+        if entries:
+            book = meta.get("character_book")
+            name = book.get("name") if isinstance(book, dict) else None
+            title = f"Lorebook: {name}" if isinstance(name, str) and name.strip() else "Lorebook"
+            count = f"{len(entries)} {'entry' if len(entries) == 1 else 'entries'}"
+            self._add_collapsible_section(f"{title} ({count})",
+                                          populate=lambda inner: self._fill_lorebook(inner, entries))
+        add_field("Tags", meta.get("tags", []))
+        add_field("Talkativeness", meta.get("talkativeness"))
+        add_field("Favorite", "Yes" if meta.get("fav") else "")
+        add_field("Creator Comment", meta.get("creatorcomment") or meta.get("creator_notes"))
+        add_field("Chat", meta.get("chat"))
+        add_field("Card Version", meta.get("character_version"))
+        add_field("Spec", meta.get("spec"))
+        add_field("Spec Version", meta.get("spec_version"))
+        add_field("Create Date", meta.get("create_date"))
+        
+        self.delete_btn.setEnabled(True)
+
+    def show_history(self, count, load_versions, load_image):
+        """
+        Collapsible history of the shown card, below its metadata. load_versions()
+        returns HistoryStore.versions() and is only called once the section is opened.
+        """
+        if count < 2:
+            return
+        self._add_collapsible_section(f"History ({count} versions)",
+                                      populate=lambda inner: self._fill_history(inner, load_versions(), load_image))
+
+    @staticmethod
+    def _history_text(value):
+        if value is None:
+            return ""
+        if isinstance(value, str):
+            return value
+        return json.dumps(value, ensure_ascii=False, indent=1, sort_keys=True)
+
+    @staticmethod
+    def _history_fields(meta):
+        """A recorded version's fields, with the V2/V3 "data" block flattened into data.* keys."""
+        fields = {}
+        for k, v in meta.items():
+            if k == "data" and isinstance(v, dict):
+                fields.update((f"data.{dk}", dv) for dk, dv in v.items())
+            else:
+                fields[k] = v
+        return fields
+
+    @staticmethod
+    def _diff_html(old, new, context=20):
+        """Word-level diff of two texts as HTML; long unchanged stretches are elided."""
+        a = re.findall(r"\S+\s*|\s+", old)
+        b = re.findall(r"\S+\s*|\s+", new)
+        opcodes = difflib.SequenceMatcher(None, a, b).get_opcodes()
+        out = []
+        for n, (op, i1, i2, j1, j2) in enumerate(opcodes):
+            if op == "equal":
+                words = a[i1:i2]
+                after = 0 if n == 0 else context                 # context after the previous change
+                before = 0 if n == len(opcodes) - 1 else context  # context before the next change
+                if len(words) > after + before + 1:
+                    words = words[:after] + ["\u2026 "] + words[len(words) - before:]
+                out.append(html.escape("".join(words)))
+                continue
+            if i2 > i1:
+                out.append("<span style='color:#e06c75; text-decoration:line-through'>"
+                           f"{html.escape(''.join(a[i1:i2]))}</span>")
+            if j2 > j1:
+                out.append(f"<span style='color:#6fbf73'>{html.escape(''.join(b[j1:j2]))}</span>")
+        return "".join(out)
+
+    def _fill_history(self, inner, versions, load_image):
+        """One pair of consecutive versions at a time, picked from a list, newest first."""
+        if len(versions) < 2:
+            # Pruned between showing the card and opening the section
+            inner.addWidget(QLabel("No earlier versions are kept any more."))
+            return
+        picker = QComboBox()
+        total = len(versions)
+        for i in range(total - 1):
+            newer = versions[i]
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(newer["mtime"]))
+            current = " (current)" if i == 0 else ""
+            picker.addItem(f"v{total - i - 1} \u2192 v{total - i}{current}  \u00b7  {when}", i)
+        inner.addWidget(picker)
+        summary = QLabel()
+        summary.setWordWrap(True)
+        inner.addWidget(summary)
+        old_image = QLabel()
+        old_image.setVisible(False)
+        inner.addWidget(old_image)
+        diff_view = QTextBrowser()
+        diff_view.setReadOnly(True)
+        diff_view.setFrameShape(QFrame.NoFrame)
+        diff_view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        diff_view.setWordWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+        diff_view.setMinimumHeight(160)
+        diff_view.setMaximumHeight(400)
+        inner.addWidget(diff_view)
+
+        def show_pair(i):
+            newer, older = versions[i], versions[i + 1]
+            new_meta, old_meta = self._history_fields(newer["meta"]), self._history_fields(older["meta"])
+            keys = [k for k in new_meta if new_meta[k] != old_meta.get(k)]
+            keys += [k for k in old_meta if k not in new_meta]
+            changes = ", ".join(keys) if keys else "no metadata changes"
+            if newer["image"] != older["image"]:
+                changes += "; image changed"
+            summary.setText(f"<b>Changed:</b> {html.escape(changes)}  "
+                            f"<span style='color:#888'>({format_filesize(older['size'])} \u2192 "
+                            f"{format_filesize(newer['size'])})</span>")
+            pix = None
+            if newer["image"] != older["image"] and older["image"]:
+                data = load_image(older["image"])
+                if data is not None:
+                    pix = QPixmap()
+                    pix.loadFromData(data)
+            if pix is not None and not pix.isNull():
+                old_image.setPixmap(pix.scaled(90, 110, Qt.AspectRatioMode.KeepAspectRatio,
+                                               Qt.TransformationMode.SmoothTransformation))
+                old_image.setToolTip(f"Image of v{total - i - 1}")
+                old_image.setVisible(True)
+            else:
+                old_image.setVisible(False)
+            parts = []
+            for k in keys:
+                diff = self._diff_html(self._history_text(old_meta.get(k)), self._history_text(new_meta.get(k)))
+                parts.append(f"<p><b>{html.escape(k)}</b><br><span style='white-space:pre-wrap'>{diff}</span></p>")
+            diff_view.setHtml("".join(parts))
+
+        picker.currentIndexChanged.connect(lambda _: show_pair(picker.currentData()))
+        show_pair(0)
+
+
+class FacetPanel(QWidget):
+    """
+    Tag and creator facets with live counts for the current result.
+    Clicking a facet cycles it: include -> exclude -> off. Included tags must all
+    be present, included creators are alternatives, excluded facets are removed.
+    """
+    selectionChanged = Signal()
+
+    _MARKS = {"include": "\u2713 ", "exclude": "\u2717 "}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Filter tags / creators...")
+        self.filter_edit.textChanged.connect(self._repopulate)
+        layout.addWidget(self.filter_edit)
+
+        self.tabs = QTabWidget()
+        self.lists = {"tag": QListWidget(), "creator": QListWidget()}
+        self.tabs.addTab(self.lists["tag"], "Tags")
+        self.tabs.addTab(self.lists["creator"], "Creators")
+        for kind, lw in self.lists.items():
+            lw.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+            lw.itemClicked.connect(lambda item, kind=kind: self._cycle(kind, item))
+        layout.addWidget(self.tabs)
+
+        self.clear_btn = QPushButton("Clear Filters")
+        self.clear_btn.clicked.connect(self.clear_selection)
+        layout.addWidget(self.clear_btn)
+
+        self.state = {"tag": {}, "creator": {}}    # id -> "include" | "exclude"
+        self._names = {"tag": [], "creator": []}   # id -> display name
+        self._counts = {"tag": {}, "creator": {}}  # id -> count in current result
+
+    def set_counts(self, kind, names, counts):
+        self._names[kind] = names
+        self._counts[kind] = counts
+        self._repopulate()
+
+    def selection(self, kind):
+        """(included ids, excluded ids) for 'tag' or 'creator'."""
+        st = self.state[kind]
+        return ({i for i, s in st.items() if s == "include"},
+                {i for i, s in st.items() if s == "exclude"})
+
+    def has_selection(self):
+        return bool(self.state["tag"] or self.state["creator"])
+
+    def clear_selection(self, notify=True):
+        if not self.has_selection():
+            return
+        self.state = {"tag": {}, "creator": {}}
+        self._repopulate()
+        if notify:
+            self.selectionChanged.emit()
+
+    def _cycle(self, kind, item):
+        fid = item.data(Qt.UserRole)
+        st = self.state[kind]
+        nxt = {None: "include", "include": "exclude", "exclude": None}[st.get(fid)]
+        if nxt is None:
+            st.pop(fid, None)
+        else:
+            st[fid] = nxt
+        self.selectionChanged.emit()
+
+    def _repopulate(self, *_):
+        needle = self.filter_edit.text().strip().lower()
+        for kind, lw in self.lists.items():
+            names = self._names[kind]
+            counts = self._counts[kind]
+            st = self.state[kind]
+            ids = [i for i, c in counts.items() if c] + [i for i in st if not counts.get(i)]
+            if needle:
+                ids = [i for i in ids if needle in names[i].lower() or i in st]
+            # selected facets first, then by count
+            ids.sort(key=lambda i: (i not in st, -counts.get(i, 0), names[i].lower()))
+            scroll = lw.verticalScrollBar().value()
+            lw.setUpdatesEnabled(False)
+            lw.clear()
+            for i in ids:
+                item = QListWidgetItem(f"{self._MARKS.get(st.get(i), '')}{names[i]} ({counts.get(i, 0)})")
+                item.setData(Qt.UserRole, i)
+                if st.get(i) == "exclude":
+                    font = item.font()
+                    font.setStrikeOut(True)
+                    item.setFont(font)
+                lw.addItem(item)
+            lw.verticalScrollBar().setValue(scroll)
+            lw.setUpdatesEnabled(True)
+
+
+# Events that count as user interaction for idle-time throttling
+_USER_INPUT_EVENTS = frozenset((
+    QEvent.KeyPress, QEvent.MouseButtonPress, QEvent.MouseMove, QEvent.Wheel,
+))
+
+
+class ValidationReportDialog(QDialog):
+    """Sortable list of the problems a library validation found."""
+    cardActivated = Signal(str)  # filename double-clicked in the report
+
+    COLUMNS = ("File", "Severity", "Problem", "Details")
+
+    def __init__(self, results, rechecked, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Library Validation")
+        self.resize(820, 440)
+        self.results = results
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(summarize_validation(results, rechecked)))
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Interactive)
+        header.setStretchLastSection(True)
+        rows = [(fname, *issue) for fname in sorted(results) for issue in results[fname]]
+        self.table.setRowCount(len(rows))
+        for r, values in enumerate(rows):
+            for c, value in enumerate(values):
+                self.table.setItem(r, c, QTableWidgetItem(str(value)))
+        self.table.resizeColumnsToContents()
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(1, Qt.SortOrder.AscendingOrder)  # errors first
+        self.table.itemDoubleClicked.connect(
+            lambda item: self.cardActivated.emit(self.table.item(item.row(), 0).text()))
+        layout.addWidget(self.table, 1)
+
+        btn_row = QHBoxLayout()
+        export_btn = QPushButton("Export Report...")
+        export_btn.setEnabled(bool(rows))
+        export_btn.clicked.connect(self.export_report)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.close)
+        btn_row.addWidget(export_btn)
+        btn_row.addStretch(1)
+        btn_row.addWidget(close_btn)
+        layout.addLayout(btn_row)
+
+    def export_report(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Report", "validation_report.csv",
+            "CSV Files (*.csv);;JSON Files (*.json)"
+        )
+        if not path:
+            return
+        try:
+            write_validation_report(path, self.results)
+        except Exception as e:
+            QMessageBox.warning(self, "Export Error", f"Failed to export: {e}")
+
+class SimilarCardsDialog(QDialog):
+    """Cards most like one card, best match first."""
+    cardActivated = Signal(str)  # filename double-clicked in the list
+
+    COLUMNS = ("Card", "Creator", "Similarity")
+
+    def __init__(self, fname, matches, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"More Like {fname}")
+        self.resize(560, 420)
+
+        layout = QVBoxLayout(self)
+        if matches:
+            layout.addWidget(QLabel(f"{len(matches)} card(s) with the most similar description, "
+                                    "personality and scenario:"))
+        else:
+            layout.addWidget(QLabel("No similar cards found; this card has little descriptive text."))
+
+        self.table = QTableWidget(len(matches), len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        for r, (name, creator, score) in enumerate(matches):
+            self.table.setItem(r, 0, QTableWidgetItem(name))
+            self.table.setItem(r, 1, QTableWidgetItem(creator))
+            self.table.setItem(r, 2, QTableWidgetItem(f"{score:.0%}"))
+        self.table.resizeColumnsToContents()
+        self.table.itemDoubleClicked.connect(
+            lambda item: self.cardActivated.emit(self.table.item(item.row(), 0).text()))
+        layout.addWidget(self.table, 1)
+
+        btn_row = QHBoxLayout()
+        btn_row.addStretch(1)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.close)
+        btn_row.addWidget(close_btn)
+        layout.addLayout(btn_row)
 
+class TagAliasDialog(QDialog):
+    """Editable alias -> canonical tag table."""
 
-        # Post-history instructions (simple text field)
-        phi = meta.get("post_history_instructions")
-        if phi:
-            add_field("Post-History Instructions", phi)
+    COLUMNS = ("Tag", "Canonical tag")
 
-        add_field("Example Dialogue", meta.get("mes_example"))
-        add_field("Tags", meta.get("tags", []))
-        add_field("Talkativeness", meta.get("talkativeness"))
-        add_field("Favorite", "Yes" if meta.get("fav") else "")
-        add_field("Creator Comment", meta.get("creatorcomment") or meta.get("creator_notes"))
-        add_field("Chat", meta.get("chat"))
-        add_field("Card Version", meta.get("character_version"))
-        add_field("Spec", meta.get("spec"))
-        add_field("Spec Version", meta.get("spec_version"))
-        add_field("Create Date", meta.get("create_date"))
-        
-        self.delete_btn.setEnabled(True)
+    def __init__(self, aliases, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Tag Aliases")
+        self.resize(480, 420)
+
+        layout = QVBoxLayout(self)
+        hint = QLabel("Tags are already compared ignoring case, spacing, '-', '_' and surrounding "
+                      "punctuation, so 'Sci-Fi' and 'sci_fi' need no alias. Add one for spellings "
+                      "that should count as another tag, e.g. 'not safe for work' -> 'nsfw'.")
+        hint.setWordWrap(True)
+        layout.addWidget(hint)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self._fill(aliases)
+        layout.addWidget(self.table, 1)
+
+        btn_row = QHBoxLayout()
+        add_btn = QPushButton("Add")
+        add_btn.clicked.connect(self.add_row)
+        remove_btn = QPushButton("Remove")
+        remove_btn.clicked.connect(self.remove_rows)
+        defaults_btn = QPushButton("Defaults")
+        defaults_btn.clicked.connect(lambda: self._fill(clean_tag_aliases(DEFAULT_TAG_ALIASES)))
+        ok_btn = QPushButton("OK")
+        ok_btn.setDefault(True)
+        ok_btn.clicked.connect(self.accept)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.reject)
+        for btn in (add_btn, remove_btn, defaults_btn):
+            btn_row.addWidget(btn)
+        btn_row.addStretch(1)
+        btn_row.addWidget(ok_btn)
+        btn_row.addWidget(cancel_btn)
+        layout.addLayout(btn_row)
+
+    def _fill(self, aliases):
+        self.table.setRowCount(0)
+        for alias, target in sorted(aliases.items()):
+            self.add_row(alias, target)
+
+    def add_row(self, alias="", target=""):
+        r = self.table.rowCount()
+        self.table.insertRow(r)
+        self.table.setItem(r, 0, QTableWidgetItem(alias))
+        self.table.setItem(r, 1, QTableWidgetItem(target))
+        if not alias:
+            self.table.editItem(self.table.item(r, 0))
+
+    def remove_rows(self):
+        for r in sorted({i.row() for i in self.table.selectedIndexes()}, reverse=True):
+            self.table.removeRow(r)
+
+    def aliases(self):
+        """The table as a cleaned alias table (see clean_tag_aliases)."""
+        pairs = {}
+        for r in range(self.table.rowCount()):
+            alias, target = self.table.item(r, 0), self.table.item(r, 1)
+            if alias is not None and target is not None:
+                pairs[alias.text()] = target.text()
+        return clean_tag_aliases(pairs)
+
+class OrganizeDialog(QDialog):
+    """Rename template and subfolder option, with a dry-run preview worked out from the index."""
+
+    COLUMNS = ("Current name", "New name")
+    PREVIEW_ROWS = 500  # moves listed; the summary counts all of them
+
+    def __init__(self, index, folder, template, by_creator, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Organize Cards")
+        self.resize(720, 480)
+        self.index = index
+        self.folder = folder
+        self.moves = []
+
+        layout = QVBoxLayout(self)
+        form = QHBoxLayout()
+        form.addWidget(QLabel("Name template:"))
+        self.template_edit = QLineEdit(template)
+        form.addWidget(self.template_edit, 1)
+        layout.addLayout(form)
+        hint = QLabel("Fields: " + " ".join(f"{{{f}}}" for f in ORGANIZE_FIELDS)
+                      + " (the card's first tag, its file date). Format specs work, e.g. {name:.40}. "
+                        ".png is added; names already taken get a (2), (3), ... suffix.")
+        hint.setWordWrap(True)
+        hint.setStyleSheet("color: gray;")
+        layout.addWidget(hint)
+        self.by_creator_box = QCheckBox("Move into per-creator subfolders")
+        self.by_creator_box.setChecked(by_creator)
+        layout.addWidget(self.by_creator_box)
+
+        self.summary = QLabel()
+        layout.addWidget(self.summary)
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table, 1)
+
+        btn_row = QHBoxLayout()
+        btn_row.addStretch(1)
+        self.ok_btn = QPushButton("Organize")
+        self.ok_btn.setDefault(True)
+        self.ok_btn.clicked.connect(self.accept)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.reject)
+        btn_row.addWidget(self.ok_btn)
+        btn_row.addWidget(cancel_btn)
+        layout.addLayout(btn_row)
+
+        # Re-planned once typing pauses: about a second per 100k cards
+        self._preview_timer = QTimer(self)
+        self._preview_timer.setSingleShot(True)
+        self._preview_timer.setInterval(150)
+        self._preview_timer.timeout.connect(self._update_preview)
+        self.template_edit.textChanged.connect(self._preview_timer.start)
+        self.by_creator_box.toggled.connect(self._preview_timer.start)
+        self._update_preview()
+
+    def accept(self):
+        if self._preview_timer.isActive():
+            self._preview_timer.stop()
+            self._update_preview()  # the moves must match what is in the box
+        if self.moves:
+            super().accept()
+
+    def template(self):
+        return self.template_edit.text()
+
+    def by_creator(self):
+        return self.by_creator_box.isChecked()
+
+    def _update_preview(self):
+        t0 = time.perf_counter()
+        try:
+            self.moves = plan_organize(self.index, self.folder, self.template(), self.by_creator())
+        except ValueError as e:
+            self.moves = []
+            self.table.setRowCount(0)
+            self.summary.setText(f"Can't use this template: {e}")
+            self.ok_btn.setEnabled(False)
+            return
+        elapsed = time.perf_counter() - t0
+        clashes = sum(1 for m in self.moves if m.collided)
+        self.summary.setText(f"{len(self.moves)} of {len(self.index)} card(s) get a new name or place, "
+                             f"{clashes} with a suffix for a name clash (planned in {elapsed * 1000:.1f} ms)")
+        shown = self.moves[:self.PREVIEW_ROWS]
+        self.table.setUpdatesEnabled(False)
+        self.table.setRowCount(len(shown) + (len(self.moves) > len(shown)))
+        for r, move in enumerate(shown):
+            self.table.setItem(r, 0, QTableWidgetItem(move.old))
+            self.table.setItem(r, 1, QTableWidgetItem(move.new))
+        if len(self.moves) > len(shown):
+            self.table.setItem(len(shown), 0, QTableWidgetItem(f"... and {len(self.moves) - len(shown)} more"))
+            self.table.setItem(len(shown), 1, QTableWidgetItem(""))
+        self.table.setUpdatesEnabled(True)
+        self.ok_btn.setEnabled(bool(self.moves))
+
+class SyncDialog(QDialog):
+    """Destination folder and options for Sync to Folder."""
+
+    def __init__(self, dest, compare_contents, mirror, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Sync to Folder")
+        self.resize(560, 200)
+
+        layout = QVBoxLayout(self)
+        row = QHBoxLayout()
+        row.addWidget(QLabel("Destination:"))
+        self.dest_edit = QLineEdit(dest)
+        row.addWidget(self.dest_edit, 1)
+        browse_btn = QPushButton("Browse...")
+        browse_btn.clicked.connect(self._browse)
+        row.addWidget(browse_btn)
+        layout.addLayout(row)
+        hint = QLabel("Only cards missing from the destination or different there are copied; "
+                      "cards renamed since the last sync are renamed there too. The destination's "
+                      "index is written at the end, so it opens without a rescan.")
+        hint.setWordWrap(True)
+        hint.setStyleSheet("color: gray;")
+        layout.addWidget(hint)
+        self.compare_box = QCheckBox("Compare contents (slower; reads same-sized files on both sides)")
+        self.compare_box.setChecked(compare_contents)
+        layout.addWidget(self.compare_box)
+        self.mirror_box = QCheckBox("Mirror: delete cards in the destination that this folder doesn't have")
+        self.mirror_box.setChecked(mirror)
+        layout.addWidget(self.mirror_box)
 
+        btn_row = QHBoxLayout()
+        btn_row.addStretch(1)
+        ok_btn = QPushButton("Sync")
+        ok_btn.setDefault(True)
+        ok_btn.clicked.connect(self.accept)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.reject)
+        btn_row.addWidget(ok_btn)
+        btn_row.addWidget(cancel_btn)
+        layout.addLayout(btn_row)
+
+    def _browse(self):
+        folder = QFileDialog.getExistingDirectory(self, "Sync to Folder", self.dest_edit.text())
+        if folder:
+            self.dest_edit.setText(folder)
+
+    def dest(self):
+        return self.dest_edit.text().strip()
+
+    def compare_contents(self):
+        return self.compare_box.isChecked()
+
+    def mirror(self):
+        return self.mirror_box.isChecked()
 
 class CardViewer(QMainWindow):
+    journalGrown = Signal()  # from the cache writer thread, after an append
+    sharedCacheCleaned = Signal(object)  # from the cache writer thread: (refs, cards, cards left, bytes) or error
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle(f"Character Card Viewer v{__version__}")
@@ -551,18 +5404,105 @@ class CardViewer(QMainWindow):
 
         # State
         self.folder = ""
-        self.cards_index = []  # list of dicts: filename, mtime, creator, tags
+        self._cache_dir = ""  # where this folder's cards.json etc. live; see resolve_cache_dir
+        self._journal: IndexJournal | None = None
+        self._history: HistoryStore | None = None  # open while card history is kept
+        self._shared: SharedCardCache | None = None  # open while the cache is shared across folders
+        self.cards_index = CardIndex()
         self.file_index_map = {}
         self.thumb_cache: dict[str, QPixmap] = {}  # in-memory thumbnail cache
+        self.meta_cache = {}  # fpath -> (mtime, size, card, error), filled by the idle warmer
+        self._warm_bytes = 0  # memory held by what the warmer has handed over
+        self._activity = InputActivity()
+        self._warm_thread: QThread | None = None
+        self._warm_worker: WarmWorker | None = None
+        self._chat_index: ChatUsageIndex | None = None  # while a SillyTavern directory is linked
+        self.chat_usage = {}  # chat_usage_key -> ChatUsage, applied to every index loaded
+        self._chat_thread: QThread | None = None
+        self._chat_worker: ChatUsageWorker | None = None
+        self._organize_thread: QThread | None = None
+        self._organize_worker: OrganizeWorker | None = None
+        self._sync_to_thread: QThread | None = None
+        self._sync_to_worker: SyncWorker | None = None
         self._scan_thread: QThread | None = None
+        self._scan_worker: ScanWorker | None = None
+        self._scan_scheduler: ScanScheduler | None = None
+        self._sync_thread: QThread | None = None
+        self._sync_worker: IndexSyncWorker | None = None
+        self._sync_dirty = False
+        self._restore_position = None  # (filename, scroll) to restore on the next list rebuild
+        self._plan_cache = {}  # parsed query terms -> QueryPlan
+        self._cache_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cards-cache")
+        self._validation_thread: QThread | None = None
+        self._validation_worker: ValidationWorker | None = None
+        self._optimize_thread: QThread | None = None
+        self._optimize_worker: OptimizeWorker | None = None
+        self._validation_dialog: ValidationReportDialog | None = None
+        self._ingest_thread: QThread | None = None
+        self._ingest_worker: IngestWorker | None = None
+        self._pending_drops = []  # files dropped while an ingest was running
+        self._similarity: SimilarityMatrix | None = None
+        self._similarity_docs = None  # {filename: terms} the matrix was built from
+        self._similarity_key = None   # (index, generation) the matrix reflects
+        self._similarity_thread: QThread | None = None
+        self._similarity_worker: SimilarityWorker | None = None
+        self._similarity_query = None  # card waiting for "More Like This" results
+        self._similar_dialog: SimilarCardsDialog | None = None
+        self._pack: LibraryPack | None = None  # open library pack; the viewer is read-only while set
+        self._pack_thread: QThread | None = None
+        self._pack_worker: PackWorker | None = None
+        self._api_server: CardApiServer | None = None
+        self._api_published = None  # (index, generation) last handed to the API server
+        self._api_publish_timer = QTimer(self)
+        self._api_publish_timer.setInterval(1000)
+        self._api_publish_timer.timeout.connect(self._publish_api_index)
+
+        # Debounce timers: scan re-ranking, list refresh and cache saves after scan batches
+        self._priority_timer = QTimer(self)
+        self._priority_timer.setSingleShot(True)
+        self._priority_timer.setInterval(100)
+        self._priority_timer.timeout.connect(self._update_scan_priorities)
+        self._list_refresh_timer = QTimer(self)
+        self._list_refresh_timer.setSingleShot(True)
+        self._list_refresh_timer.setInterval(400)
+        self._list_refresh_timer.timeout.connect(self._refresh_listbox_keep_position)
+        self._cache_save_timer = QTimer(self)
+        self._cache_save_timer.setSingleShot(True)
+        self._cache_save_timer.setInterval(3000)
+        self._cache_save_timer.timeout.connect(self._save_index_cache)
+        self.journalGrown.connect(self._on_journal_grown)
+        self.sharedCacheCleaned.connect(self._on_shared_cache_cleaned)
+        self._warm_timer = QTimer(self)
+        self._warm_timer.setSingleShot(True)
+        self._warm_timer.setInterval(int(WARM_IDLE_AFTER * 1000))
+        self._warm_timer.timeout.connect(self._start_warming)
+        self._chat_timer = QTimer(self)
+        self._chat_timer.setInterval(CHAT_USAGE_REFRESH_INTERVAL * 1000)
+        self._chat_timer.timeout.connect(self.refresh_chat_usage)
 
         # Settings
         self.settings = QSettings("CardViewer", "Deluxe")
         self.last_folder = self.settings.value("last_folder", "")
-        self.sort_mode = self.settings.value("sort_mode", "name")  # name | creator
-        if self.sort_mode not in ("name", "creator"):
+        self.sort_mode = self.settings.value("sort_mode", "name")  # one of SORT_MODES
+        if self.sort_mode not in SORT_MODES:
             self.sort_mode = "name"
         self.last_search = self.settings.value("last_search", "")
+        self.api_port = int(self.settings.value("api_port", API_DEFAULT_PORT))
+        self.cache_location = self.settings.value("cache_location", "folder")
+        if self.cache_location not in CACHE_LOCATIONS:
+            self.cache_location = "folder"
+        self.history_enabled = self.settings.value("history_enabled", "0") == "1"
+        self.history_budget_mb = int(self.settings.value("history_budget_mb", HISTORY_DEFAULT_BUDGET_MB))
+        self.shared_cache_enabled = self.settings.value("shared_cache", "0") == "1"
+        self.warm_enabled = self.settings.value("warm_idle", "1") == "1"
+        self.chat_root = self.settings.value("sillytavern_dir", "")
+        self.organize_template = self.settings.value("organize_template", ORGANIZE_DEFAULT_TEMPLATE)
+        self.organize_by_creator = self.settings.value("organize_by_creator", "0") == "1"
+        self.sync_destination = self.settings.value("sync_destination", "")
+        self.sync_compare = self.settings.value("sync_compare", "0") == "1"
+        self.sync_mirror = self.settings.value("sync_mirror", "0") == "1"
+        self.tag_aliases = load_tag_aliases(self.settings)
+        self.cards_index.set_tag_aliases(self.tag_aliases)
         self.is_dark_mode = self.settings.value("dark_mode", "1") == "1"
         if self.settings.value("window_geometry"):
             self.restoreGeometry(self.settings.value("window_geometry"))
@@ -581,6 +5521,54 @@ class CardViewer(QMainWindow):
         self.refresh_btn.clicked.connect(self.refresh_folder)
         btn_row.addWidget(self.refresh_btn)
 
+        # Library-wide jobs
+        self.tools_btn = QPushButton("Tools")
+        self.tools_menu = QMenu(self)
+        self.validate_action = self.tools_menu.addAction("Validate Library...")
+        self.validate_action.triggered.connect(self.start_validation)
+        self.optimize_action = self.tools_menu.addAction("Optimize Library...")
+        self.optimize_action.triggered.connect(self.start_optimization)
+        self.export_pack_action = self.tools_menu.addAction("Export Library Pack...")
+        self.export_pack_action.triggered.connect(self.export_pack)
+        self.tools_menu.addAction("Open Library Pack...").triggered.connect(self.select_pack)
+        self.tools_menu.addAction("Organize Cards...").triggered.connect(self.organize_cards)
+        self.sync_to_action = self.tools_menu.addAction("Sync to Folder...")
+        self.sync_to_action.triggered.connect(self.sync_to_folder)
+        cache_menu = self.tools_menu.addMenu("Cache Location")
+        cache_group = QActionGroup(self)
+        for location, label in CACHE_LOCATIONS.items():
+            action = cache_menu.addAction(label)
+            action.setCheckable(True)
+            action.setChecked(location == self.cache_location)
+            action.triggered.connect(lambda _=False, loc=location: self.set_cache_location(loc))
+            cache_group.addAction(action)
+        self.history_action = self.tools_menu.addAction("Keep Card History")
+        self.history_action.setCheckable(True)
+        self.history_action.setChecked(self.history_enabled)
+        self.history_action.toggled.connect(self.set_history_enabled)
+        self.tools_menu.addAction("History Budget...").triggered.connect(self.edit_history_budget)
+        self.shared_cache_action = self.tools_menu.addAction("Share Cache Across Folders")
+        self.shared_cache_action.setCheckable(True)
+        self.shared_cache_action.setChecked(self.shared_cache_enabled)
+        self.shared_cache_action.toggled.connect(self.set_shared_cache_enabled)
+        self.clean_shared_action = self.tools_menu.addAction("Clean Shared Cache")
+        self.clean_shared_action.triggered.connect(self.clean_shared_cache)
+        self.warm_action = self.tools_menu.addAction("Warm Caches When Idle")
+        self.warm_action.setCheckable(True)
+        self.warm_action.setChecked(self.warm_enabled)
+        self.warm_action.toggled.connect(self.set_warm_enabled)
+        self.tools_menu.addAction("Tag Aliases...").triggered.connect(self.edit_tag_aliases)
+        self.tools_menu.addAction("Link SillyTavern Data...").triggered.connect(self.link_chat_data)
+        self.unlink_chat_action = self.tools_menu.addAction("Unlink SillyTavern Data")
+        self.unlink_chat_action.setEnabled(bool(self.chat_root))
+        self.unlink_chat_action.triggered.connect(lambda: self.set_chat_root(""))
+        self.tools_menu.addSeparator()
+        self.api_action = self.tools_menu.addAction(f"Local API Server (port {self.api_port})")
+        self.api_action.setCheckable(True)
+        self.api_action.toggled.connect(self.set_api_server_enabled)
+        self.tools_btn.setMenu(self.tools_menu)
+        btn_row.addWidget(self.tools_btn)
+
         self.toggle_mode_button = QPushButton("Light Mode" if self.is_dark_mode else "Dark Mode")
         self.toggle_mode_button.clicked.connect(self.toggle_dark_mode)
         btn_row.addWidget(self.toggle_mode_button)
@@ -593,18 +5581,49 @@ class CardViewer(QMainWindow):
         self.sort_by_name_btn.clicked.connect(lambda: self.set_sort_mode('name'))
         self.sort_by_creator_btn.clicked.connect(lambda: self.set_sort_mode('creator'))
 
+        self.facets_btn = QPushButton("Filters")
+        self.facets_btn.setCheckable(True)
+        self.facets_btn.toggled.connect(self.toggle_facets)
+
         sort_row = QHBoxLayout()
         sort_row.addWidget(self.sort_by_name_btn)
         sort_row.addWidget(self.sort_by_creator_btn)
+        sort_row.addWidget(self.facets_btn)
         self.left_panel.addLayout(sort_row)
 
+        # Every sort mode, including the metric ones that have no button
+        self.sort_combo = QComboBox()
+        for mode, label in SORT_MODES.items():
+            self.sort_combo.addItem(label, mode)
+        self.sort_combo.setCurrentIndex(self.sort_combo.findData(self.sort_mode))
+        self.sort_combo.activated.connect(lambda i: self.set_sort_mode(self.sort_combo.itemData(i)))
+        sort_combo_row = QHBoxLayout()
+        sort_combo_row.addWidget(QLabel("Sort:"))
+        sort_combo_row.addWidget(self.sort_combo, 1)
+        self.left_panel.addLayout(sort_combo_row)
+
 
         self.search_bar = QLineEdit()
-        self.search_bar.setPlaceholderText("Search by name, creator, tag...")
+        self.search_bar.setPlaceholderText("Search... e.g. elf creator:foo tag:fantasy -tag:nsfw size:>2MB")
+        self.search_bar.setToolTip(
+            "Plain words match filename, creator, tags or lorebook keys.\n"
+            "creator:, tag:, lore:, name: and size: narrow to one field; * and ? are wildcards,\n"
+            "\"quotes\" keep spaces, and a leading - excludes (e.g. -tag:nsfw).\n"
+            "size: takes >, <, >=, <= or = with B/KB/MB/GB, e.g. size:>2MB.\n"
+            "With SillyTavern data linked: messages:>100, chatsize:>1MB,\n"
+            "chatted:<30d (h, d, w, mo, y) and chatted:never.")
         self.search_bar.setText(self.last_search)
         self.search_bar.textChanged.connect(self.update_listbox)
+        self.search_bar.textChanged.connect(self._schedule_scan_priorities)
         self.left_panel.addWidget(self.search_bar)
 
+        # Query plan / timing readout (details in the tooltip)
+        self.query_info = QLabel()
+        self.query_info.setStyleSheet("color: gray; font-size: 8.5pt;")
+        self.query_info.setWordWrap(True)
+        self.query_info.setVisible(False)
+        self.left_panel.addWidget(self.query_info)
+
         self.folder_label = QLabel("No folder selected")
         self.folder_label.setStyleSheet("color: gray;")
         self.left_panel.addWidget(self.folder_label)
@@ -613,6 +5632,8 @@ class CardViewer(QMainWindow):
         self.listbox.setMinimumWidth(180)
         self.listbox.setMaximumWidth(400)
         self.listbox.itemSelectionChanged.connect(self._fix_selection)
+        self.listbox.currentRowChanged.connect(self._schedule_scan_priorities)
+        self.listbox.verticalScrollBar().valueChanged.connect(self._schedule_scan_priorities)
         self.left_panel.addWidget(self.listbox)
         self.listbox.installEventFilter(self)
         self.listbox.setContextMenuPolicy(Qt.CustomContextMenu)
@@ -620,11 +5641,15 @@ class CardViewer(QMainWindow):
         self.listbox.setAcceptDrops(True)
         left_widget.setAcceptDrops(True)
 
+        self.facet_panel = FacetPanel()
+        self.facet_panel.selectionChanged.connect(self.update_listbox)
+        self.facet_panel.setVisible(False)
+        main_splitter.addWidget(self.facet_panel)
         main_splitter.addWidget(left_widget)
 
         self.details = CardDetails()
         main_splitter.addWidget(self.details)
-        main_splitter.setStretchFactor(1, 1)
+        main_splitter.setStretchFactor(2, 1)
         self.setCentralWidget(main_splitter)
 
         # Restore splitter sizes if any
@@ -632,7 +5657,8 @@ class CardViewer(QMainWindow):
         if sizes_json:
             try:
                 sizes = json.loads(sizes_json)
-                main_splitter.setSizes(sizes)
+                if len(sizes) == main_splitter.count():  # layouts saved before the facet pane had 2
+                    main_splitter.setSizes(sizes)
             except Exception:
                 pass
 
@@ -642,6 +5668,9 @@ class CardViewer(QMainWindow):
         # Status bar
         self.statusbar = QStatusBar()
         self.setStatusBar(self.statusbar)
+        self.warm_label = QLabel()
+        self.warm_label.hide()
+        self.statusbar.addPermanentWidget(self.warm_label)
 
         # Accept drops
         self.setAcceptDrops(True)
@@ -649,6 +5678,7 @@ class CardViewer(QMainWindow):
 
         # Style (init)
         app = QApplication.instance()
+        app.installEventFilter(self)  # input activity throttles background scanning
         if self.is_dark_mode:
             enable_dark_mode(app)
             app.setStyleSheet(DARK_EXTRA_STYLES)
@@ -656,22 +5686,39 @@ class CardViewer(QMainWindow):
             enable_light_mode(app)
             app.setStyleSheet(LIGHT_EXTRA_STYLES)
 
-        # Load last folder quickly using cache
-        if self.last_folder and os.path.isdir(self.last_folder):
-            self.folder = self.last_folder
-            self.folder_label.setText(self.folder)
-            self.load_or_update_index_cache(force_refresh=False)
-            self.update_listbox()
-
         # Keep ref to splitter for saving sizes on close
         self._splitter = main_splitter
+        if self.settings.value("show_facets", "0") == "1":
+            self.facets_btn.setChecked(True)
+
+        self._open_shared_cache()
+        self._open_chat_usage()
+        # Load last folder from cache once the event loop runs, so the window paints first
+        if self.last_folder:
+            QTimer.singleShot(0, self._open_last_folder)
+        if self.settings.value("api_enabled", "0") == "1":
+            self.api_action.setChecked(True)
+
+    def _open_last_folder(self):
+        if self.last_folder.endswith(PACK_EXTENSION) and os.path.isfile(self.last_folder):
+            self.open_pack(self.last_folder)
+            return
+        if not os.path.isdir(self.last_folder):
+            return
+        self.folder = self.last_folder
+        self.folder_label.setText(self.folder)
+        self.load_or_update_index_cache(force_refresh=False)
+        self.update_listbox()
 
     def closeEvent(self, event):
         self.settings.setValue("last_folder", self.folder)
         self.settings.setValue("sort_mode", self.sort_mode)
         self.settings.setValue("last_search", self.search_bar.text())
+        self.settings.setValue("cache_location", self.cache_location)
+        self.settings.setValue("api_enabled", "1" if self._api_server is not None else "0")
         self.settings.setValue("window_geometry", self.saveGeometry())
         self.settings.setValue("dark_mode", "1" if self.is_dark_mode else "0")
+        self.settings.setValue("show_facets", "1" if self.facets_btn.isChecked() else "0")
         # Save splitter sizes
         if self._splitter:
             try:
@@ -682,97 +5729,261 @@ class CardViewer(QMainWindow):
                 
         # Ensure background scan thread exits cleanly
         try:
+            self._stop_scan()
             if self._scan_thread and self._scan_thread.isRunning():
                 self._scan_thread.quit()
                 self._scan_thread.wait(2000)  # up to 2s for a clean stop
         except Exception:
             pass
-            
+        if self._api_server is not None:
+            self._api_server.stop()
+            self._api_server = None
+        if self._ingest_worker is not None:
+            self._ingest_worker.cancel()
+            self._ingest_thread.quit()
+            self._ingest_thread.wait()  # copies in flight finish rather than leave .part files
+        if self._validation_worker is not None:
+            self._validation_worker.cancel()
+            self._validation_thread.quit()
+            self._validation_thread.wait(5000)
+        if self._similarity_worker is not None:
+            self._similarity_worker.cancel()
+            self._similarity_thread.quit()
+            self._similarity_thread.wait(5000)
+        if self._pack_worker is not None:
+            self._pack_worker.cancel()  # the half-written pack is removed
+            self._pack_thread.quit()
+            self._pack_thread.wait(5000)
+        self._warm_timer.stop()
+        if self._warm_worker is not None:
+            self._warm_worker.cancel()
+            self._warm_thread.quit()
+            self._warm_thread.wait(5000)
+        if self._optimize_worker is not None:
+            self._optimize_worker.cancel()  # files already replaced stay replaced; they are rescanned
+            self._optimize_thread.quit()
+            self._optimize_thread.wait()
+        if self._sync_to_worker is not None:
+            self._sync_to_worker.cancel()  # copies in flight finish rather than leave .part files
+            self._sync_to_thread.quit()
+            self._sync_to_thread.wait()
+        if self._organize_worker is not None:
+            self._organize_worker.cancel()  # the next open's stat sweep picks up what was renamed
+            self._organize_thread.quit()
+            self._organize_thread.wait()
+        self._chat_timer.stop()
+        if self._chat_worker is not None:
+            self._chat_worker.cancel()
+            self._chat_thread.quit()
+            self._chat_thread.wait(5000)
+        if self._cache_save_timer.isActive():
+            self._cache_save_timer.stop()
+            self._save_index_cache()
+        self._cache_writer.shutdown(wait=True)  # flush pending cards.json writes
+        if self._history is not None:
+            self._history.close()
+            self._history = None
+        if self._shared is not None:
+            self._shared.close()
+            self._shared = None
+        self._close_pack()
+
         super().closeEvent(event)
 
     # -------------------------
     # Sorting & filtering
     # -------------------------
     def set_sort_mode(self, mode):
-        if mode not in ("name", "creator"):
+        if mode not in SORT_MODES:
             mode = "name"
         self.sort_mode = mode
         # Visual feedback: disable the active one
         self.sort_by_name_btn.setEnabled(mode != "name")
         self.sort_by_creator_btn.setEnabled(mode != "creator")
+        self.sort_combo.blockSignals(True)
+        self.sort_combo.setCurrentIndex(self.sort_combo.findData(mode))
+        self.sort_combo.blockSignals(False)
         self.update_listbox()
 
 
     def update_listbox(self):
-        filter_text = self.search_bar.text().strip().lower()
+        # Background refresh: keep selection and scroll, don't re-render the details pane
+        restore = self._restore_position
+        self._restore_position = None
+        # No selection callbacks while rows are torn down and rebuilt; selection is fixed up below
+        self.listbox.blockSignals(True)
         self.file_index_map = {}
         self.listbox.clear()
         items_added = 0
 
-        entries = list(self.cards_index)
-
-        if self.sort_mode == 'name':
-            entries.sort(key=lambda e: e['filename'].lower())
-            for i, entry in enumerate(entries):
-                fname = entry['filename']
-                creator = entry.get('creator', 'Unknown') or "Unknown"
-                tags = entry.get('tags', [])
-                meta_match = (
-                    (filter_text in fname.lower())
-                    or (filter_text in creator.lower())
-                    or any(filter_text in (t or "").lower() for t in tags)
-                ) if filter_text else True
-                if not meta_match:
-                    continue
-                item = QListWidgetItem(fname)
+        index = self.cards_index
+        facet_bits = self._facet_bitmap()
+        plan = self._query_plan(self.search_bar.text())
+        if plan is not None:
+            rows = plan.execute(facet_bits)
+        elif facet_bits is not None:
+            rows = bitmap_to_rows(facet_bits)
+        else:
+            rows = None  # everything: use the cached full ordering as is
+        self._update_facet_counts(rows if rows is not None else index.rows())
+        self._show_query_readout(plan)
+
+        # Sort keys are precomputed in the index; this only orders row IDs
+        ordered = index.sorted_rows(self.sort_mode, rows)
+
+        if self.sort_mode == 'creator':
+            # Group by creator
+            current_creator = None
+            for row in ordered:
+                creator_id = index.creator_id(row)
+                if creator_id != current_creator:
+                    current_creator = creator_id
+                    header = QListWidgetItem(index.creators[creator_id])
+                    header.setFlags(header.flags() & ~Qt.ItemFlag.ItemIsSelectable & ~Qt.ItemFlag.ItemIsEnabled)
+                    font = header.font()
+                    font.setBold(True)
+                    header.setFont(font)
+                    header.setData(Qt.UserRole, "header")
+                    self.listbox.addItem(header)
+                item = QListWidgetItem("    " + index.filename(row))
                 item.setFlags(item.flags() | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled)
                 self.listbox.addItem(item)
-                self.file_index_map[self.listbox.count() - 1] = self.cards_index.index(entry)
+                self.file_index_map[self.listbox.count() - 1] = row
+                items_added += 1
+        else:
+            # Metric sorts show the value they sort by next to the filename
+            value_label = self._sort_value_label(self.sort_mode)
+            for row in ordered:
+                text = index.filename(row)
+                if value_label is not None:
+                    text = f"{text}  \u00b7  {value_label(row)}"
+                item = QListWidgetItem(text)
+                item.setFlags(item.flags() | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled)
+                self.listbox.addItem(item)
+                self.file_index_map[self.listbox.count() - 1] = row
                 items_added += 1
 
-        elif self.sort_mode == 'creator':
-            # Group by creator
-            creator_map = {}
-            for entry in entries:
-                creator = entry.get("creator", "Unknown") or "Unknown"
-                creator_map.setdefault(creator, []).append(entry)
-
-            for creator in sorted(creator_map, key=lambda s: s.lower()):
-                group = creator_map[creator]
-                # filter group
-                filtered = []
-                for entry in group:
-                    fname = entry['filename']
-                    tags = entry.get('tags', [])
-                    meta_match = (
-                        (filter_text in fname.lower())
-                        or (filter_text in creator.lower())
-                        or any(filter_text in (t or "").lower() for t in tags)
-                    ) if filter_text else True
-                    if meta_match:
-                        filtered.append(entry)
-                if not filtered:
-                    continue
-                header = QListWidgetItem(creator)
-                header.setFlags(header.flags() & ~Qt.ItemFlag.ItemIsSelectable & ~Qt.ItemFlag.ItemIsEnabled)
-                font = header.font()
-                font.setBold(True)
-                header.setFont(font)
-                header.setData(Qt.UserRole, "header")
-                self.listbox.addItem(header)
-                for entry in sorted(filtered, key=lambda e: e['filename'].lower()):
-                    item = QListWidgetItem("    " + entry['filename'])
-                    item.setFlags(item.flags() | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled)
-                    self.listbox.addItem(item)
-                    self.file_index_map[self.listbox.count() - 1] = self.cards_index.index(entry)
-                    items_added += 1
-
+        self.listbox.blockSignals(False)
+        restored = False
+        if restore is not None:
+            prev_fname, prev_scroll = restore
+            target = index.row_of(prev_fname) if prev_fname is not None else None
+            if target is not None:
+                for list_row, row in self.file_index_map.items():
+                    if row == target:
+                        self.listbox.blockSignals(True)
+                        self.listbox.setCurrentRow(list_row)
+                        self.listbox.blockSignals(False)
+                        restored = True
+                        break
+            self.listbox.verticalScrollBar().setValue(prev_scroll)
 
         # Auto-select first selectable item (skip headers)
-        self._fix_selection()
-        mode_label = "Sort by Name" if self.sort_mode == "name" else "Group by Creator"
+        if not restored:
+            self._fix_selection()
+        mode_label = SORT_MODES[self.sort_mode]
         self.statusbar.showMessage(f"{items_added} card(s) | Mode: {mode_label}")
+        self._schedule_warming()
+
+    def _sort_value_label(self, mode):
+        """Formatter for the value a metric sort orders by, or None for name/creator."""
+        index = self.cards_index
+        if mode == "modified":
+            return lambda r: time.strftime("%Y-%m-%d %H:%M", time.localtime(index.mtime(r)))
+        if mode == "size":
+            return lambda r: format_filesize(index.size(r))
+        if mode == "tag_count":
+            return lambda r: f"{len(index.tag_ids(r))} tag(s)"
+        if mode == "tokens_total":
+            return lambda r: f"{index.total_tokens(r):,} tok"
+        if mode.startswith("tokens_"):
+            field = mode[7:]
+            return lambda r: f"{index.tokens(r, field):,} tok"
+        if mode == "chat_messages":
+            return lambda r: f"{index.chat_usage(r).messages:,} msg"
+        if mode == "chat_recent":
+            return lambda r: format_chat_time(index.chat_usage(r))
+        if mode == "chat_bytes":
+            return lambda r: format_filesize(index.chat_usage(r).chat_bytes)
+        return None
+
+    def _facet_bitmap(self):
+        """Rows allowed by the facet panel as a bitmap, or None when no facet is selected."""
+        if not self.facet_panel.has_selection():
+            return None
+        index = self.cards_index
+        creator_bits = index.creator_bitmaps()
+        tag_bits = index.tag_bitmaps()
+        bits = index.alive_bitmap()
+        inc, exc = self.facet_panel.selection("creator")
+        if inc:
+            any_creator = 0
+            for cid in inc:
+                any_creator |= creator_bits.get(cid, 0)
+            bits &= any_creator
+        for cid in exc:
+            bits &= ~creator_bits.get(cid, 0)
+        inc, exc = self.facet_panel.selection("tag")
+        for tid in inc:
+            bits &= tag_bits.get(tid, 0)
+        for tid in exc:
+            bits &= ~tag_bits.get(tid, 0)
+        return bits
+
+    def _update_facet_counts(self, rows):
+        if not self.facet_panel.isVisible():
+            return
+        index = self.cards_index
+        result = rows_to_bitmap(rows)
+        self.facet_panel.set_counts("creator", index.creators.strings,
+                                    {cid: popcount(b & result) for cid, b in index.creator_bitmaps().items()})
+        self.facet_panel.set_counts("tag", index.canonical_tags.strings,
+                                    {tid: popcount(b & result) for tid, b in index.tag_bitmaps().items()})
+
+    def toggle_facets(self, checked):
+        self.facet_panel.setVisible(checked)
+        if checked:
+            self._refresh_listbox_keep_position()  # fills in the counts
+
+    def _query_plan(self, text):
+        """QueryPlan for the search text (reused while the index is unchanged), or None."""
+        terms = parse_query(text.strip())
+        if not terms:
+            return None
+        index = self.cards_index
+        plan = self._plan_cache.get(terms)
+        if plan is None or plan.index is not index or plan.generation != index.generation:
+            plan = QueryPlan(index, terms)
+            self._plan_cache[terms] = plan
+            if len(self._plan_cache) > 64:
+                self._plan_cache.pop(next(iter(self._plan_cache)))
+        return plan
+
+    def _show_query_readout(self, plan):
+        if plan is None:
+            self.query_info.setVisible(False)
+            return
+        self.query_info.setText(plan.describe())
+        self.query_info.setToolTip(plan.describe_detail())
+        self.query_info.setVisible(True)
+
+    def _capture_list_position(self):
+        # Call before rows are removed from cards_index; list rows map to index rows
+        row = self._index_row(self.listbox.currentRow())
+        self._restore_position = (self.cards_index.filename(row) if row is not None else None,
+                                  self.listbox.verticalScrollBar().value())
+
+    def _refresh_listbox_keep_position(self):
+        if self._restore_position is None:
+            self._capture_list_position()
+        self.update_listbox()
 
+    def _index_row(self, list_row):
+        """cards_index row shown at a list row, or None for headers and empty space."""
+        row = self.file_index_map.get(list_row)
+        if row is None or self.cards_index.filename(row) is None:
+            return None
+        return row
 
     def _fix_selection(self, force=False):
         row = self.listbox.currentRow()
@@ -824,6 +6035,10 @@ class CardViewer(QMainWindow):
     # Keyboard & Events
     # -------------------------
     def eventFilter(self, obj, event):
+        if event.type() in _USER_INPUT_EVENTS:
+            self._activity.note()
+            if self._scan_scheduler is not None:
+                self._scan_scheduler.note_activity()
         if obj is self.listbox:
             if event.type() == QEvent.KeyPress:
                 if event.key() == Qt.Key_Delete:
@@ -844,112 +6059,685 @@ class CardViewer(QMainWindow):
         self.open_folder(folder)
 
     def open_folder(self, folder):
+        self._close_pack()
         self.folder = folder
         self.folder_label.setText(folder)
         self.settings.setValue("last_folder", folder)
-        self.thumb_cache.clear()  # thumbnails are per-session
+        self._reset_warm_caches()  # thumbnails are per-session
+        self._stop_scan()
+        self.facet_panel.clear_selection(notify=False)  # facet IDs are per folder
         self.load_or_update_index_cache(force_refresh=False)
         self.update_listbox()
 
     def refresh_folder(self):
         if not self.folder:
             return
+        if self._pack is not None:
+            self.statusbar.showMessage("Library packs are read-only; open the card folder to rescan it.")
+            return
         self.statusbar.showMessage("Scanning changed cards in background...")
-        self.details.show_info_message("Scanning cards and updating cache...")
-        QApplication.processEvents()
         self.load_or_update_index_cache(force_refresh=True)  # force check for changes
+        self.refresh_chat_usage()
+
+    def load_or_update_index_cache(self, force_refresh=False):
+        """
+        Stale-while-revalidate: unless force_refresh, cards_index is replaced with the
+        last cards.json right away; the folder is then stat-swept in the background and
+        new, changed and removed files are applied as the differences come in.
+        force_refresh keeps the current index and rescans every file.
+        """
+        if not self.folder or self._pack is not None:
+            return
+        if not force_refresh:
+            self._cache_dir = resolve_cache_dir(self.folder, self.cache_location)
+            self._journal = IndexJournal(self._cache_dir)
+            records = replay_index_journal(load_index_cache(self._journal.snapshot_path), self._journal.path)
+            seeded = False
+            if not records and self._cache_dir != self.folder:
+                # First visit with a local cache: start from a cards.json shipped with the folder
+                records = replay_index_journal(load_index_cache(os.path.join(self.folder, "cards.json")),
+                                               os.path.join(self.folder, INDEX_JOURNAL_FILE))
+                seeded = bool(records)
+            self.cards_index = CardIndex.from_records(records, self.tag_aliases)
+            self.cards_index.set_chat_usage(self.chat_usage)
+            if seeded or self._journal.needs_compaction():
+                self._compact_index_cache()
+            self._open_history()
+            self._similarity = self._similarity_docs = self._similarity_key = None
+        known = self.cards_index.known_stats()
+        self._sync_thread = QThread(self)
+        # Caches kept off the folder usually mean a network share, where stat calls are worth overlapping
+        worker = IndexSyncWorker(self.folder, known, force_refresh, parallel_stat=self._cache_dir != self.folder)
+        worker.moveToThread(self._sync_thread)
+        self._sync_thread.started.connect(worker.run)
+        worker.changed.connect(self._on_index_changed)
+        worker.removed.connect(self._on_index_removed)
+        worker.finished.connect(self._on_index_sync_finished)
+        worker.finished.connect(self._sync_thread.quit)
+        # Not on worker.finished: the worker could be gone before the GUI slot reads sender()
+        self._sync_thread.finished.connect(worker.deleteLater)
+        self._sync_thread.finished.connect(self._sync_thread.deleteLater)
+        self._sync_worker = worker
+        self._sync_thread.start()
+
+    def _on_index_changed(self, folder, changed):
+        if folder != self.folder:
+            return
+        force = getattr(self.sender(), "force_refresh", False)
+        index = self.cards_index
+        to_rescan = []
+        for fname, mtime, size in changed:
+            row = index.row_of(fname)
+            if row is None:
+                # Placeholder until the scan fills it in; mtime 0 keeps it stale if the scan is cut short
+                index.upsert({"filename": fname, "mtime": 0, "size": size})
+            elif index.mtime(row) == mtime and not force:
+                if index.size(row) != size:
+                    index.set_size(row, size)  # caches written before sizes were indexed
+                    self._sync_dirty = True
+                continue  # already caught up, e.g. by a scan that finished in the meantime
+            to_rescan.append(fname)
+        if not to_rescan:
+            return
+        self._sync_dirty = True
+        self._start_scan(to_rescan)
+        if not self._list_refresh_timer.isActive():
+            self._list_refresh_timer.start()
+
+    def _on_index_removed(self, folder, removed):
+        if folder != self.folder:
+            return
+        gone = [f for f in removed if f in self.cards_index]
+        if not gone:
+            return
+        LOG.info("Removed %d missing entries from cache", len(gone))
+        self._capture_list_position()
+        for fname in gone:
+            self.cards_index.remove(fname)
+        if self._shared is not None:
+            self._shared.unlink(self.folder, gone)
+        self._sync_dirty = True
+        # Freed rows get reused by later inserts: rebuild now so no list row points at one
         self.update_listbox()
+
+    def _on_index_sync_finished(self):
+        if self.sender() is not self._sync_worker:
+            return
+        self._sync_worker = None
+        if self._sync_dirty:
+            self._sync_dirty = False
+            self._save_index_cache()
+
+    def _start_scan(self, fnames):
+        # Feed a running scan if there is one; its queue is re-ranked as the user moves around
+        if self._scan_scheduler is not None and self._scan_scheduler.add(fnames):
+            self._schedule_scan_priorities()
+            return
+        self._scan_scheduler = ScanScheduler(fnames)
+        self._scan_thread = QThread(self)  # parented: a superseded scan may still be finishing
+        worker = ScanWorker(self.folder, self._scan_scheduler, self._history, self._shared)
+        worker.moveToThread(self._scan_thread)
+        self._scan_thread.started.connect(worker.run)
+        worker.progress.connect(self._on_scan_progress)
+        worker.updated_entries.connect(self._on_scan_updated_entries)
+        worker.finished.connect(self._on_scan_finished)
+        worker.finished.connect(self._scan_thread.quit)
+        self._scan_thread.finished.connect(worker.deleteLater)
+        self._scan_thread.finished.connect(self._scan_thread.deleteLater)
+        self._scan_worker = worker
+        self._update_scan_priorities()
+        self._scan_thread.start()
+
+    def _stop_scan(self):
+        # The worker exits after its current file; late batches for another folder are ignored
+        if self._scan_scheduler is not None:
+            self._scan_scheduler.close()
+            self._scan_scheduler = None
+
+    def _schedule_scan_priorities(self, *_):
+        if self._scan_scheduler is not None:
+            self._priority_timer.start()
+
+    def _update_scan_priorities(self):
+        """Push the selected card, the rows on screen and the search matches to the front of the scan."""
+        sched = self._scan_scheduler
+        if sched is None or not sched.pending():
+            return
+        index = self.cards_index
+        urgent = {}
+        current = self._index_row(self.listbox.currentRow())
+        if current is not None:
+            urgent[index.filename(current)] = SCAN_PRIORITY_SELECTED
+        count = self.listbox.count()
+        if count:
+            viewport = self.listbox.viewport()
+            top = self.listbox.indexAt(QPoint(0, 0)).row()
+            bottom = self.listbox.indexAt(QPoint(0, viewport.height() - 1)).row()
+            top = max(top, 0)
+            if bottom < top:
+                bottom = min(count - 1, top + 50)
+            # one page of look-ahead below the viewport for smooth scrolling
+            bottom = min(count - 1, bottom + (bottom - top + 1))
+            for list_row in range(top, bottom + 1):
+                row = self._index_row(list_row)
+                if row is not None:
+                    urgent.setdefault(index.filename(row), SCAN_PRIORITY_VISIBLE)
+        if self.search_bar.text().strip():
+            for list_row in sorted(self.file_index_map)[:SCAN_MAX_MATCH_BOOST]:
+                row = self._index_row(list_row)
+                if row is not None:
+                    urgent.setdefault(index.filename(row), SCAN_PRIORITY_MATCH)
+        sched.reprioritize(urgent)
+
+    def _on_scan_progress(self, i, total):
+        self.statusbar.showMessage(f"Scanning cards... {i}/{total}")
+
+    def _on_scan_updated_entries(self, folder, entries):
+        if folder != self.folder:
+            return  # batch from a scan of a previously opened folder
+        # Rows keep their IDs on update, so list rows keep pointing at the same cards
+        for e in entries:
+            self.cards_index.upsert(e)
+        # Coalesce cache writes while batches keep arriving
+        self._cache_save_timer.start()
+        # Order only changes for non-name sorts; matches only change while filtering
+        if (self.sort_mode != "name" or self.search_bar.text().strip()
+                or self.facet_panel.isVisible() or self.facet_panel.has_selection()):
+            if not self._list_refresh_timer.isActive():
+                self._list_refresh_timer.start()
+
+    def _on_scan_finished(self):
+        if self.sender() is not self._scan_worker:
+            return  # a superseded scan wound down
+        self._scan_worker = None
+        self._scan_scheduler = None
+        if self._cache_save_timer.isActive():
+            self._cache_save_timer.stop()
+            self._save_index_cache()
         self.statusbar.clearMessage()
+        if self._similarity is not None:
+            self._refresh_similarity()  # in use this session: keep it current in the background
+        self._schedule_warming()
 
-    def load_or_update_index_cache(self, force_refresh=False):
-        if not self.folder:
+    def _cache_path(self, name):
+        """Path of one of the current folder's cache files."""
+        return os.path.join(self._cache_dir or self.folder, name)
+
+    def set_cache_location(self, location):
+        if location not in CACHE_LOCATIONS or location == self.cache_location:
+            return
+        self.cache_location = location
+        self.settings.setValue("cache_location", location)
+        if not self.folder or self._pack is not None:
+            return
+        self._cache_dir = resolve_cache_dir(self.folder, location)
+        self._journal = IndexJournal(self._cache_dir)
+        self._compact_index_cache()
+        self._open_history()  # history starts over in the new location
+        self.statusbar.showMessage(f"Cache location: {self._cache_dir}")
+
+    def _open_history(self):
+        """Open the current folder's history store if card history is kept, closing the previous one."""
+        if self._history is not None:
+            self._history.close()
+            self._history = None
+        if not self.history_enabled or not self._cache_dir:
+            return
+        try:
+            self._history = HistoryStore(self._cache_dir, self.history_budget_mb)
+        except Exception as e:
+            LOG.exception("Failed to open card history in %s", self._cache_dir)
+            self.statusbar.showMessage(f"Could not open card history: {e}")
+
+    def set_history_enabled(self, enabled):
+        self.history_enabled = enabled
+        self.settings.setValue("history_enabled", "1" if enabled else "0")
+        self._open_history()
+        if self._history is None:
+            self.statusbar.showMessage("Card history off.")
+            return
+        if self._history.is_empty():
+            # Cards are only recorded when parsed, so parse them all once for a baseline
+            self._stop_scan()
+            self.statusbar.showMessage("Recording card history baseline...")
+            self.load_or_update_index_cache(force_refresh=True)
+        else:
+            self.statusbar.showMessage("Card history on.")
+
+    def edit_history_budget(self):
+        budget, ok = QInputDialog.getInt(self, "History Budget", "Disk space for card history (MB):",
+                                         self.history_budget_mb, 16, 1_000_000, 16)
+        if not ok:
+            return
+        self.history_budget_mb = budget
+        self.settings.setValue("history_budget_mb", budget)
+        if self._history is not None:
+            self._history.budget = budget * 1024 * 1024
+            self._cache_writer.submit(self._history.flush)  # prunes right away if the budget shrank
+
+    def _open_shared_cache(self):
+        if self._shared is not None:
+            self._shared.close()
+            self._shared = None
+        if not self.shared_cache_enabled:
+            return
+        try:
+            self._shared = SharedCardCache()
+        except Exception as e:
+            LOG.exception("Failed to open the shared card cache")
+            self.statusbar.showMessage(f"Could not open the shared card cache: {e}")
+            return
+        if self._shared.due_for_gc():
+            shared = self._shared
+            self._cache_writer.submit(lambda: LOG.info("Shared cache clean-up: dropped %d ref(s), %d card(s)",
+                                                       *shared.gc()))
+
+    def set_shared_cache_enabled(self, enabled):
+        self.shared_cache_enabled = enabled
+        self.settings.setValue("shared_cache", "1" if enabled else "0")
+        self._open_shared_cache()
+        if self._shared is not None:
+            cards, refs, size = self._shared.stats()
+            self.statusbar.showMessage(f"Shared cache on: {cards} card(s) for {refs} file(s), "
+                                       f"{format_filesize(size)} in {self._shared.path}")
+        else:
+            self.statusbar.showMessage("Shared cache off.")
+
+    def clean_shared_cache(self):
+        if self._shared is None:
+            self.statusbar.showMessage("The shared cache is off (Tools > Share Cache Across Folders).")
             return
-        pngs = get_png_files(self.folder)
-        cache_file = os.path.join(self.folder, "cards.json")
+        shared = self._shared
 
-        # Load cached
-        cached = []
-        if os.path.exists(cache_file):
+        def clean():
+            # Checks every folder the cache has seen, which may be on a slow share
             try:
-                with open(cache_file, "r", encoding="utf-8") as f:
-                    cached = json.load(f)
-            except Exception:
-                LOG.exception("Failed to read cards.json")
+                refs, cards = shared.gc()
+                left, _, size = shared.stats()
+                self.sharedCacheCleaned.emit((refs, cards, left, size))
+            except Exception as e:
+                LOG.exception("Shared cache clean-up failed")
+                self.sharedCacheCleaned.emit(str(e))
 
-        cached_lookup = {entry['filename']: entry for entry in cached if 'filename' in entry and 'mtime' in entry}
+        self.clean_shared_action.setEnabled(False)
+        self.statusbar.showMessage("Cleaning up the shared cache...")
+        self._cache_writer.submit(clean)
 
-        # Build current list using cache where possible
-        new_cards_index = []
-        to_rescan = []
+    def _on_shared_cache_cleaned(self, result):
+        self.clean_shared_action.setEnabled(True)
+        if isinstance(result, str):
+            self.statusbar.showMessage(f"Shared cache clean-up failed: {result}")
+            return
+        refs, cards, left, size = result
+        self.statusbar.showMessage(f"Shared cache: dropped {cards} unused card(s) and {refs} file ref(s) of "
+                                   f"missing folders; {left} card(s), {format_filesize(size)} left")
 
-        for fname in pngs:
+    # -------------------------
+    # Idle-time cache warming
+    # -------------------------
+    def set_warm_enabled(self, enabled):
+        self.warm_enabled = enabled
+        self.settings.setValue("warm_idle", "1" if enabled else "0")
+        if enabled:
+            self._schedule_warming()
+        else:
+            self._warm_timer.stop()
+            self._stop_warming()
+            self.warm_label.hide()
+
+    def _schedule_warming(self):
+        """(Re)start warming in the current list order once the list has settled."""
+        if self.warm_enabled and self.folder and self._pack is None:
+            self._warm_timer.start()
+
+    def _stop_warming(self):
+        if self._warm_worker is not None:
+            self._warm_worker.cancel()  # its finished signal is ignored once superseded
+            self._warm_worker = None
+            self._warm_thread = None
+
+    def _reset_warm_caches(self):
+        """Drop everything kept for the previous folder."""
+        self._warm_timer.stop()
+        self._stop_warming()
+        self.thumb_cache.clear()
+        self.meta_cache.clear()
+        self._warm_bytes = 0
+        self.warm_label.hide()
+
+    def _start_warming(self):
+        if not self.warm_enabled or not self.folder or self._pack is not None:
+            return
+        if self._scan_worker is not None:
+            return  # the scan has the disk; warming is rescheduled when it finishes
+        self._stop_warming()
+        budget = WARM_MEMORY_BUDGET_MB * 1024 * 1024 - self._warm_bytes
+        if budget <= 0:
+            self._show_warm_state("memory")
+            return
+        # List order, starting at the selected card and wrapping around
+        index = self.cards_index
+        rows = list(self.file_index_map.values())
+        start = list(self.file_index_map).index(self.listbox.currentRow()) \
+            if self.listbox.currentRow() in self.file_index_map else 0
+        items = []
+        for row in rows[start:] + rows[:start]:
+            fname = index.filename(row)
+            if fname is None:
+                continue
             fpath = os.path.join(self.folder, fname)
-            try:
-                mtime = int(os.path.getmtime(fpath))
-            except Exception:
+            mtime, size = index.mtime(row), index.size(row)
+            cached = self.meta_cache.get(fpath)
+            need_thumb = fpath not in self.thumb_cache
+            need_meta = cached is None or cached[:2] != (mtime, size)
+            if need_thumb or need_meta:
+                items.append((fname, mtime, size, need_thumb, need_meta))
+        if not items:
+            self.warm_label.hide()
+            return
+        worker = WarmWorker(self.folder, items, self._activity, budget, self._shared)
+        thread = QThread(self)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.warmed.connect(self._on_warmed)
+        worker.progress.connect(self._on_warm_progress)
+        worker.finished.connect(self._on_warm_finished)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        self._warm_worker = worker
+        self._warm_thread = thread
+        thread.start(QThread.Priority.IdlePriority)
+
+    def _on_warmed(self, folder, item):
+        if folder != self.folder or self._pack is not None:
+            return  # warmed for a folder no longer shown
+        fname, mtime, size, image, card, error, nbytes = item
+        fpath = os.path.join(folder, fname)
+        if image is not None and fpath not in self.thumb_cache:
+            self.thumb_cache[fpath] = QPixmap.fromImage(image)
+        if card is not None or error is not None:
+            self.meta_cache[fpath] = (mtime, size, card, error)
+        self._warm_bytes += nbytes
+
+    def _on_warm_progress(self, done, total):
+        if self.sender() is not self._warm_worker:
+            return
+        self.warm_label.setText(f"Warming {done}/{total}")
+        self.warm_label.setToolTip(f"{format_filesize(self._warm_bytes)} of "
+                                   f"{WARM_MEMORY_BUDGET_MB} MB warmed in memory")
+        self.warm_label.show()
+
+    def _on_warm_finished(self, reason):
+        if self.sender() is not self._warm_worker:
+            return  # a superseded warmer wound down
+        self._warm_worker = None
+        self._warm_thread = None
+        self._show_warm_state(reason)
+
+    def _show_warm_state(self, reason):
+        if reason == "memory":
+            self.warm_label.setText(f"Warm cache full ({WARM_MEMORY_BUDGET_MB} MB)")
+        elif reason == "disk":
+            self.warm_label.setText(f"Shared cache over {WARM_DISK_BUDGET_MB} MB")
+        else:
+            self.warm_label.hide()
+            return
+        self.warm_label.setToolTip("Idle-time warming stopped at its budget")
+        self.warm_label.show()
+
+    # -------------------------
+    # Organize (batch rename)
+    # -------------------------
+    def organize_cards(self):
+        if not self.folder:
+            return
+        if self._pack is not None:
+            self.statusbar.showMessage("Library packs are read-only; open the card folder to organize it.")
+            return
+        if (self._scan_worker is not None or self._ingest_worker is not None or self._organize_worker is not None
+                or self._optimize_worker is not None or self._sync_to_worker is not None):
+            self.statusbar.showMessage("Wait for the scan, copy, sync or optimization in progress to finish "
+                                       "before organizing.")
+            return
+        dialog = OrganizeDialog(self.cards_index, self.folder, self.organize_template,
+                                self.organize_by_creator, self)
+        if dialog.exec() != QDialog.DialogCode.Accepted or not dialog.moves:
+            return
+        self.organize_template = dialog.template()
+        self.organize_by_creator = dialog.by_creator()
+        self.settings.setValue("organize_template", self.organize_template)
+        self.settings.setValue("organize_by_creator", "1" if self.organize_by_creator else "0")
+        index = self.cards_index
+        entries = {m.old: index.entry(index.row_of(m.old)) for m in dialog.moves if "/" in m.new}
+        self._warm_timer.stop()
+        self._stop_warming()
+        worker = OrganizeWorker(self.folder, dialog.moves, entries, self.cache_location,
+                                self._history, self._shared)
+        thread = QThread(self)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.progress.connect(lambda done, total: self.statusbar.showMessage(f"Organizing {done}/{total}..."))
+        worker.finished.connect(self._on_organize_finished)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        self._organize_worker = worker
+        self._organize_thread = thread
+        thread.start()
+
+    def _on_organize_finished(self, folder, done, errors):
+        if self.sender() is not self._organize_worker:
+            return
+        self._organize_worker = None
+        self._organize_thread = None
+        if folder != self.folder or self._pack is not None:
+            return
+        # Remap the index in place: renamed files keep their mtime and size, so nothing is rescanned
+        index = self.cards_index
+        self._capture_list_position()
+        renamed = dict(done)
+        selected, scroll = self._restore_position
+        if selected in renamed and "/" not in renamed[selected]:
+            self._restore_position = (renamed[selected], scroll)
+        moved = 0
+        for old, new in done:
+            row = index.row_of(old)
+            if row is None:
                 continue
-            cached_entry = cached_lookup.get(fname)
-            if cached_entry and cached_entry.get('mtime') == mtime and not force_refresh:
-                new_cards_index.append(cached_entry)
-            else:
-                # We'll add a placeholder and rescan in background
-                new_cards_index.append({
-                    "filename": fname,
-                    "mtime": mtime,
-                    "creator": cached_entry.get("creator", "Unknown") if cached_entry else "Unknown",
-                    "tags": cached_entry.get("tags", []) if cached_entry else []
-                })
-                to_rescan.append(fname)
-
-        # Remove deleted files
-        cached_filenames = set(cached_lookup.keys())
-        current_filenames = set(pngs)
-        removed = list(cached_filenames - current_filenames)
-        if removed:
-            LOG.info("Removed %d missing entries from cache", len(removed))
-
-        self.cards_index = new_cards_index
-
-        # Save cache immediately (quick write) to reflect removals/additions
-        try:
-            atomic_write_json(cache_file, self.cards_index)
-        except Exception:
-            LOG.exception("Failed to save initial cards.json")
+            entry = index.entry(row)
+            index.remove(old)
+            pix = self.thumb_cache.pop(os.path.join(folder, old), None)
+            cached = self.meta_cache.pop(os.path.join(folder, old), None)
+            if "/" in new:
+                moved += 1
+                continue
+            index.upsert({**entry, "filename": new})
+            if pix is not None:
+                self.thumb_cache[os.path.join(folder, new)] = pix
+            if cached is not None:
+                self.meta_cache[os.path.join(folder, new)] = cached
+        self._save_index_cache()
+        self.update_listbox()
+        self.statusbar.showMessage(f"Organized {len(done)} card(s): {len(done) - moved} renamed, "
+                                   f"{moved} moved into subfolders"
+                                   + (f", {len(errors)} failed" if errors else ""))
+        if errors:
+            lines = [f"{name}: {err}" for name, err in errors[:20]]
+            if len(errors) > 20:
+                lines.append(f"... and {len(errors) - 20} more")
+            QMessageBox.warning(self, "Organize Cards", "Some cards could not be moved:\n\n" + "\n".join(lines))
 
-        # If there are rescans to do, do them in background
-        if to_rescan:
-            # kill existing scan thread if any
-            if self._scan_thread and self._scan_thread.isRunning():
-                # Let it finish naturally to avoid crashes; in a more advanced version we could cancel
-                pass
-            self._scan_thread = QThread()
-            worker = ScanWorker(self.folder, to_rescan)
-            worker.moveToThread(self._scan_thread)
-            self._scan_thread.started.connect(worker.run)
-            worker.progress.connect(self._on_scan_progress)
-            worker.updated_entries.connect(self._on_scan_updated_entries)
-            worker.finished.connect(self._scan_thread.quit)
-            worker.finished.connect(worker.deleteLater)
-            self._scan_thread.finished.connect(self._scan_thread.deleteLater)
-            self._scan_thread.start()
+    # -------------------------
+    # Sync to folder
+    # -------------------------
+    def sync_to_folder(self):
+        if not self.folder or self._pack is not None or not os.path.isdir(self.folder):
+            self.statusbar.showMessage("Open a card folder first.")
+            return
+        if self._sync_to_worker is not None:
+            return
+        if self._organize_worker is not None or self._optimize_worker is not None:
+            self.statusbar.showMessage("Wait for the organize or optimization in progress to finish.")
+            return
+        dialog = SyncDialog(self.sync_destination, self.sync_compare, self.sync_mirror, self)
+        if dialog.exec() != QDialog.DialogCode.Accepted or not dialog.dest():
+            return
+        dest = dialog.dest()
+        if _folder_key(dest) == _folder_key(self.folder):
+            QMessageBox.warning(self, "Sync to Folder", "The destination is the open folder.")
+            return
+        self.sync_destination = dest
+        self.sync_compare = dialog.compare_contents()
+        self.sync_mirror = dialog.mirror()
+        self.settings.setValue("sync_destination", dest)
+        self.settings.setValue("sync_compare", "1" if self.sync_compare else "0")
+        self.settings.setValue("sync_mirror", "1" if self.sync_mirror else "0")
+        if self.sync_mirror:
+            answer = QMessageBox.question(
+                self, "Sync to Folder",
+                f"Cards in {dest} that {self.folder} doesn't have will be deleted. Continue?")
+            if answer != QMessageBox.StandardButton.Yes:
+                return
+        self.sync_to_action.setEnabled(False)
+        self.statusbar.showMessage(f"Syncing to {dest}...")
+        worker = SyncWorker(self.folder, self.cards_index.snapshot(), dest, self.cache_location,
+                            self.sync_compare, self.sync_mirror)
+        thread = QThread(self)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.progress.connect(lambda done, total: self.statusbar.showMessage(f"Syncing {done}/{total}..."))
+        worker.finished.connect(self._on_sync_to_finished)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        self._sync_to_worker = worker
+        self._sync_to_thread = thread
+        thread.start()
+
+    def _on_sync_to_finished(self, dest, summary):
+        self._sync_to_worker = None
+        self._sync_to_thread = None
+        self.sync_to_action.setEnabled(True)
+        errors = summary["errors"]
+        self.statusbar.showMessage(
+            f"Synced to {dest}: {len(summary['copied'])} copied ({format_filesize(summary['bytes'])}), "
+            f"{len(summary['renamed'])} renamed, {len(summary['deleted'])} deleted, "
+            f"{summary['unchanged']} already up to date" + (f", {len(errors)} failed" if errors else ""))
+        if errors:
+            lines = [f"{name}: {err}" if name else err for name, err in errors[:20]]
+            if len(errors) > 20:
+                lines.append(f"... and {len(errors) - 20} more")
+            QMessageBox.warning(self, "Sync to Folder", "Some cards could not be synced:\n\n" + "\n".join(lines))
 
-    def _on_scan_progress(self, i, total):
-        self.statusbar.showMessage(f"Scanning cards... {i}/{total}")
+    # -------------------------
+    # SillyTavern chat usage
+    # -------------------------
+    def link_chat_data(self):
+        root = QFileDialog.getExistingDirectory(self, "SillyTavern Install or Data Directory", self.chat_root)
+        if not root:
+            return
+        if not chat_dirs(root):
+            QMessageBox.warning(self, "Link SillyTavern Data",
+                                f"No chats directory found under {root}.\n"
+                                "Pick the SillyTavern folder, its data/<user> folder or a chats folder.")
+            return
+        self.set_chat_root(root)
+
+    def set_chat_root(self, root):
+        """Link a SillyTavern directory (or unlink with ""), and start counting its chats."""
+        self.chat_root = root
+        self.settings.setValue("sillytavern_dir", root)
+        self.unlink_chat_action.setEnabled(bool(root))
+        self._open_chat_usage()
+        if not root:
+            self.statusbar.showMessage("SillyTavern data unlinked.")
+
+    def _open_chat_usage(self):
+        if self._chat_worker is not None:
+            self._chat_worker.cancel()  # its result is for another directory; ignored when it lands
+            self._chat_worker = None
+            self._chat_thread = None
+        self._chat_index = ChatUsageIndex(self.chat_root) if self.chat_root else None
+        self._apply_chat_usage(self._chat_index.usage() if self._chat_index is not None else {})
+        if self._chat_index is not None:
+            self._chat_timer.start()
+            self.refresh_chat_usage()
+        else:
+            self._chat_timer.stop()
 
-    def _on_scan_updated_entries(self, entries):
-        # Update cards_index with new info
-        lookup = {e['filename']: e for e in self.cards_index}
-        for e in entries:
-            lookup[e['filename']] = e
-        self.cards_index = list(lookup.values())
-        # Save updated cache atomically
+    def refresh_chat_usage(self):
+        """Re-check the linked chat logs in the background; unchanged logs are not read."""
+        if self._chat_index is None or self._chat_worker is not None:
+            return
+        worker = ChatUsageWorker(self._chat_index)
+        thread = QThread(self)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.finished.connect(self._on_chat_usage)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        self._chat_worker = worker
+        self._chat_thread = thread
+        thread.start(QThread.Priority.LowPriority)
+
+    def _on_chat_usage(self, root, usage):
+        if self.sender() is not self._chat_worker:
+            return  # a superseded refresh wound down
+        self._chat_worker = None
+        self._chat_thread = None
+        if usage is not None and root == self.chat_root:
+            self._apply_chat_usage(usage)
+
+    def _apply_chat_usage(self, usage):
+        self.chat_usage = usage
+        if self.cards_index.set_chat_usage(usage):
+            self._refresh_listbox_keep_position()
+
+    def edit_tag_aliases(self):
+        dialog = TagAliasDialog(self.tag_aliases, self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        self.tag_aliases = dialog.aliases()
+        save_tag_aliases(self.settings, self.tag_aliases)
+        index = self.cards_index
+        written = len(index.tags_table)
+        if index.set_tag_aliases(self.tag_aliases):
+            self.facet_panel.clear_selection(notify=False)  # canonical tag ids were renumbered
+            self._refresh_listbox_keep_position()
+        self.statusbar.showMessage(f"{written} tag spelling(s) map to {len(index.canonical_tags)} tag(s)")
+
+    def _save_index_cache(self):
+        """
+        Append the index changes since the last save to cards.journal on the
+        cache writer thread, compacting it into cards.json once it has grown.
+        """
+        journal = self._journal
+        if not self.folder or journal is None:
+            return
+        records = self.cards_index.take_changes()
+        if not records:
+            return
         try:
-            atomic_write_json(os.path.join(self.folder, "cards.json"), self.cards_index)
-        except Exception:
-            LOG.exception("Failed to save cards.json after scan")
-        # Refresh list if user is on matching sort/filter
-        self.update_listbox()
-        self.statusbar.clearMessage()
+            future = self._cache_writer.submit(journal.append, records)
+        except RuntimeError:
+            journal.append(records)  # writer already shut down on close
+            return
+        future.add_done_callback(lambda _: journal.needs_compaction() and self.journalGrown.emit())
+
+    def _on_journal_grown(self):
+        if self._journal is not None and self._journal.needs_compaction():
+            self._compact_index_cache()
+
+    def _compact_index_cache(self):
+        """Write the whole index as a fresh cards.json and empty the journal."""
+        journal = self._journal
+        if journal is None:
+            return
+        self.cards_index.take_changes()  # part of the snapshot
+        journal.compaction_pending = True
+        self._cache_writer.submit(journal.compact, self.cards_index.snapshot())
 
     # -------------------------
     # Card display
@@ -958,9 +6746,12 @@ class CardViewer(QMainWindow):
         # In-memory cache for session
         if fpath in self.thumb_cache:
             return self.thumb_cache[fpath]
+        if self._shared is not None:
+            return self._shared_thumbnail(fpath)
+        from PIL import Image, ImageQt
         try:
-            im = Image.open(fpath)
-            im = im.resize((180, 220), Image.LANCZOS)
+            im = Image.open(io.BytesIO(read_card_file(fpath)[1]))  # one bulk read
+            im = im.resize(THUMB_SIZE, Image.LANCZOS)
             qtimg = ImageQt.ImageQt(im)
             pix = QPixmap.fromImage(qtimg)
             self.thumb_cache[fpath] = pix
@@ -968,48 +6759,79 @@ class CardViewer(QMainWindow):
         except Exception:
             return None
 
+    def _shared_thumbnail(self, fpath):
+        """Thumbnail through the shared cache: made once per distinct card, whichever folder has it."""
+        folder, fname = os.path.split(fpath)
+        index = self.cards_index
+        row = index.row_of(fname)
+        jpeg = None
+        if row is not None:
+            jpeg = self._shared.thumbnail(folder, fname, index.mtime(row), index.size(row))
+        if jpeg is None:
+            try:
+                st, data = read_card_file(fpath)
+                jpeg = card_thumbnail_jpeg(data)
+            except Exception:
+                return None
+            self._shared.store_thumbnail(folder, fname, st, card_content_hash(data), jpeg)
+        pix = QPixmap()
+        if not pix.loadFromData(jpeg):
+            return None
+        self.thumb_cache[fpath] = pix
+        return pix
+
     def show_card(self):
-        idx = self.listbox.currentRow()
-        if idx == -1 or idx not in self.file_index_map:
-            self.details.show_image(None)
-            self.details.show_metadata(None)
-            self.statusbar.clearMessage()
-            return
-        meta_idx = self.file_index_map[idx]
-        if meta_idx < 0 or meta_idx >= len(self.cards_index):
+        row = self._index_row(self.listbox.currentRow())
+        if row is None:
             self.details.show_image(None)
             self.details.show_metadata(None)
             self.statusbar.clearMessage()
             return
-        entry = self.cards_index[meta_idx]
-        fname = entry['filename']
+        fname = self.cards_index.filename(row)
         fpath = os.path.join(self.folder, fname)
 
+        if self._pack is not None:
+            self.details.show_image(self._pack_thumbnail(fname))
+            self.details.show_metadata(self._pack.metadata(fname))
+            self.statusbar.showMessage(f"{fname} | {self.cards_index.creator(row)} | "
+                                       f"{format_filesize(self.cards_index.size(row))}")
+            return
+
         pix = self._get_thumbnail(fpath)
         self.details.show_image(pix)
 
-        card, error = read_card_metadata(fpath)
+        cached = self.meta_cache.get(fpath)
+        if cached is not None and cached[:2] == (self.cards_index.mtime(row), self.cards_index.size(row)):
+            card, error = cached[2:]
+        else:
+            card, error = read_card_metadata(fpath)
         self.details.show_metadata(card)
-        creator = entry.get('creator', 'Unknown')
+        history = self._history
+        if history is not None:
+            self.details.show_history(history.count(fname), lambda: history.versions(fname), history.image)
+        creator = self.cards_index.creator(row)
+        chats = ""
+        if self._chat_index is not None:
+            usage = self.cards_index.chat_usage(row)
+            chats = f" | {usage.messages:,} message(s), last chat {format_chat_time(usage)}"
         # Show file size in status for a bit more info
         try:
             size = os.path.getsize(fpath)
-            self.statusbar.showMessage(f"{fname} | {creator} | {format_filesize(size)}")
+            self.statusbar.showMessage(f"{fname} | {creator} | {format_filesize(size)}{chats}")
         except Exception:
-            self.statusbar.showMessage(f"{fname} | {creator}")
+            self.statusbar.showMessage(f"{fname} | {creator}{chats}")
 
     # -------------------------
     # Actions
     # -------------------------
     def delete_card(self):
-        idx = self.listbox.currentRow()
-        if idx == -1 or idx not in self.file_index_map:
+        row = self._index_row(self.listbox.currentRow())
+        if row is None:
             return
-        meta_idx = self.file_index_map[idx]
-        if meta_idx < 0 or meta_idx >= len(self.cards_index):
+        if self._pack is not None:
+            self.statusbar.showMessage("Library packs are read-only.")
             return
-        entry = self.cards_index[meta_idx]
-        fname = entry['filename']
+        fname = self.cards_index.filename(row)
         fpath = os.path.join(self.folder, fname)
         confirm = QMessageBox.question(
             self, "Delete Card",
@@ -1020,8 +6842,10 @@ class CardViewer(QMainWindow):
             try:
                 os.remove(fpath)
                 # Update index and save
-                del self.cards_index[meta_idx]
-                atomic_write_json(os.path.join(self.folder, "cards.json"), self.cards_index)
+                self.cards_index.remove(fname)
+                if self._shared is not None:
+                    self._shared.unlink(self.folder, [fname])
+                self._save_index_cache()
                 # Update UI
                 self.update_listbox()
                 self.details.show_image(None)
@@ -1042,15 +6866,12 @@ class CardViewer(QMainWindow):
         try:
             shutil.copy2(fpath, dst)
             # Update cache quickly
-            mtime = int(os.path.getmtime(dst))
-            creator, tags = get_basic_index_info(dst)
-            self.cards_index.append({
-                "filename": candidate,
-                "mtime": mtime,
-                "creator": creator,
-                "tags": tags
-            })
-            atomic_write_json(os.path.join(self.folder, "cards.json"), self.cards_index)
+            self.cards_index.upsert(build_index_entry(self.folder, candidate,
+                                                      history=self._history, shared=self._shared))
+            for store in (self._history, self._shared):
+                if store is not None:
+                    store.flush()
+            self._save_index_cache()
             self.update_listbox()
             self.statusbar.showMessage(f"Duplicated to: {candidate}")
         except Exception as e:
@@ -1073,21 +6894,374 @@ class CardViewer(QMainWindow):
         if not self.folder:
             QMessageBox.warning(self, "No Folder", "Select a folder first!")
             return
-        files_added = 0
-        for url in event.mimeData().urls():
-            src = url.toLocalFile()
-            if src.lower().endswith(".png"):
-                dst = os.path.join(self.folder, os.path.basename(src))
-                if os.path.abspath(src) != os.path.abspath(dst):
-                    try:
-                        shutil.copy2(src, dst)
-                        files_added += 1
-                    except Exception as e:
-                        QMessageBox.warning(self, "Error", f"Could not copy file:\n{e}")
-        if files_added:
-            self.load_or_update_index_cache(force_refresh=True)
-            self.update_listbox()
-            self.statusbar.showMessage(f"Added {files_added} card(s).")
+        if self._pack is not None:
+            QMessageBox.warning(self, "Library Pack", "Library packs are read-only; open a card folder to add cards.")
+            return
+        sources = [url.toLocalFile() for url in event.mimeData().urls()
+                   if url.toLocalFile().lower().endswith(".png")]
+        if not sources:
+            return
+        event.acceptProposedAction()
+        self.add_cards(sources)
+
+    def add_cards(self, sources):
+        """Copy card files into the folder in the background, indexing only those files."""
+        if self._ingest_worker is not None:
+            self._pending_drops.extend(sources)  # picked up when the running ingest finishes
+            return
+        self.statusbar.showMessage(f"Adding {len(sources)} card(s)...")
+        self._ingest_thread = QThread(self)
+        worker = IngestWorker(self.folder, sources, self.cards_index.files_by_size(), self._history, self._shared)
+        worker.moveToThread(self._ingest_thread)
+        self._ingest_thread.started.connect(worker.run)
+        worker.progress.connect(self._on_ingest_progress)
+        worker.updated_entries.connect(self._on_ingested_entries)
+        worker.finished.connect(self._on_ingest_finished)
+        worker.finished.connect(self._ingest_thread.quit)
+        self._ingest_thread.finished.connect(worker.deleteLater)
+        self._ingest_thread.finished.connect(self._ingest_thread.deleteLater)
+        self._ingest_worker = worker
+        self._ingest_thread.start()
+
+    def _on_ingest_progress(self, done, total):
+        self.statusbar.showMessage(f"Adding cards... {done}/{total}")
+
+    def _on_ingested_entries(self, folder, entries):
+        self._on_scan_updated_entries(folder, entries)
+        if folder == self.folder and not self._list_refresh_timer.isActive():
+            self._list_refresh_timer.start()  # new rows, whatever the sort mode
+
+    def _on_ingest_finished(self, folder, summary):
+        self._ingest_worker = None
+        self._ingest_thread = None
+        added, duplicates, errors = summary["added"], summary["duplicates"], summary["errors"]
+        parts = [f"Added {len(added)} card(s)"]
+        if duplicates:
+            parts.append(f"skipped {len(duplicates)} duplicate(s)")
+        if errors:
+            parts.append(f"{len(errors)} failed")
+        self.statusbar.showMessage(", ".join(parts) + ".")
+        if errors:
+            lines = [f"{name}: {message}" for name, message in errors[:20]]
+            if len(errors) > 20:
+                lines.append(f"... and {len(errors) - 20} more")
+            msg = QMessageBox(self)
+            msg.setIcon(QMessageBox.Warning)
+            msg.setWindowTitle("Add Cards")
+            msg.setText(f"{len(errors)} card(s) could not be added.")
+            msg.setDetailedText("\n".join(lines))
+            if self.is_dark_mode:
+                apply_messagebox_dark(msg)
+            msg.open()
+        pending, self._pending_drops = self._pending_drops, []
+        if pending and folder == self.folder:
+            self.add_cards(pending)
+        elif added and self._similarity is not None:
+            self._refresh_similarity()
+
+    # -------------------------
+    # Library validation
+    # -------------------------
+    def start_validation(self):
+        if not self.folder or not os.path.isdir(self.folder):
+            self.statusbar.showMessage("Open a card folder first.")
+            return
+        if self._validation_worker is not None:
+            return
+        self.validate_action.setEnabled(False)
+        self.statusbar.showMessage("Validating library...")
+        self._validation_thread = QThread(self)
+        worker = ValidationWorker(self.folder, self._cache_dir)
+        worker.moveToThread(self._validation_thread)
+        self._validation_thread.started.connect(worker.run)
+        worker.progress.connect(self._on_validation_progress)
+        worker.finished.connect(self._on_validation_finished)
+        worker.finished.connect(self._validation_thread.quit)
+        self._validation_thread.finished.connect(worker.deleteLater)
+        self._validation_thread.finished.connect(self._validation_thread.deleteLater)
+        self._validation_worker = worker
+        self._validation_thread.start()
+
+    def _on_validation_progress(self, done, total):
+        self.statusbar.showMessage(f"Validating cards... {done}/{total}")
+
+    def _on_validation_finished(self, results, rechecked):
+        folder = self._validation_worker.folder
+        self._validation_worker = None
+        self._validation_thread = None
+        self.validate_action.setEnabled(True)
+        summary = summarize_validation(results, rechecked)
+        self.statusbar.showMessage(summary)
+        if folder != self.folder:
+            return  # folder changed while validating; the report would not match the list
+        if self._validation_dialog is not None:
+            self._validation_dialog.close()
+        self._validation_dialog = ValidationReportDialog(results, rechecked, self)
+        self._validation_dialog.cardActivated.connect(self.reveal_card)
+        self._validation_dialog.show()
+
+    # -------------------------
+    # Library optimization
+    # -------------------------
+    def start_optimization(self):
+        if not self.folder or self._pack is not None or not os.path.isdir(self.folder):
+            self.statusbar.showMessage("Open a card folder first.")
+            return
+        if self._optimize_worker is not None:
+            return
+        if self._organize_worker is not None or self._sync_to_worker is not None:
+            self.statusbar.showMessage("Wait for the organize or sync in progress to finish.")
+            return
+        answer = QMessageBox.question(
+            self, "Optimize Library",
+            "Recompress every card's image losslessly and drop metadata chunks that don't affect "
+            "the image (times, EXIF, other text). Card data is kept exactly as it is, and a file is "
+            "only replaced when the result is smaller.\n\nCards are rewritten in place. Continue?")
+        if answer != QMessageBox.StandardButton.Yes:
+            return
+        self.optimize_action.setEnabled(False)
+        self.statusbar.showMessage("Optimizing library...")
+        self._optimize_thread = QThread(self)
+        worker = OptimizeWorker(self.folder, self._cache_dir)
+        worker.moveToThread(self._optimize_thread)
+        self._optimize_thread.started.connect(worker.run)
+        worker.progress.connect(lambda done, total: self.statusbar.showMessage(f"Optimizing cards... {done}/{total}"))
+        worker.finished.connect(self._on_optimization_finished)
+        worker.finished.connect(self._optimize_thread.quit)
+        self._optimize_thread.finished.connect(worker.deleteLater)
+        self._optimize_thread.finished.connect(self._optimize_thread.deleteLater)
+        self._optimize_worker = worker
+        self._optimize_thread.start()
+
+    def _on_optimization_finished(self, folder, replaced, checked, errors):
+        self._optimize_worker = None
+        self._optimize_thread = None
+        self.optimize_action.setEnabled(True)
+        for fname, error in errors:
+            LOG.warning("Could not optimize %s: %s", fname, error)
+        if folder == self.folder and self._pack is None:
+            # Same card, same modification time: only the size changes, so nothing is rescanned
+            index = self.cards_index
+            for fname, (before, after) in replaced.items():
+                row = index.row_of(fname)
+                if row is not None and index.size(row) == before:
+                    index.set_size(row, after)
+            if replaced:
+                self._save_index_cache()
+                if self.sort_mode == "size" or "size:" in self.search_bar.text():
+                    self._refresh_listbox_keep_position()
+        self.statusbar.showMessage(summarize_optimization(replaced, checked, errors))
+
+    def reveal_card(self, fname):
+        """Select fname in the list, clearing search and filters if they hide it."""
+        row = self.cards_index.row_of(fname)
+        if row is None:
+            self.statusbar.showMessage(f"{fname} is not in the library.")
+            return
+        if row not in self.file_index_map.values():
+            self.facet_panel.clear_selection(notify=False)
+            if self.search_bar.text():
+                self.search_bar.setText("")  # rebuilds the list
+            else:
+                self.update_listbox()
+        for list_row, r in self.file_index_map.items():
+            if r == row:
+                self.listbox.setCurrentRow(list_row)
+                self.listbox.scrollToItem(self.listbox.item(list_row))
+                break
+
+    # -------------------------
+    # Library packs
+    # -------------------------
+    def export_pack(self):
+        if not self.folder or self._pack is not None or not os.path.isdir(self.folder):
+            self.statusbar.showMessage("Open a card folder first.")
+            return
+        if self._pack_worker is not None:
+            return
+        default = os.path.basename(os.path.normpath(self.folder)) + PACK_EXTENSION
+        path, _ = QFileDialog.getSaveFileName(self, "Export Library Pack", default,
+                                              f"Library Packs (*{PACK_EXTENSION})")
+        if not path:
+            return
+        if not path.endswith(PACK_EXTENSION):
+            path += PACK_EXTENSION
+        self.export_pack_action.setEnabled(False)
+        self.statusbar.showMessage("Exporting library pack...")
+        self._pack_thread = QThread(self)
+        worker = PackWorker(self.folder, path)
+        worker.moveToThread(self._pack_thread)
+        self._pack_thread.started.connect(worker.run)
+        worker.progress.connect(self._on_pack_progress)
+        worker.finished.connect(self._on_pack_finished)
+        worker.finished.connect(self._pack_thread.quit)
+        self._pack_thread.finished.connect(worker.deleteLater)
+        self._pack_thread.finished.connect(self._pack_thread.deleteLater)
+        self._pack_worker = worker
+        self._pack_thread.start()
+
+    def _on_pack_progress(self, done, total):
+        self.statusbar.showMessage(f"Exporting library pack... {done}/{total}")
+
+    def _on_pack_finished(self, path, count, error):
+        self._pack_worker = None
+        self._pack_thread = None
+        self.export_pack_action.setEnabled(True)
+        if error:
+            QMessageBox.warning(self, "Export Library Pack", f"Could not write {path}:\n{error}")
+        elif count >= 0:
+            self.statusbar.showMessage(f"Packed {count} card(s) into {path}")
+
+    def select_pack(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Open Library Pack", "",
+                                              f"Library Packs (*{PACK_EXTENSION});;All Files (*)")
+        if path:
+            self.open_pack(path)
+
+    def open_pack(self, path):
+        """Show a library pack read-only, in place of the current folder."""
+        try:
+            pack = LibraryPack(path)
+        except (OSError, ValueError, KeyError) as e:
+            QMessageBox.warning(self, "Open Library Pack", f"Could not open {path}:\n{e}")
+            return
+        self._stop_scan()
+        self._close_pack()
+        if self._history is not None:
+            self._history.close()
+            self._history = None
+        self._pack = pack
+        self.folder = path  # identifies the library; card files are found through the pack
+        self.folder_label.setText(f"{path} (library pack, read-only)")
+        self.settings.setValue("last_folder", path)
+        self._cache_dir = ""
+        self._journal = None
+        self._reset_warm_caches()
+        self.facet_panel.clear_selection(notify=False)
+        self.cards_index = CardIndex.from_records(pack.records, self.tag_aliases)
+        self.cards_index.set_chat_usage(self.chat_usage)
+        self._similarity = self._similarity_docs = self._similarity_key = None
+        self.update_listbox()
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(pack.created))
+        self.statusbar.showMessage(f"{len(pack)} card(s) from {pack.source_folder}, packed {when}")
+
+    def _close_pack(self):
+        if self._pack is not None:
+            self._pack.close()
+            self._pack = None
+
+    def _pack_thumbnail(self, fname):
+        if fname in self.thumb_cache:
+            return self.thumb_cache[fname]
+        data = self._pack.thumbnail(fname)
+        if data is None:
+            return None
+        pix = QPixmap()
+        if not pix.loadFromData(bytes(data)):  # one thumbnail's bytes; PySide won't take a read-only view
+            return None
+        self.thumb_cache[fname] = pix
+        return pix
+
+    # -------------------------
+    # Similar cards
+    # -------------------------
+    def more_like_this(self, fname):
+        if numpy_or_none() is None:
+            QMessageBox.information(self, "More Like This",
+                                    "Finding similar cards needs NumPy:\n\npip install numpy")
+            return
+        self._similarity_query = fname
+        if self._similarity is not None and self._similarity_key == (self.cards_index, self.cards_index.generation):
+            self._show_similar()
+            return
+        self.statusbar.showMessage("Finding similar cards...")
+        self._refresh_similarity()
+
+    def _refresh_similarity(self):
+        """Update the similarity matrix in the background for cards added or changed since the last one."""
+        if self._similarity_worker is not None or not self.folder:
+            return  # the running one re-checks when it finishes
+        self._similarity_thread = QThread(self)
+        worker = SimilarityWorker(self.folder, self._cache_dir, self.cards_index.known_stats(),
+                                  self._similarity_docs, self._pack)
+        worker.key = (self.cards_index, self.cards_index.generation)
+        worker.moveToThread(self._similarity_thread)
+        self._similarity_thread.started.connect(worker.run)
+        worker.progress.connect(self._on_similarity_progress)
+        worker.finished.connect(self._on_similarity_finished)
+        worker.finished.connect(self._similarity_thread.quit)
+        self._similarity_thread.finished.connect(worker.deleteLater)
+        self._similarity_thread.finished.connect(self._similarity_thread.deleteLater)
+        self._similarity_worker = worker
+        self._similarity_thread.start()
+
+    def _on_similarity_progress(self, done, total):
+        if self._similarity_query is not None:
+            self.statusbar.showMessage(f"Reading card descriptions for similarity... {done}/{total}")
+
+    def _on_similarity_finished(self, folder, docs, matrix):
+        key = self._similarity_worker.key
+        self._similarity_worker = None
+        self._similarity_thread = None
+        if folder != self.folder or matrix is None:
+            return
+        self._similarity, self._similarity_docs, self._similarity_key = matrix, docs, key
+        if self._similarity_query is not None:
+            self._show_similar()
+        elif key != (self.cards_index, self.cards_index.generation):
+            self._refresh_similarity()  # more changes came in while it was building
+
+    def _show_similar(self):
+        fname, self._similarity_query = self._similarity_query, None
+        start = time.perf_counter()
+        matches = []
+        for name, score in self._similarity.similar(fname, SIMILAR_CARDS_SHOWN):
+            row = self.cards_index.row_of(name)
+            if row is not None:
+                matches.append((name, self.cards_index.creator(row), score))
+        elapsed = (time.perf_counter() - start) * 1000
+        self.statusbar.showMessage(f"{len(matches)} similar card(s) among {len(self._similarity)} "
+                                   f"in {elapsed:.0f} ms")
+        if self._similar_dialog is not None:
+            self._similar_dialog.close()
+        self._similar_dialog = SimilarCardsDialog(fname, matches, self)
+        self._similar_dialog.cardActivated.connect(self.reveal_card)
+        self._similar_dialog.show()
+
+    # -------------------------
+    # Local API
+    # -------------------------
+    def set_api_server_enabled(self, enabled):
+        if enabled and self._api_server is None:
+            try:
+                self._api_server = CardApiServer(port=self.api_port)
+            except OSError as e:
+                self.statusbar.showMessage(f"Could not start the local API on port {self.api_port}: {e}")
+                self.api_action.blockSignals(True)
+                self.api_action.setChecked(False)
+                self.api_action.blockSignals(False)
+                return
+            self._api_published = None
+            self._publish_api_index()
+            self._api_server.start()
+            self._api_publish_timer.start()
+            self.statusbar.showMessage(f"Local API serving at {self._api_server.url}/api/cards")
+        elif not enabled and self._api_server is not None:
+            self._api_publish_timer.stop()
+            self._api_server.stop()
+            self._api_server = None
+            self.statusbar.showMessage("Local API stopped.")
+
+    def _publish_api_index(self):
+        """Hand the API server a fresh snapshot if the index changed since the last one."""
+        server = self._api_server
+        if server is None or not self.folder:
+            return
+        key = (self.cards_index, self.cards_index.generation)
+        if self._api_published == key:
+            return
+        self._api_published = key
+        server.publish(self.cards_index.snapshot(), self.folder)
 
     # --- Context menu on right click ---
     def show_context_menu(self, pos):
@@ -1107,26 +7281,29 @@ class CardViewer(QMainWindow):
 
         about_action.triggered.connect(do_about)
 
-        if idx == -1 or idx not in self.file_index_map:
+        row = self._index_row(idx)
+        if row is None:
             menu.addAction(about_action)
             menu.exec(QCursor.pos())
             return
 
-        meta_idx = self.file_index_map[idx]
-        entry = self.cards_index[meta_idx]
-        fname = entry['filename']
-        fpath = os.path.join(self.folder, fname)
+        fname = self.cards_index.filename(row)
+        fpath = self._pack.card_path(fname) if self._pack is not None else os.path.join(self.folder, fname)
 
         open_action = QAction("Open in Default Viewer", self)
         export_action = QAction("Export Metadata...", self)
         save_as_action = QAction("Save PNG As...", self)
         duplicate_action = QAction("Duplicate Card", self)
+        similar_action = QAction("More Like This", self)
 
         def do_open():
             QDesktopServices.openUrl(f"file:///{os.path.abspath(fpath)}")
 
         def do_export():
-            card, error = read_card_metadata(fpath)
+            if self._pack is not None:
+                card = self._pack.metadata(fname)
+            else:
+                card, error = read_card_metadata(fpath)
             if not card:
                 msg = QMessageBox(self)
                 msg.setIcon(QMessageBox.Warning)
@@ -1191,11 +7368,18 @@ class CardViewer(QMainWindow):
         export_action.triggered.connect(do_export)
         save_as_action.triggered.connect(do_save_as)
         duplicate_action.triggered.connect(do_duplicate)
+        similar_action.triggered.connect(lambda: self.more_like_this(fname))
+        if self._pack is not None:
+            # The original PNG is only there if the packed folder is present on this machine
+            open_action.setEnabled(fpath is not None)
+            save_as_action.setEnabled(fpath is not None)
+            duplicate_action.setEnabled(False)
 
         menu.addAction(open_action)
         menu.addAction(export_action)
         menu.addAction(save_as_action)
         menu.addAction(duplicate_action)
+        menu.addAction(similar_action)
         menu.addSeparator()
         menu.addAction(about_action)
 
@@ -1218,7 +7402,239 @@ class CardViewer(QMainWindow):
             self.is_dark_mode = True
 
 
-if __name__ == "__main__":
+# -------------------------
+# UI benchmark
+# -------------------------
+
+def _png_chunk(ctype, body):
+    return struct.pack(">I", len(body)) + ctype + body + struct.pack(">I", zlib.crc32(ctype + body))
+
+def write_synthetic_cards(folder, n, seed=0):
+    """
+    Write n small but complete character cards (8x8 image, V2 metadata with
+    tags, text and the odd lorebook) into folder for benchmarks.
+    """
+    import random
+    rnd = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    ihdr = _png_chunk(b"IHDR", struct.pack(">IIBBBBB", 8, 8, 8, 2, 0, 0, 0))
+    idat = _png_chunk(b"IDAT", zlib.compress(b"".join(b"\0" + b"\x80\x40\x20" * 8 for _ in range(8))))
+    iend = _png_chunk(b"IEND", b"")
+    words = ["".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rnd.randint(3, 8)))
+             for _ in range(5000)]
+    tags = ["fantasy", "elf", "sci-fi", "romance", "horror", "comedy", "school", "nsfw", "sfw", "adventure"]
+    tags += [f"tag{i}" for i in range(200)]
+    creators = [f"creator{i}" for i in range(max(1, n // 50))]
+    for i in range(n):
+        data = {
+            "name": f"{rnd.choice(words).title()} {i}",
+            "creator": rnd.choice(creators),
+            "tags": rnd.sample(tags, rnd.randint(0, 6)),
+            "description": " ".join(rnd.choices(words, k=rnd.randint(20, 300))),
+            "personality": " ".join(rnd.choices(words, k=rnd.randint(0, 40))),
+            "scenario": " ".join(rnd.choices(words, k=rnd.randint(0, 40))),
+            "first_mes": " ".join(rnd.choices(words, k=rnd.randint(5, 80))),
+        }
+        if rnd.random() < 0.1:
+            data["character_book"] = {"entries": [{"keys": rnd.sample(words, 2), "content": rnd.choice(words)}
+                                                  for _ in range(rnd.randint(1, 30))]}
+        card = {"spec": "chara_card_v2", "spec_version": "2.0", "data": data}
+        text = b"chara\0" + base64.b64encode(json.dumps(card).encode("utf-8"))
+        with open(os.path.join(folder, f"card_{i:06d}.png"), "wb") as f:
+            f.write(PNG_SIGNATURE + ihdr + _png_chunk(b"tEXt", text) + idat + iend)
+
+def run_ui_benchmark(n=50_000, threshold=STALL_THRESHOLD):
+    """
+    Drive the viewer the way a user would against n synthetic cards, on the
+    offscreen platform unless another was chosen: open the folder and wait for
+    the first scan, type a search, arrow down the list, rescan. Returns
+    [(phase, take_stats())] of event-loop latency per phase.
+    Settings and caches go to a temporary directory, never the user's.
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtTest import QTest
+    tmp = tempfile.mkdtemp(prefix="cardviewer_bench_")
+    folder = os.path.join(tmp, "cards")
+    LOG.info("Writing %d synthetic cards to %s", n, folder)
+    write_synthetic_cards(folder, n)
+    QSettings.setDefaultFormat(QSettings.Format.IniFormat)
+    QSettings.setPath(QSettings.Format.IniFormat, QSettings.Scope.UserScope, tmp)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    viewer = CardViewer()
+    viewer.show()
+    watchdog = StallWatchdog(threshold)
+    results = []
+
+    def idle():
+        return viewer._sync_worker is None and viewer._scan_worker is None
+
+    def script():
+        watchdog.take_stats()
+        viewer.open_folder(folder)
+        yield idle
+        results.append(("open folder + first scan", watchdog.take_stats()))
+        viewer.search_bar.setFocus()
+        for ch in "tag:fantasy e":
+            QTest.keyClick(viewer.search_bar, ch)
+            yield 0.08
+        yield 0.5
+        results.append(("search typing", watchdog.take_stats()))
+        viewer.search_bar.clear()
+        yield 0.5
+        watchdog.take_stats()
+        viewer.listbox.setFocus()
+        viewer.listbox.setCurrentRow(0)
+        for _ in range(200):
+            QTest.keyClick(viewer.listbox, Qt.Key.Key_Down)
+            yield 0.03
+        results.append(("arrow-key navigation", watchdog.take_stats()))
+        viewer.refresh_folder()
+        yield 0.1
+        yield idle
+        results.append(("rescan", watchdog.take_stats()))
+
+    steps = script()
+
+    def advance():
+        try:
+            step = next(steps)
+        except StopIteration:
+            viewer.close()
+            app.quit()
+            return
+        if callable(step):
+            def poll():
+                if step():
+                    advance()
+                else:
+                    QTimer.singleShot(50, poll)
+            QTimer.singleShot(50, poll)
+        else:
+            QTimer.singleShot(int(step * 1000), advance)
+
+    watchdog.start()
+    QTimer.singleShot(0, advance)
+    app.exec()
+    watchdog.stop()
+    shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Character Card Viewer")
+    parser.add_argument("--bench-index", type=int, metavar="N",
+                        help="compare in-memory index size for N synthetic cards and exit")
+    parser.add_argument("--bench-similarity", type=int, metavar="N",
+                        help="time \"More Like This\" over N synthetic cards and exit (needs NumPy)")
+    parser.add_argument("--bench-parse", type=int, nargs="?", const=4, metavar="MB",
+                        help="time reading the index fields of large cards (MB of metadata each, default 4), "
+                             "full parse against the fast path, and exit")
+    parser.add_argument("--ui-bench", type=int, nargs="?", const=50_000, metavar="N",
+                        help="drive the UI offscreen against N synthetic cards (default 50000), report "
+                             "event-loop latency per phase and exit; exits 1 if a phase's p99 reaches --stall-ms")
+    parser.add_argument("--watchdog", action="store_true",
+                        help="log every event-loop stall longer than --stall-ms with the Python stack behind it")
+    parser.add_argument("--stall-ms", type=int, default=int(STALL_THRESHOLD * 1000),
+                        help=f"stall threshold for --watchdog and --ui-bench (default {int(STALL_THRESHOLD * 1000)})")
+    parser.add_argument("--validate", metavar="FOLDER",
+                        help="check every card in FOLDER without opening the window and exit")
+    parser.add_argument("--report", metavar="FILE",
+                        help="with --validate, write the report to FILE (.csv or .json)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="with --validate, re-check every file instead of only changed ones")
+    parser.add_argument("--optimize", metavar="FOLDER",
+                        help="losslessly recompress the cards in FOLDER in place, keeping card data, and exit")
+    parser.add_argument("--export-pack", nargs=2, metavar=("FOLDER", "PACK"),
+                        help="write FOLDER into the library pack file PACK without opening the window and exit")
+    parser.add_argument("--serve", metavar="FOLDER",
+                        help="serve FOLDER over the local HTTP API without opening the window")
+    parser.add_argument("--port", type=int, default=API_DEFAULT_PORT,
+                        help=f"port for --serve (default {API_DEFAULT_PORT}, 0 picks a free one)")
+    # Unknown arguments are left for Qt (-platform, -style, ...)
+    args, _ = parser.parse_known_args(argv)
+
+    if args.bench_index:
+        dict_bytes, index_bytes = benchmark_index_memory(args.bench_index)
+        print(f"{args.bench_index} cards: list of dicts {format_filesize(dict_bytes)}, "
+              f"CardIndex {format_filesize(index_bytes)} ({dict_bytes / max(index_bytes, 1):.1f}x smaller)")
+        return 0
+
+    if args.bench_similarity:
+        if numpy_or_none() is None:
+            print("--bench-similarity needs NumPy (pip install numpy)")
+            return 1
+        build, median, worst = benchmark_similarity(args.bench_similarity)
+        print(f"{args.bench_similarity} cards: matrix built in {build:.2f} s, "
+              f"top-{SIMILAR_CARDS_SHOWN} query {median * 1000:.1f} ms median, {worst * 1000:.1f} ms worst")
+        return 0
+
+    if args.bench_parse:
+        n = 20
+        results = benchmark_card_parsing(n, args.bench_parse)
+        print(f"{n} cards, {format_filesize(results['bytes'])}:")
+        for name, label in (("full", "full parse"), ("fast", "index fast path")):
+            seconds, peak = results[name]
+            print(f"  {label:<16} {seconds * 1000 / n:8.1f} ms/card, peak {format_filesize(peak)}")
+        return 0
+
+    if args.ui_bench:
+        results = run_ui_benchmark(args.ui_bench, args.stall_ms / 1000)
+        print(f"{'phase':<26} {'ticks':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'stalls':>6}")
+        for phase, s in results:
+            print(f"{phase:<26} {s['ticks']:>6} {s['p50']:>8.1f} {s['p99']:>8.1f} {s['max']:>8.1f} {s['stalls']:>6}")
+        return 1 if any(s["p99"] >= args.stall_ms for _, s in results) else 0
+
+    if args.optimize:
+        location = QSettings("CardViewer", "Deluxe").value("cache_location", "folder")
+        cache_dir = resolve_cache_dir(args.optimize, location)
+        replaced, checked, errors = optimize_library(args.optimize, cache_dir=cache_dir)
+        for fname, error in errors:
+            print(f"{fname}: {error}")
+        # Bring the cached index's sizes along, so the next open doesn't rescan these cards
+        journal = IndexJournal(cache_dir)
+        index = CardIndex.from_records(replay_index_journal(load_index_cache(journal.snapshot_path), journal.path))
+        for fname, (before, after) in replaced.items():
+            row = index.row_of(fname)
+            if row is not None and index.size(row) == before:
+                index.set_size(row, after)
+        journal.append(index.take_changes())
+        print(summarize_optimization(replaced, checked, errors))
+        return 1 if errors else 0
+
+    if args.export_pack:
+        folder, path = args.export_pack
+        count = write_library_pack(path, folder)
+        print(f"Packed {count} card(s) from {folder} into {path}")
+        return 0
+
+    if args.serve:
+        settings = QSettings("CardViewer", "Deluxe")
+        location = settings.value("cache_location", "folder")
+        index = load_folder_index(args.serve, resolve_cache_dir(args.serve, location), load_tag_aliases(settings))
+        server = CardApiServer(port=args.port)
+        server.publish(index, args.serve)
+        print(f"Serving {len(index)} card(s) from {args.serve} at {server.url}/api/cards", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
+
+    if args.validate:
+        location = QSettings("CardViewer", "Deluxe").value("cache_location", "folder")
+        results, rechecked = validate_library(args.validate, use_cache=not args.no_cache,
+                                              cache_dir=resolve_cache_dir(args.validate, location))
+        for fname in sorted(results):
+            for severity, problem, details in results[fname]:
+                print(f"{fname}: {severity}: {problem}: {details}")
+        print(summarize_validation(results, rechecked))
+        if args.report:
+            write_validation_report(args.report, results)
+        return 1 if any(i[0] == "error" for issues in results.values() for i in issues) else 0
+
     app = QApplication(sys.argv)
     settings = QSettings("CardViewer", "Deluxe")
     is_dark_mode = settings.value("dark_mode", "1") == "1"
@@ -1230,4 +7646,13 @@ if __name__ == "__main__":
         app.setStyleSheet(LIGHT_EXTRA_STYLES)
     viewer = CardViewer()
     viewer.show()
-    sys.exit(app.exec())
+    if args.watchdog:
+        watchdog = StallWatchdog(args.stall_ms / 1000, parent=viewer)
+        watchdog.start()
+        app.aboutToQuit.connect(watchdog.stop)
+    return app.exec()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # validation and optimization workers in frozen builds
+    sys.exit(main())
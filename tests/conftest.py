@@ -0,0 +1,44 @@
+import base64
+import json
+import os
+import struct
+import sys
+import zlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import card_viewer  # noqa: E402
+
+
+def card_png(card, pixel=b"\x80\x40\x20", encode=base64.b64encode):
+    """Bytes of an 8x8 card PNG holding card (a dict) in a chara chunk, base64 written by encode."""
+    chunk = card_viewer._png_chunk
+    ihdr = chunk(b"IHDR", struct.pack(">IIBBBBB", 8, 8, 8, 2, 0, 0, 0))
+    idat = chunk(b"IDAT", zlib.compress(b"".join(b"\0" + pixel * 8 for _ in range(8))))
+    text = b"chara\0" + encode(json.dumps(card).encode("utf-8"))
+    return card_viewer.PNG_SIGNATURE + ihdr + chunk(b"tEXt", text) + idat + chunk(b"IEND", b"")
+
+
+def complete_card(name, **fields):
+    """A V2 card with every field the spec requires, fields overriding the defaults."""
+    data = {f: "" for f in card_viewer.SPEC_REQUIRED_FIELDS["chara_card_v2"]}
+    data.update(name=name, tags=[], alternate_greetings=[], extensions={})
+    data.update(fields)
+    return {"spec": "chara_card_v2", "spec_version": "2.0", "data": data}
+
+
+@pytest.fixture
+def write_card(tmp_path):
+    """write_card(name, card=None, folder=tmp_path, mtime=None, ...) -> path of a new card PNG."""
+    def write(name, card=None, folder=tmp_path, mtime=None, pixel=b"\x80\x40\x20", encode=base64.b64encode):
+        card = card or complete_card(os.path.splitext(name)[0])
+        path = os.path.join(folder, name)
+        os.makedirs(folder, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(card_png(card, pixel, encode))
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+    return write
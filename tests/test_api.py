@@ -0,0 +1,105 @@
+import http.client
+import json
+
+import pytest
+
+from card_viewer import CardApiServer, CardIndex, build_index_entry
+
+from conftest import complete_card
+
+
+@pytest.fixture
+def server(tmp_path, write_card):
+    write_card("ann.png", complete_card("Ann", creator="Alice", tags=["elf"]))
+    write_card("bob.png", complete_card("Bob", creator="Bob", tags=["robot"]))
+    write_card("cat.png", complete_card("Cat", creator="Alice", tags=["cat"]))
+    index = CardIndex.from_records([build_index_entry(str(tmp_path), f) for f in ("ann.png", "bob.png", "cat.png")])
+    srv = CardApiServer(port=0)
+    srv.publish(index, str(tmp_path))
+    srv.start()
+    yield srv
+    srv.stop()
+    srv.server_close()
+
+
+def _get(srv, path, conn=None, method="GET", **headers):
+    conn = conn or http.client.HTTPConnection("127.0.0.1", srv.server_address[1], timeout=5)
+    conn.request(method, path, headers=headers)
+    resp = conn.getresponse()
+    return resp, resp.read()
+
+
+def test_status_and_search(server):
+    resp, body = _get(server, "/api/status")
+    assert resp.status == 200 and json.loads(body)["cards"] == 3
+    resp, body = _get(server, "/api/cards?q=creator:alice&sort=name")
+    result = json.loads(body)
+    assert result["total"] == 2
+    assert [c["filename"] for c in result["items"]] == ["ann.png", "cat.png"]
+    result = json.loads(_get(server, "/api/cards?sort=name&offset=1&limit=1")[1])
+    assert (result["total"], [c["filename"] for c in result["items"]]) == (3, ["bob.png"])
+
+
+def test_bad_requests(server):
+    assert _get(server, "/api/cards?sort=nope")[0].status == 400
+    assert _get(server, "/api/cards?limit=x")[0].status == 400
+    assert _get(server, "/api/cards/missing.png")[0].status == 404
+    assert _get(server, "/elsewhere")[0].status == 404
+
+
+def test_card_and_thumbnail(server):
+    resp, body = _get(server, "/api/cards/ann.png")
+    card = json.loads(body)
+    assert resp.status == 200 and card["metadata"]["name"] == "Ann" and card["card"]["creator"] == "Alice"
+    resp, body = _get(server, "/api/cards/ann.png/thumbnail")
+    assert resp.status == 200 and resp.getheader("Content-Type") == "image/png" and body.startswith(b"\x89PNG")
+
+
+def test_etags(server):
+    resp, body = _get(server, "/api/cards?q=elf")
+    etag = resp.getheader("ETag")
+    assert etag and body
+    resp, body = _get(server, "/api/cards?q=elf", **{"If-None-Match": etag})
+    assert resp.status == 304 and body == b""
+    # A new snapshot invalidates search results
+    server.publish(server.state().index, server.state().folder)
+    resp, _ = _get(server, "/api/cards?q=elf", **{"If-None-Match": etag})
+    assert resp.status == 200 and resp.getheader("ETag") != etag
+    # Card ETags follow the file, not the snapshot
+    etag = _get(server, "/api/cards/ann.png")[0].getheader("ETag")
+    assert _get(server, "/api/cards/ann.png", **{"If-None-Match": etag})[0].status == 304
+
+
+def test_head_has_no_body(server):
+    resp, body = _get(server, "/api/status", method="HEAD")
+    assert resp.status == 200 and body == b"" and int(resp.getheader("Content-Length")) > 0
+
+
+def test_keep_alive(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+    resp, _ = _get(server, "/api/status", conn)
+    sock = conn.sock
+    assert resp.getheader("Connection") is None
+    _get(server, "/api/cards", conn)
+    assert conn.sock is sock  # the same connection served both
+    conn.close()
+
+
+@pytest.mark.parametrize("host", ["evil.example:{port}", "127.0.0.1:1", "localhost", "attacker.test"])
+def test_foreign_host_is_refused(server, host):
+    resp, body = _get(server, "/api/cards", Host=host.format(port=server.server_address[1]))
+    assert resp.status == 403 and b"Ann" not in body
+
+
+def test_localhost_name_is_allowed(server):
+    assert _get(server, "/api/status", Host=f"localhost:{server.server_address[1]}")[0].status == 200
+
+
+def test_no_library_yet():
+    srv = CardApiServer(port=0)
+    srv.start()
+    try:
+        assert _get(srv, "/api/status")[0].status == 503
+    finally:
+        srv.stop()
+        srv.server_close()
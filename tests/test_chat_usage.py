@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+import card_viewer
+from card_viewer import scan_chat_log
+
+HEADER = json.dumps({"user_name": "You", "character_name": "Ann", "chat_metadata": {}})
+
+
+def _message(text):
+    return json.dumps({"name": "Ann", "is_user": False, "mes": text})
+
+
+def _scan(tmp_path, text):
+    path = tmp_path / "chat.jsonl"
+    path.write_bytes(text.encode("utf-8") if isinstance(text, str) else text)
+    return scan_chat_log(str(path))
+
+
+def test_header_only(tmp_path):
+    assert _scan(tmp_path, HEADER + "\n") == (0, "Ann")
+    assert _scan(tmp_path, HEADER) == (0, "Ann")
+
+
+def test_messages_with_and_without_trailing_newline(tmp_path):
+    body = HEADER + "\n" + _message("hi") + "\n" + _message("there")
+    assert _scan(tmp_path, body) == (2, "Ann")
+    assert _scan(tmp_path, body + "\n") == (2, "Ann")
+
+
+def test_blank_lines_are_not_messages(tmp_path):
+    body = HEADER + "\n\n" + _message("hi") + "\n   \n\r\n" + _message("there") + "\n\n"
+    assert _scan(tmp_path, body) == (2, "Ann")
+
+
+def test_first_line_message_without_header(tmp_path):
+    assert _scan(tmp_path, _message("hi") + "\n" + _message("again") + "\n") == (2, "")
+
+
+def test_empty_file(tmp_path):
+    assert _scan(tmp_path, "") == (0, "")
+
+
+@pytest.mark.parametrize("trailer", ["", "\n"])
+def test_oversized_header_is_skipped(tmp_path, monkeypatch, trailer):
+    monkeypatch.setattr(card_viewer, "CHAT_HEADER_MAX", 64)
+    monkeypatch.setattr(card_viewer, "CHAT_READ_CHUNK", 16)
+    header = json.dumps({"character_name": "Ann", "chat_metadata": {"note": "x" * 200}})
+    body = header + "\n" + _message("hi") + "\n\n" + _message("there") + trailer
+    assert _scan(tmp_path, body) == (2, "")
+    assert _scan(tmp_path, header + trailer) == (0, "")
+
+
+def test_lines_split_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(card_viewer, "CHAT_READ_CHUNK", 7)
+    lines = [_message("m%d" % i) for i in range(10)]
+    body = HEADER + "\n" + "\n \n".join(lines) + "\n"
+    assert _scan(tmp_path, body) == (10, "Ann")
+
+
+def _write_chat(folder, header, messages):
+    folder.mkdir(parents=True, exist_ok=True)
+    lines = [json.dumps(header)] + [_message(m) for m in messages]
+    (folder / "2024-01-01 chat.jsonl").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_cards_match_by_stem_then_character_name(tmp_path):
+    chats = tmp_path / "st" / "chats"
+    _write_chat(chats / "Bob", {"character_name": "Robert"}, ["hi", "yo", "hey"])
+    _write_chat(chats / "Alice renamed", {"character_name": "Alice"}, ["hi"])
+    usage_index = card_viewer.ChatUsageIndex(str(tmp_path / "st"), str(tmp_path / "cache"))
+    usage_index.refresh()
+    index = card_viewer.CardIndex.from_records([
+        {"filename": "Bob.png", "mtime": 1, "name": "Someone Else"},
+        {"filename": "foo.png", "mtime": 1, "name": "Alice"},
+        {"filename": "bar.png", "mtime": 1, "name": ""},
+    ])
+    index.set_chat_usage(usage_index.usage())
+    by_file = {index.filename(r): index.chat_usage(r) for r in index.rows()}
+    assert by_file["Bob.png"].messages == 3     # chat folder named after the file
+    assert by_file["foo.png"].messages == 1     # header's character name
+    assert by_file["bar.png"] == card_viewer.NO_CHAT_USAGE
+    rows = card_viewer.QueryPlan(index, card_viewer.parse_query("messages:>0")).execute()
+    assert sorted(index.filename(r) for r in rows) == ["Bob.png", "foo.png"]
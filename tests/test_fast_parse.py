@@ -0,0 +1,61 @@
+import base64
+
+import pytest
+
+import card_viewer
+from card_viewer import INDEX_FIELD_PATHS, index_fields, read_card_fields, read_card_metadata
+
+from conftest import complete_card
+
+CARDS = {
+    "v2": complete_card(
+        "Zoë 🦊", creator="Ålice", tags=["elf", "ファンタジー", "x\"quoted\""],
+        description="Line one\nline two \\ back\tslash ☃ " * 40,
+        first_mes="Hi! " * 300, personality="", mes_example="<START>\n{{char}}: hey",
+        alternate_greetings=["a" * 5000, {"nested": [1, 2.5, None, True]}],
+        character_book={"entries": [{"keys": ["castle", "moat"], "content": "c" * 2000},
+                                    {"keys": "not a list", "content": ""}]},
+        extensions={"depth_prompt": {"prompt": "x" * 3000, "depth": 4}, "assets": ["A" * 20000]}),
+    "v1": {"name": "Old", "description": "d" * 3000, "personality": "p", "first_mes": "hello " * 100,
+           "mes_example": "", "scenario": "", "creator": "Someone", "tags": ["retro"]},
+    "top_level_wins": {"spec": "chara_card_v2", "name": "Top", "tags": ["top"],
+                       "data": {"name": "Nested", "tags": ["nested"], "creator": "From data",
+                                "description": "n" * 4000}},
+    "empty_values": complete_card("", tags=[], description="", character_book=None),
+}
+
+
+def _no_fallback(*args):
+    raise AssertionError("the fast path gave up and fell back to the full parse")
+
+
+@pytest.mark.parametrize("chunk", [4, 8, 12, 1 << 16])
+@pytest.mark.parametrize("card", sorted(CARDS))
+@pytest.mark.parametrize("encode", [base64.b64encode, base64.encodebytes], ids=["plain", "wrapped"])
+def test_fast_path_matches_full_parse(tmp_path, write_card, monkeypatch, chunk, card, encode):
+    monkeypatch.setattr(card_viewer, "_B64_CHUNK", chunk)  # values then straddle every chunk boundary
+    path = write_card("card.png", CARDS[card], encode=encode)
+    full, error = read_card_metadata(path)
+    monkeypatch.setattr(card_viewer, "read_card_metadata", _no_fallback)
+    fast, fast_error = read_card_fields(path, INDEX_FIELD_PATHS)
+    assert error is None and fast_error is None
+    assert index_fields(fast) == index_fields(full)
+
+
+def test_fields_not_asked_for_are_dropped(tmp_path, write_card, monkeypatch):
+    monkeypatch.setattr(card_viewer, "_B64_CHUNK", 16)
+    monkeypatch.setattr(card_viewer, "read_card_metadata", _no_fallback)
+    fast, _ = read_card_fields(write_card("card.png", CARDS["v2"]), INDEX_FIELD_PATHS)
+    assert "extensions" not in fast and "alternate_greetings" not in fast
+    assert fast["name"] == "Zoë 🦊"
+
+
+def test_malformed_json_falls_back_to_full_parse(tmp_path, write_card, monkeypatch):
+    monkeypatch.setattr(card_viewer, "_B64_CHUNK", 8)
+    path = write_card("card.png", encode=lambda raw: base64.b64encode(raw[:-10]))
+    assert read_card_fields(path, INDEX_FIELD_PATHS) == read_card_metadata(path)
+
+
+def test_benchmark_self_check():
+    results = card_viewer.benchmark_card_parsing(n=2, payload_mb=1)  # raises if the two paths disagree
+    assert set(results) >= {"full", "fast"}
@@ -0,0 +1,72 @@
+import os
+
+from card_viewer import HistoryStore, apply_json_delta, json_delta, read_card_file, read_card_metadata
+
+
+def _record(store, path):
+    st, data = read_card_file(path)
+    meta, _ = read_card_metadata(path, data)
+    store.record(os.path.basename(path), st, data, meta)
+    store.flush()  # as the scanner does after each batch; reads see flushed versions
+
+
+def test_json_delta_round_trip():
+    old = {"name": "Ann", "tags": ["a", "b"], "data": {"x": 1, "y": [1, 2]}, "gone": True}
+    new = {"name": "Ann", "tags": ["a", "c"], "data": {"x": 2, "y": [1, 2]}, "added": "z"}
+    assert apply_json_delta(new, json_delta(new, old)) == old
+    assert apply_json_delta(new, json_delta(new, new)) == new
+
+
+def test_versions_newest_first(tmp_path, write_card):
+    store = HistoryStore(str(tmp_path))
+    path = write_card("a.png", {"spec": "chara_card_v2", "data": {"name": "A", "description": "one"}})
+    _record(store, path)
+    _record(store, path)  # unchanged: not recorded again
+    write_card("a.png", {"spec": "chara_card_v2", "data": {"name": "A", "description": "two"}})
+    _record(store, path)
+    store.flush()
+    assert [v["meta"]["data"]["description"] for v in store.versions("a.png")] == ["two", "one"]
+    store.close()
+
+
+def test_rename_onto_name_with_history_replaces_it(tmp_path, write_card):
+    store = HistoryStore(str(tmp_path))
+    a = write_card("a.png", {"spec": "chara_card_v2", "data": {"name": "A", "description": "a1"}})
+    _record(store, a)
+    write_card("a.png", {"spec": "chara_card_v2", "data": {"name": "A", "description": "a2"}})
+    _record(store, a)
+    b = write_card("b.png", {"spec": "chara_card_v2", "data": {"name": "B", "description": "b1"}})
+    _record(store, b)
+    store.flush()
+
+    store.rename([("a.png", "b.png")])
+    assert [v["meta"]["data"]["description"] for v in store.versions("b.png")] == ["a2", "a1"]
+    assert store.versions("a.png") == []
+
+    # The renamed card's next edit chains onto its own head, not the replaced card's
+    b = write_card("b.png", {"spec": "chara_card_v2", "data": {"name": "A", "description": "a3"}})
+    _record(store, b)
+    assert [v["meta"]["data"]["description"] for v in store.versions("b.png")] == ["a3", "a2", "a1"]
+    store.close()
+
+
+def test_rename_swap_keeps_histories_apart(tmp_path, write_card):
+    store = HistoryStore(str(tmp_path))
+    _record(store, write_card("a.png", {"spec": "chara_card_v2", "data": {"name": "A"}}))
+    _record(store, write_card("b.png", {"spec": "chara_card_v2", "data": {"name": "B"}}))
+    store.rename([("a.png", "b.png"), ("b.png", "a.png")])
+    assert [v["meta"]["data"]["name"] for v in store.versions("a.png")] == ["B"]
+    assert [v["meta"]["data"]["name"] for v in store.versions("b.png")] == ["A"]
+    store.close()
+
+
+def test_reads_see_flushed_versions_only(tmp_path, write_card):
+    store = HistoryStore(str(tmp_path))
+    path = write_card("a.png")
+    st, data = read_card_file(path)
+    store.record("a.png", st, data, read_card_metadata(path, data)[0])
+    assert store.count("a.png") == 0 and store.is_empty()
+    store.flush()
+    assert store.count("a.png") == 1 and not store.is_empty()
+    store.close()
+    assert store.count("a.png") == 0 and store.versions("a.png") == []
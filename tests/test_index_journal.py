@@ -0,0 +1,65 @@
+import json
+import os
+
+from card_viewer import CardIndex, IndexJournal, load_index_cache, replay_index_journal
+
+
+def _entry(name, mtime=1, creator="Alice"):
+    return {"filename": name, "mtime": mtime, "size": 10, "name": name, "creator": creator,
+            "tags": [], "tokens": {}, "lore": []}
+
+
+def _write_journal(path, records, torn=""):
+    with open(path, "w", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec) + "\n")
+        f.write(torn)
+
+
+def test_replay_puts_and_deletes(tmp_path):
+    journal = os.path.join(tmp_path, "cards.journal")
+    _write_journal(journal, [{"put": _entry("b.png")}, {"put": _entry("a.png", mtime=2)}, {"del": "c.png"}])
+    records = replay_index_journal([_entry("a.png"), _entry("c.png")], journal)
+    assert sorted((r["filename"], r["mtime"]) for r in records) == [("a.png", 2), ("b.png", 1)]
+    # Replaying onto the result again changes nothing
+    assert sorted(map(json.dumps, replay_index_journal(records, journal))) == sorted(map(json.dumps, records))
+
+
+def test_replay_skips_torn_and_foreign_lines(tmp_path):
+    journal = os.path.join(tmp_path, "cards.journal")
+    _write_journal(journal, [{"put": _entry("a.png")}, ["not", "a", "record"], {"put": {"filename": "x.png"}}],
+                   torn='{"put": {"filename": "b.p')
+    assert [r["filename"] for r in replay_index_journal([], journal)] == ["a.png"]
+
+
+def test_replay_without_journal(tmp_path):
+    records = [_entry("a.png")]
+    assert replay_index_journal(records, os.path.join(tmp_path, "missing")) is records
+
+
+def test_old_entries_are_marked_for_rescan(tmp_path):
+    path = os.path.join(tmp_path, "cards.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{"filename": "old.png", "mtime": 5, "creator": "A", "tags": []}, "junk"], f)
+    assert load_index_cache(path) == [{"filename": "old.png", "mtime": 0, "creator": "A", "tags": []}]
+    assert load_index_cache(os.path.join(tmp_path, "missing.json")) == []
+
+
+def test_append_compact_round_trip(tmp_path):
+    index = CardIndex.from_records([_entry("a.png"), _entry("b.png")])
+    journal = IndexJournal(str(tmp_path))
+    journal.compact(index)
+    index.upsert(_entry("c.png", creator="Bob"))
+    index.remove("a.png")
+    journal.append(index.take_changes())
+
+    # A crash mid-append leaves a torn line; reopening repairs it before the next append
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"put": {"filen')
+    journal = IndexJournal(str(tmp_path))
+    records = replay_index_journal(load_index_cache(journal.snapshot_path), journal.path)
+    assert sorted(r["filename"] for r in records) == ["b.png", "c.png"]
+
+    journal.compact(CardIndex.from_records(records))
+    assert os.path.getsize(journal.path) == 0
+    assert sorted(r["filename"] for r in load_index_cache(journal.snapshot_path)) == ["b.png", "c.png"]
@@ -0,0 +1,53 @@
+import os
+import shutil
+
+from card_viewer import IngestWorker
+
+from conftest import complete_card
+
+
+def _ingest(folder, sources):
+    files_by_size = {}
+    for fname in os.listdir(folder):
+        if fname.endswith(".png"):
+            files_by_size.setdefault(os.path.getsize(os.path.join(folder, fname)), []).append(fname)
+    worker = IngestWorker(str(folder), [str(s) for s in sources], files_by_size)
+    entries, result = [], []
+    worker.updated_entries.connect(lambda _folder, batch: entries.extend(batch))
+    worker.finished.connect(lambda _folder, summary: result.append(summary))
+    worker.run()
+    return result[0], entries
+
+
+def test_duplicates_are_skipped(tmp_path, write_card):
+    library, drop = tmp_path / "library", tmp_path / "drop"
+    write_card("ann.png", complete_card("Ann"), folder=library)
+    write_card("ann copy.png", complete_card("Ann"), folder=drop)          # same bytes as the library's ann.png
+    write_card("bob.png", complete_card("Bob"), folder=drop)
+    shutil.copy(drop / "bob.png", drop / "bob again.png")                  # duplicate within the drop
+    write_card("ann.png", complete_card("Ann", description="edited"), folder=drop)  # new card, taken name
+    write_card("cat.png", complete_card("Cat", description="x" * 3), folder=drop)
+    write_card("dog.png", complete_card("Dog", description="y" * 3), folder=drop)
+    assert os.path.getsize(drop / "cat.png") == os.path.getsize(drop / "dog.png")  # hashed, not a duplicate
+
+    summary, entries = _ingest(library, [drop / "ann copy.png", drop / "bob.png", drop / "bob again.png",
+                                         drop / "ann.png", drop / "cat.png", drop / "dog.png",
+                                         library / "ann.png"])
+    assert sorted(summary["duplicates"]) == ["ann copy.png", "ann.png", "bob again.png"]
+    assert sorted(summary["added"]) == ["ann (2).png", "bob.png", "cat.png", "dog.png"]
+    assert summary["errors"] == []
+    assert sorted(os.listdir(library)) == ["ann (2).png", "ann.png", "bob.png", "cat.png", "dog.png"]
+    assert (library / "ann (2).png").read_bytes() == (drop / "ann.png").read_bytes()
+    assert sorted(e["filename"] for e in entries) == sorted(summary["added"])
+    assert {e["filename"]: e["name"] for e in entries}["ann (2).png"] == "Ann"
+
+    # Dropping the same files again adds nothing
+    summary, _ = _ingest(library, [drop / "bob.png", drop / "ann.png"])
+    assert summary["added"] == [] and sorted(summary["duplicates"]) == ["ann.png", "bob.png"]
+
+
+def test_missing_source_is_an_error(tmp_path):
+    library = tmp_path / "library"
+    library.mkdir()
+    summary, _ = _ingest(library, [tmp_path / "nope.png"])
+    assert [name for name, _ in summary["errors"]] == ["nope.png"]
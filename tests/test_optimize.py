@@ -0,0 +1,80 @@
+import io
+import os
+import struct
+import zlib
+
+import pytest
+from PIL import Image
+
+from card_viewer import (PNG_SIGNATURE, _png_chunk, optimize_card_file, optimize_card_png, read_card_metadata)
+
+from conftest import card_png, complete_card
+
+
+def _chunks(data):
+    pos, out = len(PNG_SIGNATURE), []
+    while pos + 12 <= len(data):
+        length, ctype = struct.unpack_from(">I4s", data, pos)
+        out.append((ctype, data[pos:pos + 12 + length]))
+        pos += 12 + length
+        if ctype == b"IEND":
+            break
+    return out, data[pos:]
+
+
+def _bloated_card(extra=(), trailer=b""):
+    """A 64x64 card with its image data stored uncompressed, plus chunks a viewer doesn't need."""
+    w = h = 64
+    rows = b"".join(b"\0" + bytes(v for x in range(w) for v in (x * 4 % 256, y * 4 % 256, (x + y) % 256)) for y in range(h))
+    base = card_png(complete_card("Ann", description="a" * 100))
+    chunks, _ = _chunks(base)
+    parts = [PNG_SIGNATURE, _png_chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))]
+    parts += [_png_chunk(b"pHYs", struct.pack(">IIB", 2835, 2835, 1)),
+              _png_chunk(b"tIME", b"\x07\xe8\x01\x01\x00\x00\x00"),
+              _png_chunk(b"tEXt", b"Comment\0made by hand")]
+    parts += [chunk for ctype, chunk in chunks if ctype == b"tEXt"]  # the chara chunk
+    parts += list(extra)
+    parts.append(_png_chunk(b"IDAT", zlib.compress(rows, 0)))
+    parts.append(_png_chunk(b"IEND", b""))
+    return b"".join(parts) + trailer
+
+
+def test_lossless_and_keeps_card_chunks():
+    data = _bloated_card(trailer=b"appended")
+    out = optimize_card_png(data)
+    assert out is not None and len(out) < len(data)
+    with Image.open(io.BytesIO(data)) as a, Image.open(io.BytesIO(out)) as b:
+        assert a.tobytes() == b.tobytes()
+    before, _ = _chunks(data)
+    after, trailer = _chunks(out)
+    kinds = [ctype for ctype, _ in after]
+    assert b"tIME" not in kinds and b"pHYs" in kinds
+    chara = [c for t, c in before if t == b"tEXt" and c[8:].startswith(b"chara\0")]
+    assert chara and chara[0] in [c for _, c in after]
+    assert [c[8:].partition(b"\0")[0] for t, c in after if t == b"tEXt"] == [b"chara"]
+    assert trailer == b"appended"
+    assert optimize_card_png(out) is None  # nothing left to gain
+
+
+def test_animated_png_is_left_alone():
+    assert optimize_card_png(_bloated_card(extra=[_png_chunk(b"acTL", struct.pack(">II", 1, 0))])) is None
+
+
+@pytest.mark.parametrize("data", [b"not a png", PNG_SIGNATURE + _png_chunk(b"IHDR", b"\0" * 13),
+                                  _bloated_card()[:-20]])
+def test_malformed_files_raise(data):
+    with pytest.raises(ValueError):
+        optimize_card_png(data)
+
+
+def test_optimize_file_in_place_keeps_mtime(tmp_path):
+    path = tmp_path / "ann.png"
+    path.write_bytes(_bloated_card())
+    os.utime(path, (1_600_000_000, 1_600_000_000))
+    meta_before, _ = read_card_metadata(str(path))
+    mtime_ns, before, after, error = optimize_card_file(str(path))
+    assert error is None and after is not None and after < before
+    st = os.stat(path)
+    assert (st.st_mtime_ns, st.st_size) == (mtime_ns, after)
+    assert read_card_metadata(str(path))[0] == meta_before
+    assert os.listdir(tmp_path) == ["ann.png"]  # no temporary file left behind
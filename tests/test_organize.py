@@ -0,0 +1,99 @@
+import pytest
+
+from card_viewer import CardIndex, OrganizeMove, check_organize_template, plan_organize, safe_filename
+
+from conftest import complete_card
+
+
+def _index(*cards):
+    return CardIndex.from_records([{"filename": f, "mtime": 1, "size": 1, "name": n, "creator": c, "tags": []}
+                                   for f, n, c in cards])
+
+
+def _apply(index, moves):
+    renamed = {m.old: m.new for m in moves}
+    return CardIndex.from_records([{**index.entry(r), "filename": renamed.get(index.filename(r),
+                                                                              index.filename(r))}
+                                   for r in index.rows()])
+
+
+def test_renames_from_template(tmp_path):
+    index = _index(("card_1.png", "Ann", "Alice"), ("card_2.png", "Bob", "Carol"))
+    assert plan_organize(index, str(tmp_path), "{creator} - {name}") == [
+        OrganizeMove("card_1.png", "Alice - Ann.png", False),
+        OrganizeMove("card_2.png", "Carol - Bob.png", False),
+    ]
+
+
+def test_collisions_get_suffixes_and_replanning_is_a_no_op(tmp_path):
+    index = _index(("a.png", "Ann", "Alice"), ("b.png", "Ann", "Alice"), ("c.png", "Ann", "Alice"))
+    moves = plan_organize(index, str(tmp_path), "{creator} - {name}")
+    assert [(m.new, m.collided) for m in moves] == [
+        ("Alice - Ann.png", False), ("Alice - Ann (2).png", True), ("Alice - Ann (3).png", True)]
+    assert plan_organize(_apply(index, moves), str(tmp_path), "{creator} - {name}") == []
+
+
+def test_never_lands_on_a_name_another_move_frees(tmp_path):
+    # Moves may run in any order, so "Alice - Ann.png" isn't reused until the next run
+    index = _index(("a.png", "Ann", "Alice"), ("Alice - Ann.png", "Zed", "Zoe"))
+    moves = plan_organize(index, str(tmp_path), "{creator} - {name}")
+    assert sorted(m.new for m in moves) == ["Alice - Ann (2).png", "Zoe - Zed.png"]
+    index = _apply(index, moves)
+    moves = plan_organize(index, str(tmp_path), "{creator} - {name}")
+    assert moves == [OrganizeMove("Alice - Ann (2).png", "Alice - Ann.png", False)]
+    assert plan_organize(_apply(index, moves), str(tmp_path), "{creator} - {name}") == []
+
+
+def test_names_compare_case_insensitively(tmp_path):
+    index = _index(("x.png", "ann", "alice"), ("ALICE - ANN.png", "Other", "Other"))
+    moves = {m.old: m.new for m in plan_organize(index, str(tmp_path), "{creator} - {name}")}
+    assert moves["x.png"] == "alice - ann (2).png"
+
+
+def test_by_creator_avoids_files_already_in_subfolder(tmp_path):
+    (tmp_path / "Alice").mkdir()
+    (tmp_path / "Alice" / "Ann.png").write_bytes(b"")
+    index = _index(("Ann.png", "Ann", "Alice"), ("b.png", "Bea", "Bob"))
+    assert plan_organize(index, str(tmp_path), "{name}", by_creator=True) == [
+        OrganizeMove("Ann.png", "Alice/Ann (2).png", True),
+        OrganizeMove("b.png", "Bob/Bea.png", False),
+    ]
+
+
+def test_unsafe_characters_and_empty_names(tmp_path):
+    assert "/" not in safe_filename("a/b") and ":" not in safe_filename("a:b")
+    index = _index(("keep.png", "", "Alice"))
+    assert plan_organize(index, str(tmp_path), "{name}") == []  # empty result falls back to the file name
+
+
+@pytest.mark.parametrize("template", ["", "  ", "{nope}", "{name"])
+def test_bad_templates(template):
+    with pytest.raises(ValueError):
+        check_organize_template(template)
+
+
+def test_worker_drops_history_of_cards_moved_into_subfolders(tmp_path, write_card):
+    from card_viewer import HistoryStore, OrganizeWorker, read_card_file, read_card_metadata
+
+    def record(name):
+        path = str(tmp_path / name)
+        st, data = read_card_file(path)
+        history.record(name, st, data, read_card_metadata(path, data)[0])
+        history.flush()
+
+    history = HistoryStore(str(tmp_path))
+    write_card("a.png")
+    write_card("b.png")
+    record("a.png")
+    record("b.png")
+    moves = [OrganizeMove("a.png", "Alice/a.png", False), OrganizeMove("b.png", "c.png", False)]
+    OrganizeWorker(str(tmp_path), moves, {}, "folder", history=history).run()
+    assert (tmp_path / "Alice" / "a.png").exists()
+    assert history.versions("a.png") == []
+    assert [v["meta"]["data"]["name"] for v in history.versions("c.png")] == ["b"]
+
+    # A new card taking the vacated name starts with no history
+    write_card("a.png", complete_card("New"))
+    record("a.png")
+    assert len(history.versions("a.png")) == 1
+    history.close()
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from card_viewer import LibraryPack, build_index_entry, read_card_metadata, write_library_pack, write_synthetic_cards
+
+
+@pytest.fixture
+def library(tmp_path):
+    folder = tmp_path / "cards"
+    write_synthetic_cards(str(folder), 40, seed=5)
+    (folder / "broken.png").write_bytes(b"not a png at all")
+    return str(folder)
+
+
+def test_round_trip(tmp_path, library):
+    path = str(tmp_path / "library.cvpack")
+    assert write_library_pack(path, library) == 41
+    pack = LibraryPack(path)
+    try:
+        assert len(pack) == 41
+        assert pack.source_folder == library
+        assert sorted(pack.rows) == sorted(os.listdir(library))
+        assert pack.thumbnail("broken.png") is None  # packed, but there is no image to show
+        names = sorted(f for f in os.listdir(library) if f != "broken.png")
+        for fname in names[:10]:
+            record = pack.records[pack.rows[fname]]
+            expected = build_index_entry(library, fname)
+            assert {k: record[k] for k in ("creator", "tags", "lore", "tokens", "mtime", "size")} == \
+                {k: expected[k] for k in ("creator", "tags", "lore", "tokens", "mtime", "size")}
+            assert pack.metadata(fname) == read_card_metadata(os.path.join(library, fname))[0]
+            assert bytes(pack.thumbnail(fname)[:2]) == b"\xff\xd8"  # JPEG
+            assert pack.card_path(fname) == os.path.join(library, fname)
+        assert pack.metadata("missing.png") is None and pack.thumbnail("missing.png") is None
+    finally:
+        pack.close()
+
+
+def test_subset_and_cancel(tmp_path, library):
+    path = str(tmp_path / "some.cvpack")
+    assert write_library_pack(path, library, ["card_000001.png", "card_000002.png"]) == 2
+    pack = LibraryPack(path)
+    assert sorted(pack.rows) == ["card_000001.png", "card_000002.png"]
+    pack.close()
+    assert write_library_pack(str(tmp_path / "cancelled.cvpack"), library, cancelled=lambda: True) is None
+    assert not os.path.exists(tmp_path / "cancelled.cvpack")
+    assert not [f for f in os.listdir(tmp_path) if f.startswith(".cards_tmp_")]
+
+
+def test_damaged_packs_are_refused(tmp_path, library):
+    path = tmp_path / "library.cvpack"
+    write_library_pack(str(path), library)
+    data = path.read_bytes()
+    for name, content in (("empty", b""), ("junk", b"x" * 100), ("truncated", data[:-5])):
+        bad = tmp_path / f"{name}.cvpack"
+        bad.write_bytes(content)
+        with pytest.raises(ValueError):
+            LibraryPack(str(bad))
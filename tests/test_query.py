@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from card_viewer import (CardIndex, ChatUsage, QueryPlan, QueryTerm, build_index_entry, chat_usage_key,
+                         parse_age, parse_count, parse_query, parse_size, write_synthetic_cards)
+
+RECORDS = [
+    {"filename": "Elf Ranger.png", "mtime": 1, "size": 1000, "creator": "Alice",
+     "tags": ["Fantasy", "elf"], "lore": ["forest"]},
+    {"filename": "Space Pirate.png", "mtime": 1, "size": 3 * 1024 * 1024, "creator": "Bob",
+     "tags": ["sci-fi"], "lore": ["castle"]},
+    {"filename": "Castle Guard.png", "mtime": 1, "size": 2000, "creator": "alice",
+     "tags": ["fantasy", "nsfw"], "lore": []},
+    {"filename": "Nobody.png", "mtime": 1, "size": 10, "creator": "Unknown", "tags": [], "lore": []},
+]
+
+
+@pytest.fixture
+def index():
+    return CardIndex.from_records(RECORDS)
+
+
+def _search(index, text):
+    rows = QueryPlan(index, parse_query(text)).execute()
+    return sorted(index.filename(r) for r in rows)
+
+
+def test_parse_query_fields_quotes_and_negation():
+    assert parse_query('creator:Foo tag:"Sci Fi" -tag:nsfw Elf') == (
+        QueryTerm("creator", "foo", False),
+        QueryTerm("tag", "sci fi", False),
+        QueryTerm("tag", "nsfw", True),
+        QueryTerm("any", "elf", False),
+    )
+
+
+def test_parse_query_unknown_field_is_text():
+    assert parse_query("http://example.com") == (QueryTerm("any", "http://example.com", False),)
+    assert parse_query("   ") == ()
+
+
+def test_parse_comparisons():
+    assert parse_size(">2MB") == (">", 2 * 1024 * 1024)
+    assert parse_size("512") == ("=", 512)
+    assert parse_size("big") is None
+    assert parse_count(">=100") == (">=", 100)
+    assert parse_age("<30d") == ("<", 30 * 86400)
+    assert parse_age("2") == ("<", 2 * 86400)
+
+
+def test_bitmap_and_scan_terms(index):
+    plan = QueryPlan(index, parse_query("creator:alice tag:fantasy name:*guard size:<1MB"))
+    assert sorted(label for label, _, _ in plan.bitmap_steps) == ["creator:alice", "tag:fantasy"]
+    assert [step[0] for step in plan.scan_steps] == ["size:<1mb", "name:*guard"]  # cheapest first
+    assert sorted(index.filename(r) for r in plan.execute()) == ["Castle Guard.png"]
+
+
+def test_field_terms(index):
+    assert _search(index, "creator:alice") == ["Castle Guard.png", "Elf Ranger.png"]
+    assert _search(index, "creator:ali*") == ["Castle Guard.png", "Elf Ranger.png"]
+    assert _search(index, "tag:fantasy -tag:nsfw") == ["Elf Ranger.png"]
+    assert _search(index, "lore:castle") == ["Space Pirate.png"]
+    assert _search(index, "size:>1MB") == ["Space Pirate.png"]
+    assert _search(index, "name:pirate") == ["Space Pirate.png"]
+    assert _search(index, "tag:missing") == []
+
+
+def test_plain_words_match_any_field(index):
+    # "castle" is a filename of one card and a lorebook key of another
+    assert _search(index, "castle") == ["Castle Guard.png", "Space Pirate.png"]
+    assert _search(index, "bob") == ["Space Pirate.png"]
+    assert _search(index, "-fantasy") == ["Nobody.png", "Space Pirate.png"]
+
+
+def test_invalid_terms_are_ignored(index):
+    plan = QueryPlan(index, parse_query("size:huge creator:bob"))
+    assert plan.invalid == ["size:huge"]
+    assert sorted(index.filename(r) for r in plan.execute()) == ["Space Pirate.png"]
+
+
+def test_chat_terms(index):
+    index.set_chat_usage({chat_usage_key("Elf Ranger"): ChatUsage(150, 1, 2 * 1024 * 1024, 3)})
+    assert _search(index, "messages:>100") == ["Elf Ranger.png"]
+    assert _search(index, "chatsize:>1MB") == ["Elf Ranger.png"]
+    assert _search(index, "chatted:never") == ["Castle Guard.png", "Nobody.png", "Space Pirate.png"]
+    assert _search(index, "chatted:<1d") == []
+    assert _search(index, "chatted:>1d") == ["Elf Ranger.png"]
+
+
+def test_plan_matches_naive_filter_on_synthetic_cards(tmp_path):
+    folder = str(tmp_path)
+    write_synthetic_cards(folder, 300, seed=3)
+    entries = [build_index_entry(folder, f) for f in sorted(os.listdir(folder))]
+    index = CardIndex.from_records(entries)
+
+    def naive(pred):
+        return sorted(e["filename"] for e in entries if pred(e))
+
+    for creator in ("creator0", "creator3"):
+        assert _search(index, f"creator:{creator}") == naive(lambda e: e["creator"] == creator)
+    for tag in ("elf", "nsfw", "tag7"):
+        assert _search(index, f"tag:{tag}") == naive(lambda e: tag in e["tags"])
+        assert _search(index, f"-tag:{tag} creator:creator1") == naive(
+            lambda e: tag not in e["tags"] and e["creator"] == "creator1")
+    assert _search(index, "size:>1KB") == naive(lambda e: e["size"] > 1024)
@@ -0,0 +1,80 @@
+import pytest
+
+from card_viewer import plan_sync
+
+
+def _digest(contents):
+    calls = []
+
+    def digest(side, fname):
+        calls.append((side, fname))
+        return contents[side, fname]
+    digest.calls = calls
+    return digest
+
+
+def test_first_sync_copies_everything():
+    plan = plan_sync({"a.png": (1, 10), "b.png": (2, 20)}, {})
+    assert plan.copy == ["a.png", "b.png"]
+    assert (plan.rename, plan.delete, plan.unchanged) == ([], [], [])
+
+
+def test_unchanged_changed_and_extra_files():
+    src = {"a.png": (1, 10), "b.png": (2, 20)}
+    dst = {"a.png": (1, 10), "b.png": (3, 20), "x.png": (9, 90)}
+    plan = plan_sync(src, dst)
+    assert plan.unchanged == ["a.png"]
+    assert plan.copy == ["b.png"]
+    assert plan.delete == ["x.png"]
+
+
+def test_related_rename_is_trusted_on_fingerprint():
+    plan = plan_sync({"Ann (2).png": (1, 10)}, {"Ann.png": (1, 10)})
+    assert plan.rename == [("Ann.png", "Ann (2).png")]
+    assert plan.copy == plan.delete == []
+
+
+def test_unrelated_rename_needs_a_digest():
+    src, dst = {"Bob.png": (1, 10)}, {"Ann.png": (1, 10)}
+    plan = plan_sync(src, dst)
+    assert plan.rename == []
+    assert plan.copy == ["Bob.png"]
+    assert plan.delete == ["Ann.png"]
+
+    same = _digest({("src", "Bob.png"): "h", ("dst", "Ann.png"): "h"})
+    assert plan_sync(src, dst, same).rename == [("Ann.png", "Bob.png")]
+    different = _digest({("src", "Bob.png"): "h1", ("dst", "Ann.png"): "h2"})
+    assert plan_sync(src, dst, different).copy == ["Bob.png"]
+
+
+def test_same_fingerprint_cards_are_not_swapped():
+    # Bulk imports: different cards with the same second and size
+    src = {"card_1b.png": (5, 100), "card_2b.png": (5, 100)}
+    dst = {"card_1.png": (5, 100), "card_2.png": (5, 100)}
+    digest = _digest({("src", "card_1b.png"): "one", ("src", "card_2b.png"): "two",
+                      ("dst", "card_1.png"): "two", ("dst", "card_2.png"): "one"})
+    plan = plan_sync(src, dst, digest)
+    assert sorted(plan.rename) == [("card_1.png", "card_2b.png"), ("card_2.png", "card_1b.png")]
+    assert plan.copy == plan.delete == []
+
+    # Without a digest nothing ambiguous is renamed
+    plan = plan_sync(src, dst)
+    assert plan.rename == []
+    assert plan.copy == ["card_1b.png", "card_2b.png"]
+
+
+def test_compare_contents():
+    src = {"a.png": (1, 10), "b.png": (2, 20), "c.png": (3, 30)}
+    dst = {"a.png": (7, 10), "b.png": (2, 20), "old.png": (8, 30)}
+    digest = _digest({("src", "a.png"): "a", ("dst", "a.png"): "a",
+                      ("src", "b.png"): "b", ("dst", "b.png"): "B",
+                      ("src", "c.png"): "c", ("dst", "old.png"): "c"})
+    plan = plan_sync(src, dst, digest, compare_contents=True)
+    assert plan.unchanged == ["a.png"]  # touched but identical
+    assert plan.copy == ["b.png"]       # same size and date, different content
+    assert plan.rename == [("old.png", "c.png")]
+
+
+def test_compare_contents_requires_digest():
+    with pytest.raises(ValueError):
+        plan_sync({}, {}, compare_contents=True)
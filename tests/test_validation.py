@@ -0,0 +1,41 @@
+import base64
+import json
+import os
+
+from card_viewer import VALIDATION_CACHE_FILE, build_index_entry, read_card_metadata, validate_library
+
+from conftest import complete_card
+
+
+def test_valid_cards_have_no_issues(tmp_path, write_card):
+    write_card("a.png")
+    results, checked = validate_library(str(tmp_path))
+    assert checked == 1
+    assert results == {"a.png": []}
+
+
+def test_malformed_cache_entries_are_rechecked(tmp_path, write_card):
+    for name in ("a.png", "b.png", "c.png"):
+        write_card(name)
+    with open(os.path.join(tmp_path, VALIDATION_CACHE_FILE), "w", encoding="utf-8") as f:
+        json.dump({"a.png": ["not", "a", "dict"], "b.png": "stale", "c.png": {"fp": 1}}, f)
+    results, checked = validate_library(str(tmp_path))
+    assert checked == 3
+    assert sorted(results) == ["a.png", "b.png", "c.png"]
+    # ... and the rewritten cache is used on the next run
+    assert validate_library(str(tmp_path))[1] == 0
+
+
+def test_line_wrapped_base64_is_valid(tmp_path, write_card):
+    path = write_card("wrapped.png", complete_card("Ann", description="x" * 500), encode=base64.encodebytes)
+    meta, error = read_card_metadata(path)
+    assert error is None and meta["name"] == "Ann"
+    assert build_index_entry(str(tmp_path), "wrapped.png")["name"] == "Ann"
+    results, _ = validate_library(str(tmp_path), use_cache=False)
+    assert results == {"wrapped.png": []}
+
+
+def test_bad_base64_is_reported(tmp_path, write_card):
+    write_card("bad.png", encode=lambda raw: b"!!not base64!!")
+    results, _ = validate_library(str(tmp_path), use_cache=False)
+    assert [issue[1] for issue in results["bad.png"]] == ["Undecodable base64"]